@@ -1,13 +1,21 @@
 import os
+import re
 import json
 import asyncio
 import logging
-from typing import Any, Dict, List, Optional, Type, TypeVar, Union
+from typing import Any, AsyncIterator, Dict, List, Optional, Type, TypeVar, Union
 from pydantic import BaseModel
 from openai import AsyncOpenAI
-from tavily import TavilyClient
+from runtime import get_http_client, get_openai_client
+from scheduler import scheduler
+from prompt_builder import PromptBuilder, truncate_to_tokens
+from cache import TieredCache, make_key, normalize_query
+from structured_output import parse_output, response_format, schema_instruction
+from reddit_threads import FETCH_THREADS, THREAD_EXCERPT_TOKENS, thread_fetcher
+# trace/gen_trace_id are re-exported for callers that import them from here
+from tracing import TAVILY_RESPONSE_BYTES, gen_trace_id, record, record_llm_usage, span
+from tracing import start_trace as trace
 import time
-import uuid
 
 # Load environment variables
 from dotenv import load_dotenv
@@ -19,40 +27,110 @@ T = TypeVar('T', bound=BaseModel)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def gen_trace_id() -> str:
-    """Generate a unique trace ID"""
-    return str(uuid.uuid4())[:8]
+# Per-result snippet length passed to the search agent
+SNIPPET_TOKENS = int(os.getenv('SEARCH_SNIPPET_TOKENS', '50'))
+# Upper bound on system + user prompt tokens for any agent call
+DEFAULT_MAX_INPUT_TOKENS = int(os.getenv('AGENT_MAX_INPUT_TOKENS', '6000'))
+# "json_schema" (strict structured outputs) or "json_object" (schema in the prompt)
+DEFAULT_STRUCTURED_OUTPUT = os.getenv('STRUCTURED_OUTPUT', 'json_schema')
+# Tool-calling loop: model round-trips that may request tools, per-call
+# timeout, and total tokens after which the model must answer
+DEFAULT_MAX_TOOL_ROUNDS = int(os.getenv('AGENT_MAX_TOOL_ROUNDS', '3'))
+DEFAULT_TOOL_TIMEOUT = float(os.getenv('AGENT_TOOL_TIMEOUT', '30'))
+DEFAULT_TOOL_TOKEN_BUDGET = int(os.getenv('AGENT_TOOL_TOKEN_BUDGET', '20000'))
 
-def trace(description: str, trace_id: str = None):
-    """Simple context manager for tracing"""
-    class TraceContext:
-        def __enter__(self):
-            logger.info(f"[{trace_id}] Starting: {description}")
-            return self
-        def __exit__(self, *args):
-            logger.info(f"[{trace_id}] Completed: {description}")
-    return TraceContext()
+_CITATION = re.compile(r"\[(\d+)\]")
 
 class ModelSettings:
-    def __init__(self, temperature: float = 0.7, tool_choice: str = "auto"):
+    def __init__(self, temperature: float = 0.7, tool_choice: str = "auto",
+                 structured_output: str = None, parallel_tool_calls: bool = None):
         self.temperature = temperature
         self.tool_choice = tool_choice
+        # None leaves the API default (parallel calls allowed)
+        self.parallel_tool_calls = parallel_tool_calls
+        self.structured_output = structured_output or DEFAULT_STRUCTURED_OUTPUT
+        if self.structured_output not in ("json_schema", "json_object"):
+            raise ValueError(f"Unknown structured output mode '{self.structured_output}'")
+
+def _offset_citations(content: str, sources: list, offset: int) -> str:
+    """Shift a tool result's [n] references past the sources already collected"""
+    if not offset:
+        return content
+    mapping = {str(source.get('id')): offset + index for index, source in enumerate(sources, 1)}
+    return _CITATION.sub(lambda m: f"[{mapping[m.group(1)]}]" if m.group(1) in mapping else m.group(0), content)
 
 class WebSearchTool:
-    def __init__(self, search_context_size: str = "low"):
+    """Async Tavily search client.
+
+    Requests go straight to the Tavily REST API over httpx so concurrent
+    searches overlap instead of blocking the event loop. Concurrency, rate
+    limits and retries are handled by the global scheduler. Raw Tavily
+    responses are stored in ``cache`` when one is given.
+
+    With ``fetch_threads``, results that are Reddit threads get an excerpt
+    of the full post and comments (via the thread corpus) instead of the
+    short Tavily snippet.
+    """
+
+    def __init__(self, search_context_size: str = "low", max_results: int = 5,
+                 timeout: float = 30.0, cache: TieredCache = None, fetch_threads: bool = None):
         self.search_context_size = search_context_size
-        self.client = TavilyClient(api_key=os.getenv('TAVILY_API_KEY'))
-    
-    async def search(self, query: str, max_results: int = 5) -> dict:
+        self.max_results = max_results
+        self.timeout = timeout
+        self.fetch_threads = FETCH_THREADS if fetch_threads is None else fetch_threads
+        self.api_key = os.getenv('TAVILY_API_KEY')
+        self.base_url = os.getenv('TAVILY_BASE_URL', 'https://api.tavily.com').rstrip('/')
+        self.cache = cache
+
+    @property
+    def search_depth(self) -> str:
+        return "basic" if self.search_context_size == "low" else "advanced"
+
+    async def _request(self, query: str, max_results: int) -> dict:
+        """POST a search to Tavily and return the decoded JSON response"""
+        payload = {
+            "api_key": self.api_key,
+            "query": query,
+            "search_depth": self.search_depth,
+            "max_results": max_results,
+            "include_answer": True,
+            "include_raw_content": False
+        }
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        
+        async def post():
+            response = await get_http_client().post(
+                f"{self.base_url}/search", json=payload, headers=headers, timeout=self.timeout
+            )
+            response.raise_for_status()
+            return response
+        
+        with span("tavily", query=query) as current:
+            response = await scheduler.call("tavily", post)
+            data = response.json()
+            current.set(response_bytes=len(response.content), results=len(data.get('results', [])))
+            TAVILY_RESPONSE_BYTES.observe(len(response.content))
+            return data
+
+    async def _cached_request(self, query: str, max_results: int) -> dict:
+        """Serve from the cache when possible, otherwise call Tavily and store"""
+        if self.cache is None:
+            return await self._request(query, max_results)
+        key = make_key("tavily", normalize_query(query), self.search_depth, max_results)
+        cached = await self.cache.aget(key)
+        if cached is not None:
+            record("tavily", 0.0, query=query, cache_hit=True)
+            return cached
+        start = time.perf_counter()
+        response = await self._request(query, max_results)
+        await self.cache.aset(key, response, cost=time.perf_counter() - start)
+        return response
+
+    async def search(self, query: str, max_results: int = None) -> dict:
         """Perform web search using Tavily API and return structured results"""
+        max_results = max_results or self.max_results
         try:
-            response = self.client.search(
-                query=query,
-                search_depth="basic" if self.search_context_size == "low" else "advanced",
-                max_results=max_results,
-                include_answer=True,
-                include_raw_content=False
-            )
+            response = await self._cached_request(query, max_results)
             
             # Extract sources for referencing
             sources = []
@@ -61,14 +139,19 @@ class WebSearchTool:
             if response.get('answer'):
                 content_parts.append(f"Summary: {response['answer']}")
             
-            for i, result in enumerate(response.get('results', [])[:max_results], 1):
+            results = response.get('results', [])[:max_results]
+            excerpts = {}
+            if self.fetch_threads:
+                excerpts = await thread_fetcher.excerpts(
+                    [result.get('url', '') for result in results], query, THREAD_EXCERPT_TOKENS)
+            
+            for i, result in enumerate(results, 1):
                 title = result.get('title', 'No title')
                 content = result.get('content', '')
                 url = result.get('url', '')
                 
-                # Truncate content
-                if len(content) > 200:
-                    content = content[:200] + "..."
+                # Prefer the thread excerpt; otherwise truncate the snippet on a sentence boundary
+                content = excerpts.get(url) or truncate_to_tokens(content, SNIPPET_TOKENS)
                 
                 # Add to sources list
                 sources.append({
@@ -95,30 +178,56 @@ class WebSearchTool:
 class Agent:
     def __init__(self, name: str, instructions: str, model: str = "gpt-4o-mini", 
                  tools: List[Any] = None, output_type: Type[T] = None, 
-                 model_settings: ModelSettings = None):
+                 model_settings: ModelSettings = None, cache: TieredCache = None,
+                 max_input_tokens: int = None, max_tool_rounds: int = None,
+                 tool_timeout: float = None, tool_token_budget: int = None):
         self.name = name
         self.instructions = instructions
         self.model = model
         self.tools = tools or []
         self.output_type = output_type
         self.model_settings = model_settings or ModelSettings()
-        self.client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-    
-    async def run(self, user_input: str) -> 'RunResult':
-        """Run the agent with user input"""
-        messages = [
-            {"role": "system", "content": self.instructions},
-            {"role": "user", "content": user_input}
-        ]
-        
-        # Prepare function definitions for OpenAI
-        functions = []
-        available_functions = {}
-        
-        if self.tools:
-            for tool in self.tools:
-                if isinstance(tool, WebSearchTool):
-                    functions.append({
+        # Opt-in completion cache keyed on the full request payload
+        self.cache = cache
+        self.max_input_tokens = max_input_tokens or DEFAULT_MAX_INPUT_TOKENS
+        # Bounds on the tool-calling loop
+        self.max_tool_rounds = max_tool_rounds or DEFAULT_MAX_TOOL_ROUNDS
+        self.tool_timeout = tool_timeout or DEFAULT_TOOL_TIMEOUT
+        self.tool_token_budget = tool_token_budget or DEFAULT_TOOL_TOKEN_BUDGET
+        self._system_prompt, self._response_format = self._output_spec()
+        self._tool_specs, self._tool_callables = self._build_tool_specs()
+
+    def clone(self, **changes) -> 'Agent':
+        """Copy of this agent with some constructor arguments replaced"""
+        settings = {
+            "name": self.name, "instructions": self.instructions, "model": self.model,
+            "tools": self.tools, "output_type": self.output_type,
+            "model_settings": self.model_settings, "cache": self.cache,
+            "max_input_tokens": self.max_input_tokens, "max_tool_rounds": self.max_tool_rounds,
+            "tool_timeout": self.tool_timeout, "tool_token_budget": self.tool_token_budget,
+        }
+        settings.update(changes)
+        return Agent(**settings)
+
+    def _output_spec(self) -> tuple:
+        """System prompt and response_format, computed once per agent"""
+        if not self.output_type:
+            return self.instructions, None
+        if self.model_settings.structured_output == "json_schema":
+            # The schema travels in response_format and is enforced by the API
+            return self.instructions, response_format(self.output_type, strict=True)
+        return (self.instructions + schema_instruction(self.output_type),
+                response_format(self.output_type, strict=False))
+
+    def _build_tool_specs(self) -> tuple:
+        """Tool definitions for the API and the callable behind each one"""
+        specs = []
+        callables = {}
+        for tool in self.tools:
+            if isinstance(tool, WebSearchTool):
+                specs.append({
+                    "type": "function",
+                    "function": {
                         "name": "web_search",
                         "description": "Search the web for information",
                         "parameters": {
@@ -128,8 +237,49 @@ class Agent:
                             },
                             "required": ["query"]
                         }
-                    })
-                    available_functions["web_search"] = tool.search
+                    }
+                })
+                callables["web_search"] = tool.search
+        return specs, callables
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        """OpenAI client sharing the process-wide connection pool"""
+        return get_openai_client()
+
+    async def _complete(self, **kwargs) -> dict:
+        """One chat completion as ``{content, tool_calls, tokens}``, cached when enabled"""
+        key = make_key("chat", kwargs) if self.cache is not None else None
+        if key is not None:
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                record("llm", 0.0, agent=self.name, cache_hit=True)
+                return cached
+        
+        start = time.perf_counter()
+        with span("llm", agent=self.name):
+            response = await scheduler.call("openai", lambda: self.client.chat.completions.create(**kwargs))
+            record_llm_usage(self.name, self.model, response.usage)
+        message = response.choices[0].message
+        result = {
+            "content": message.content,
+            "tool_calls": [
+                {"id": call.id, "name": call.function.name, "arguments": call.function.arguments}
+                for call in message.tool_calls
+            ] if message.tool_calls else None,
+            "tokens": response.usage.total_tokens if response.usage else 0
+        }
+        
+        if key is not None:
+            await self.cache.aset(key, result, cost=time.perf_counter() - start)
+        return result
+    
+    def _build_request(self, user_input: str) -> dict:
+        """Chat completion kwargs for a fresh conversation"""
+        messages = [
+            {"role": "system", "content": self._system_prompt},
+            {"role": "user", "content": user_input}
+        ]
         
         # Make OpenAI API call
         kwargs = {
@@ -138,58 +288,296 @@ class Agent:
             "temperature": self.model_settings.temperature
         }
         
-        if functions:
-            kwargs["functions"] = functions
-            if self.model_settings.tool_choice == "required":
-                kwargs["function_call"] = "auto"
+        if self._tool_specs:
+            kwargs["tools"] = self._tool_specs
+            kwargs["tool_choice"] = self.model_settings.tool_choice
+            if self.model_settings.parallel_tool_calls is not None:
+                kwargs["parallel_tool_calls"] = self.model_settings.parallel_tool_calls
         
-        if self.output_type:
-            # Use structured output for Pydantic models
-            kwargs["response_format"] = {
-                "type": "json_object"
-            }
-            # Add JSON schema instruction to system message
-            schema_instruction = f"\n\nRespond with valid JSON matching this schema: {self.output_type.model_json_schema()}"
-            kwargs["messages"][0]["content"] += schema_instruction
+        if self._response_format:
+            kwargs["response_format"] = self._response_format
         
-        response = await self.client.chat.completions.create(**kwargs)
-        
-        # Handle function calls
-        final_content = ""
-        sources = []
-        message = response.choices[0].message
+        # Fit the user input into what is left of the token budget (the builder drops empty
+        # sections, so an empty input is sent as is)
+        if user_input:
+            messages[1]["content"] = (PromptBuilder(self.model, self.max_input_tokens)
+                                      .add(messages[0]["content"], truncate=False)
+                                      .add(user_input)
+                                      .sections())[-1]
         
-        if message.function_call:
-            # Execute function call
-            function_name = message.function_call.name
-            function_args = json.loads(message.function_call.arguments)
+        return kwargs
+
+    async def run(self, user_input: str) -> 'RunResult':
+        """Run the agent, executing the tools it asks for until it answers"""
+        return await self._run_loop(self._build_request(user_input))
+
+    async def run_direct(self, user_input: str, tool_name: str = "web_search", **tool_args) -> 'RunResult':
+        """Execute a tool with known arguments, then have the model answer from its result.
+
+        Use when the caller already has the exact arguments (e.g. a planned
+        search query): it skips the round-trip in which the model would only
+        restate them as a tool call. The answer is a single completion that
+        may not call tools again.
+        """
+        if tool_name not in self._tool_callables:
+            raise ValueError(f"{self.name} has no tool named '{tool_name}'")
+        kwargs = self._build_request(user_input)
+        call = {"id": "call_direct", "name": tool_name, "arguments": json.dumps(tool_args)}
+        sources = await self._execute_tool_calls(kwargs["messages"], None, [call])
+        kwargs["tool_choice"] = "none"
+        message = await self._complete(**kwargs)
+        return RunResult(message["content"], self.output_type, sources)
+
+    async def _run_loop(self, kwargs: dict, sources: list = None, rounds: int = 0) -> 'RunResult':
+        """Complete, run requested tools concurrently, repeat; bounded by rounds and tokens"""
+        sources = sources or []
+        tokens = 0
+        while True:
+            message = await self._complete(**kwargs)
+            tokens += message.get("tokens", 0)
+            tool_calls = message.get("tool_calls")
+            if not tool_calls:
+                return RunResult(message["content"], self.output_type, sources)
             
-            if function_name in available_functions:
-                function_result = await available_functions[function_name](**function_args)
-                
-                # Handle structured search results
-                if isinstance(function_result, dict) and 'sources' in function_result:
-                    sources = function_result['sources']
-                    function_content = function_result['content']
+            rounds += 1
+            sources = await self._execute_tool_calls(kwargs["messages"], message["content"], tool_calls, sources)
+            # Only the first round may force a tool call
+            kwargs["tool_choice"] = "auto"
+            if rounds >= self.max_tool_rounds or tokens >= self.tool_token_budget:
+                # Out of budget: one last completion that has to answer with what it has
+                logger.info(f"{self.name}: tool loop stopped after {rounds} rounds, {tokens} tokens")
+                kwargs["tool_choice"] = "none"
+                message = await self._complete(**kwargs)
+                return RunResult(message["content"], self.output_type, sources)
+
+    async def _execute_tool_calls(self, messages: list, content: Optional[str], tool_calls: list,
+                                  sources: list = None) -> list:
+        """Run one round of tool calls concurrently and append their results to ``messages``"""
+        sources = list(sources or [])
+        results = await asyncio.gather(*(self._call_tool(call) for call in tool_calls))
+        
+        messages.append({
+            "role": "assistant",
+            "content": content,
+            "tool_calls": [
+                {"id": call["id"], "type": "function",
+                 "function": {"name": call["name"], "arguments": call["arguments"]}}
+                for call in tool_calls
+            ]
+        })
+        for call, result in zip(tool_calls, results):
+            # Handle structured search results: number sources across every call
+            if isinstance(result, dict) and 'sources' in result:
+                offset = len(sources)
+                result_content = _offset_citations(result['content'], result['sources'], offset)
+                sources.extend({**source, 'id': offset + index}
+                               for index, source in enumerate(result['sources'], 1))
+            else:
+                result_content = str(result)
+            messages.append({"role": "tool", "tool_call_id": call["id"], "content": result_content})
+        return sources
+
+    async def _call_tool(self, call: dict) -> Any:
+        """Execute one tool call with a timeout; failures are reported to the model as text"""
+        function = self._tool_callables.get(call["name"])
+        if function is None:
+            return f"Error: unknown tool '{call['name']}'"
+        try:
+            arguments = json.loads(call["arguments"] or "{}")
+        except json.JSONDecodeError as e:
+            return f"Error: invalid arguments for {call['name']}: {e}"
+        try:
+            with span("tool", agent=self.name, tool=call["name"]):
+                return await asyncio.wait_for(function(**arguments), self.tool_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.name}: {call['name']} timed out after {self.tool_timeout}s")
+            return f"Error: {call['name']} timed out"
+        except Exception as e:
+            logger.error(f"{self.name}: {call['name']} failed: {e}")
+            return f"Error: {call['name']} failed: {e}"
+
+    async def stream(self, user_input: str) -> AsyncIterator[str]:
+        """Yield the completion text incrementally as the model produces it.
+
+        Only tool-less agents stream; agents with tools run normally and yield
+        their final content in one piece. Cache hits are also yielded whole.
+        """
+        if self.tools:
+            result = await self.run(user_input)
+            yield result.content
+            return
+        
+        kwargs = self._build_request(user_input)
+        key = make_key("chat", kwargs) if self.cache is not None else None
+        if key is not None:
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                record("llm", 0.0, agent=self.name, cache_hit=True, stream=True)
+                yield cached["content"]
+                return
+        
+        start = time.perf_counter()
+        first_token = None
+        usage = None
+        parts = []
+        # Only opening the stream is scheduled (and retried); tokens then flow freely
+        response = await scheduler.call("openai", lambda: self.client.chat.completions.create(
+            stream=True, stream_options={"include_usage": True}, **kwargs
+        ))
+        try:
+            async for chunk in response:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    delta = chunk.choices[0].delta.content
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    parts.append(delta)
+                    yield delta
+        finally:
+            # Hand the pooled connection back now if the consumer stops early (disconnect, cancel)
+            await response.close()
+        
+        # Recorded after the fact: the span must not straddle the yields above
+        finished = record("llm", time.perf_counter() - start, agent=self.name, stream=True,
+                          first_token_seconds=first_token)
+        record_llm_usage(self.name, self.model, usage, target=finished)
+        if key is not None:
+            await self.cache.aset(key, {"content": "".join(parts), "tool_calls": None},
+                                  cost=time.perf_counter() - start)
+
+class RunResultStreaming:
+    """Streamed agent run: iterate ``stream_events()``, then read the result"""
+
+    def __init__(self, agent: Agent, user_input: str):
+        self.agent = agent
+        self.user_input = user_input
+        self._parts = []
+        self._result = None
+
+    async def stream_events(self) -> AsyncIterator[str]:
+        """Yield raw text deltas from the model"""
+        async for delta in self.agent.stream(self.user_input):
+            self._parts.append(delta)
+            yield delta
+        self._result = RunResult("".join(self._parts), self.agent.output_type)
+
+    @property
+    def final_output(self) -> Union[str, T]:
+        if self._result is None:
+            raise RuntimeError("Stream has not finished yet")
+        return self._result.final_output
+
+    def final_output_as(self, target_type: Type[T]) -> T:
+        if self._result is None:
+            raise RuntimeError("Stream has not finished yet")
+        return self._result.final_output_as(target_type)
+
+class PartialJSONField:
+    """Incrementally decode one top-level string field from streamed JSON.
+
+    ``feed()`` takes the next raw chunk of the JSON document and returns the
+    newly decoded characters of the field's value, so a report can be shown
+    while the model is still writing the surrounding object.
+    """
+
+    _ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self, field: str):
+        self.field = field
+        self.done = False
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._token = []
+        self._last_key = None
+        self._awaiting_value = False
+        self._in_value = False
+        self._high_surrogate = None
+
+    def feed(self, chunk: str) -> str:
+        if self.done:
+            return ""
+        self._buffer += chunk
+        out = []
+        buffer = self._buffer
+        while self._pos < len(buffer) and not self.done:
+            if self._in_value:
+                if not self._read_value_char(buffer, out):
+                    break
+                continue
+            char = buffer[self._pos]
+            self._pos += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    self._token.append(char)
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = "".join(self._token)
                 else:
-                    function_content = str(function_result)
-                
-                # Add function result and get final response
-                messages.extend([
-                    {"role": "assistant", "content": None, "function_call": message.function_call},
-                    {"role": "function", "name": function_name, "content": function_content}
-                ])
-                
-                final_response = await self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=self.model_settings.temperature
-                )
-                final_content = final_response.choices[0].message.content
+                    self._token.append(char)
+            elif self._awaiting_value:
+                if char.isspace():
+                    continue
+                self._awaiting_value = False
+                if char == '"':
+                    self._in_value = True
+                else:
+                    # Not a string value; nothing to stream
+                    self.done = True
+            elif char == '"':
+                self._in_string = True
+                self._token = []
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+            elif char == ',':
+                self._last_key = None
+            elif char == ':' and self._depth == 1 and self._last_key == self.field:
+                self._awaiting_value = True
+        # Keep only what is still needed to resume mid-escape
+        self._buffer = buffer[self._pos:]
+        self._pos = 0
+        return "".join(out)
+
+    def _read_value_char(self, buffer: str, out: list) -> bool:
+        """Decode one character of the value; False when more input is needed"""
+        char = buffer[self._pos]
+        if char == '"':
+            self._pos += 1
+            self.done = True
+            return True
+        if char != '\\':
+            self._pos += 1
+            out.append(char)
+            return True
+        if self._pos + 1 >= len(buffer):
+            return False
+        code = buffer[self._pos + 1]
+        if code != 'u':
+            self._pos += 2
+            out.append(self._ESCAPES.get(code, code))
+            return True
+        if self._pos + 6 > len(buffer):
+            return False
+        codepoint = int(buffer[self._pos + 2:self._pos + 6], 16)
+        self._pos += 6
+        if 0xD800 <= codepoint < 0xDC00:
+            self._high_surrogate = codepoint
+        elif 0xDC00 <= codepoint < 0xE000 and self._high_surrogate is not None:
+            combined = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (codepoint - 0xDC00)
+            self._high_surrogate = None
+            out.append(chr(combined))
         else:
-            final_content = message.content
-        
-        return RunResult(final_content, self.output_type, sources)
+            out.append(chr(codepoint))
+        return True
 
 class RunResult:
     def __init__(self, content: str, output_type: Type[T] = None, sources: list = None):
@@ -203,20 +591,8 @@ class RunResult:
         """Get the final output, parsed if output_type is specified"""
         if self.output_type and self._parsed_output is None:
             try:
-                # Parse JSON content into Pydantic model
-                if self.content.strip().startswith('{'):
-                    json_data = json.loads(self.content)
-                    self._parsed_output = self.output_type(**json_data)
-                else:
-                    # Try to extract JSON from content
-                    import re
-                    json_match = re.search(r'\{.*\}', self.content, re.DOTALL)
-                    if json_match:
-                        json_data = json.loads(json_match.group())
-                        self._parsed_output = self.output_type(**json_data)
-                    else:
-                        raise ValueError("No valid JSON found in response")
-            except Exception as e:
+                self._parsed_output = parse_output(self.content, self.output_type)
+            except ValueError as e:
                 logger.error(f"Failed to parse output: {e}")
                 self._parsed_output = self.content
         
@@ -232,4 +608,14 @@ class Runner:
     @staticmethod
     async def run(agent: Agent, user_input: str) -> RunResult:
         """Run an agent with user input"""
-        return await agent.run(user_input)
\ No newline at end of file
+        return await agent.run(user_input)
+
+    @staticmethod
+    async def run_direct(agent: Agent, user_input: str, tool_name: str = "web_search", **tool_args) -> RunResult:
+        """Run an agent's tool directly, with one completion over the result"""
+        return await agent.run_direct(user_input, tool_name, **tool_args)
+
+    @staticmethod
+    def run_streamed(agent: Agent, user_input: str) -> RunResultStreaming:
+        """Start a streamed run; iterate ``stream_events()`` to drive it"""
+        return RunResultStreaming(agent, user_input)
\ No newline at end of file
@@ -0,0 +1,123 @@
+import json
+import logging
+
+from research_manager import (ResearchManager, ReportDelta, SUMMARIZE_STRATEGIES, DEFAULT_SUMMARIZE_STRATEGY,
+                              PLANNER_STRATEGIES, DEFAULT_PLANNER)
+from depth_profiles import DEPTH_PROFILES, DEFAULT_DEPTH, DEFAULT_ADAPTIVE
+from cache import make_key, normalize_query
+from coalesce import research_flights
+from report_store import report_store, REPORT_REFRESH_AFTER, ReportMatch
+from prefetch import follow_up_prefetcher
+from scheduler import BACKGROUND
+from tracing import gen_trace_id
+
+logger = logging.getLogger(__name__)
+
+MAX_QUERY_LENGTH = 500
+
+STORED_REPORT_MESSAGE = "⚡ Found a recent report for this question"
+
+
+def parse_query(data) -> str:
+    """The stripped query from a request body; ValueError when missing or too long"""
+    query = (data or {}).get('query', '').strip()
+    if not query:
+        raise ValueError("Query is required")
+    if len(query) > MAX_QUERY_LENGTH:
+        raise ValueError(f"Query too long (max {MAX_QUERY_LENGTH} characters)")
+    return query
+
+
+def research_options(data):
+    """ResearchManager options from the request body; ValueError when one is invalid"""
+    strategy = data.get('strategy') or DEFAULT_SUMMARIZE_STRATEGY
+    if strategy not in SUMMARIZE_STRATEGIES:
+        raise ValueError(f"Unknown strategy (expected one of {', '.join(SUMMARIZE_STRATEGIES)})")
+    depth = data.get('depth') or DEFAULT_DEPTH
+    if depth not in DEPTH_PROFILES:
+        raise ValueError(f"Unknown depth (expected one of {', '.join(DEPTH_PROFILES)})")
+    adaptive = data.get('adaptive', DEFAULT_ADAPTIVE)
+    if not isinstance(adaptive, bool):
+        raise ValueError("adaptive must be true or false")
+    planner = data.get('planner') or DEFAULT_PLANNER
+    if planner not in PLANNER_STRATEGIES:
+        raise ValueError(f"Unknown planner (expected one of {', '.join(PLANNER_STRATEGIES)})")
+    return {"summarize_strategy": strategy, "depth": depth, "adaptive": adaptive, "planner": planner}
+
+
+def find_stored_report(data, query, options: dict) -> ReportMatch | None:
+    """Recent report for a matching query run with the same options, unless the request opted out"""
+    if report_store is None or data.get('reuse') is False:
+        return None
+    match = report_store.lookup(query, options=options)
+    if match is not None:
+        follow_up_prefetcher.claim(match.query, "report_store")
+    return match
+
+
+def refresh_if_stale(match: ReportMatch, options: dict):
+    """Re-research a stale stored report in the background (call on the event loop)"""
+    if match.age <= REPORT_REFRESH_AFTER:
+        return
+    trace_id = gen_trace_id()
+    # Keyed apart from /search so interactive requests never wait on a background run
+    research_flights.join(
+        make_key("refresh", normalize_query(match.query)),
+        lambda: ResearchManager(trace_id=trace_id, priority=BACKGROUND, **options).run(match.query),
+        trace_id=trace_id,
+    )
+    logger.info(f"[{trace_id}] Refreshing stored report for '{match.query}'")
+
+
+def start_research(endpoint: str, query: str, options: dict, stream_report: bool = False,
+                   user: str = None):
+    """Join (or start) the single-flight pipeline for a query (call on the event loop)"""
+    # A prefetched question that missed the report store still runs on warm caches
+    follow_up_prefetcher.claim(query, "caches")
+    trace_id = gen_trace_id()
+    return research_flights.join(
+        make_key(endpoint, options, normalize_query(query)),
+        lambda: ResearchManager(stream_report=stream_report, trace_id=trace_id, user=user,
+                                **options).run(query),
+        trace_id=trace_id,
+    )
+
+
+def chunk_event(chunk) -> dict:
+    """Stream event for one item yielded by ResearchManager.run"""
+    if isinstance(chunk, ReportDelta):
+        return {'type': 'report_delta', 'delta': chunk.text}
+    return {'type': 'update', 'message': chunk}
+
+
+def stored_report_events(match: ReportMatch) -> list:
+    """The events /search replays when it answers from the report store"""
+    return [
+        {'type': 'stored_report', **match.to_dict()},
+        {'type': 'update', 'message': STORED_REPORT_MESSAGE},
+        {'type': 'update', 'message': '✅ Report complete'},
+        {'type': 'update', 'message': match.report['markdown_report']},
+        {'type': 'complete'},
+    ]
+
+
+def stored_report_response(query: str, match: ReportMatch) -> dict:
+    """/search_simple body for a report served from the store"""
+    return {
+        "query": query,
+        "updates": [STORED_REPORT_MESSAGE, "✅ Report complete"],
+        "report": match.report['markdown_report'],
+        "status": "completed",
+        "stored_report": match.to_dict(),
+    }
+
+
+def is_report(chunk: str) -> bool:
+    """Whether a non-streamed update is the final markdown report"""
+    return chunk.startswith('#') or len(chunk) > 200
+
+
+def sse(event: dict, event_id: int = None) -> str:
+    """One server-sent event frame"""
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}data: {json.dumps(event)}\n\n"
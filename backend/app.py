@@ -1,8 +1,12 @@
 from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
-import json
-import asyncio
-from research_manager import ResearchManager
+from api_common import (parse_query, research_options, find_stored_report, refresh_if_stale, start_research,
+                        chunk_event, stored_report_events, stored_report_response, is_report, sse)
+from runtime import background_loop
+from cache import cache_registry
+from jobs import research_jobs, JobQueueFull
+from prefetch import follow_up_prefetcher
+from tracing import metrics, recent_traces
 import logging
 
 # Configure logging
@@ -16,55 +20,71 @@ CORS(app)
 def health_check():
     return jsonify({"status": "healthy", "service": "Reddit Research Engine"})
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit, miss and eviction counters for every registered cache"""
+    return jsonify({name: cache.stats_dict() for name, cache in cache_registry.items()})
+
+@app.route('/prefetch/stats', methods=['GET'])
+def prefetch_stats():
+    """Follow-up prefetch hit rate and spent / wasted tokens and searches"""
+    return jsonify(follow_up_prefetcher.stats_dict())
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text exposition of stage latency, token and cache metrics"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/traces/<trace_id>', methods=['GET'])
+def get_trace(trace_id):
+    """JSON span dump for a recent request (id from the X-Trace-Id header)"""
+    trace = recent_traces.get(trace_id)
+    if trace is None:
+        return jsonify({"error": "Trace not found"}), 404
+    return jsonify(trace.to_dict())
+
+def request_user():
+    """Who is asking, for per-user budgets: X-User-Id, else the client address"""
+    return request.headers.get('X-User-Id') or request.remote_addr
+
 @app.route('/search', methods=['POST'])
 def search():
     """Streaming search endpoint"""
     try:
         data = request.get_json()
-        query = data.get('query', '').strip()
-        
-        if not query:
-            return jsonify({"error": "Query is required"}), 400
-        
-        if len(query) > 500:  # Limit query length
-            return jsonify({"error": "Query too long (max 500 characters)"}), 400
+        try:
+            query = parse_query(data)
+            options = research_options(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        match = find_stored_report(data, query, options)
+        if match is not None:
+            background_loop.call(refresh_if_stale, match, options)
+
+            def replay():
+                for event in stored_report_events(match):
+                    yield sse(event)
+
+            return Response(replay(), mimetype='text/plain', headers={
+                'Cache-Control': 'no-cache',
+                'X-Report-Store': 'exact' if match.exact else 'similar',
+                'Access-Control-Allow-Origin': '*',
+            })
+
+        # Concurrent identical queries attach to one running pipeline
+        flight = background_loop.call(start_research, "search", query, options, stream_report=True,
+                                      user=request_user())
 
         def generate():
             try:
-                # Create event loop for this thread
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                async def run_research():
-                    research_manager = ResearchManager()
-                    async for chunk in research_manager.run(query):
-                        yield chunk
-                
-                # Execute async generator
-                async def async_gen():
-                    async for chunk in run_research():
-                        yield chunk
-                
-                gen = async_gen()
-                
-                try:
-                    while True:
-                        try:
-                            chunk = loop.run_until_complete(gen.__anext__())
-                            # Send formatted chunk
-                            yield f"data: {json.dumps({'type': 'update', 'message': chunk})}\n\n"
-                        except StopAsyncIteration:
-                            yield f"data: {json.dumps({'type': 'complete'})}\n\n"
-                            break
-                except Exception as e:
-                    logger.error(f"Research error: {e}")
-                    yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
-                finally:
-                    loop.close()
-                    
+                # Drive the pipeline on the shared background loop
+                for chunk in background_loop.iterate(flight.subscribe()):
+                    yield sse(chunk_event(chunk))
+                yield sse({'type': 'complete'})
             except Exception as e:
-                logger.error(f"Generation error: {e}")
-                yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+                logger.error(f"Research error: {e}")
+                yield sse({'type': 'error', 'message': str(e)})
         
         return Response(
             generate(),
@@ -72,6 +92,7 @@ def search():
             headers={
                 'Cache-Control': 'no-cache',
                 'Connection': 'keep-alive',
+                'X-Trace-Id': flight.trace_id,
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Headers': 'Content-Type',
                 'Access-Control-Allow-Methods': 'POST, GET, OPTIONS'
@@ -87,49 +108,114 @@ def search_simple():
     """Non-streaming endpoint for testing"""
     try:
         data = request.get_json()
-        query = data.get('query', '').strip()
+        try:
+            query = parse_query(data)
+            options = research_options(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        if not query:
-            return jsonify({"error": "Query is required"}), 400
-            
-        if len(query) > 500:
-            return jsonify({"error": "Query too long (max 500 characters)"}), 400
+        match = find_stored_report(data, query, options)
+        if match is not None:
+            background_loop.call(refresh_if_stale, match, options)
+            return jsonify(stored_report_response(query, match))
+
+        flight = background_loop.call(start_research, "search_simple", query, options, user=request_user())
         
-        # Create event loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        # Collect all updates
+        updates = []
+        final_report = None
         
-        try:
-            research_manager = ResearchManager()
-            
-            # Collect all updates
-            updates = []
-            final_report = None
-            
-            async def collect_results():
-                nonlocal final_report
-                async for chunk in research_manager.run(query):
-                    if chunk.startswith('#') or len(chunk) > 200:  # Likely the final report
-                        final_report = chunk
-                    else:
-                        updates.append(chunk)
-            
-            loop.run_until_complete(collect_results())
-            
-            return jsonify({
-                "query": query,
-                "updates": updates,
-                "report": final_report or "No report generated",
-                "status": "completed"
-            })
-            
-        finally:
-            loop.close()
+        async def collect_results():
+            nonlocal final_report
+            async for chunk in flight.subscribe():
+                if is_report(chunk):  # Likely the final report
+                    final_report = chunk
+                else:
+                    updates.append(chunk)
+        
+        background_loop.run(collect_results())
+        
+        return jsonify({
+            "query": query,
+            "updates": updates,
+            "report": final_report or "No report generated",
+            "status": "completed",
+            "trace_id": flight.trace_id
+        })
             
     except Exception as e:
         logger.error(f"Simple search error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/research', methods=['POST'])
+def create_research_job():
+    """Queue a research run that continues independently of this connection"""
+    try:
+        data = request.get_json()
+        try:
+            query = parse_query(data)
+            options = research_options(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        try:
+            job = background_loop.call(research_jobs.submit, query, options)
+        except JobQueueFull as e:
+            return jsonify({"error": str(e)}), 503, {'Retry-After': '5'}
+
+        return jsonify({
+            **job.to_dict(include_report=False),
+            "events_url": f"/research/{job.id}/events",
+        }), 202
+
+    except Exception as e:
+        logger.error(f"Research job error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/research/<job_id>', methods=['GET'])
+def get_research_job(job_id):
+    """Status of a research job, with the report once it is done"""
+    job = background_loop.run(research_jobs.get(job_id))
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/research/<job_id>', methods=['DELETE'])
+def cancel_research_job(job_id):
+    """Cancel a queued or running research job"""
+    job = background_loop.run(research_jobs.cancel(job_id))
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict(include_report=False))
+
+@app.route('/research/<job_id>/events', methods=['GET'])
+def research_job_events(job_id):
+    """SSE stream of a job's events, resuming after Last-Event-ID if given"""
+    job = background_loop.run(research_jobs.get(job_id))
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0
+    try:
+        last_event_id = int(last_event_id)
+    except ValueError:
+        return jsonify({"error": "Last-Event-ID must be an integer"}), 400
+
+    def generate():
+        # Disconnecting only stops this stream; the job keeps running
+        for event_id, event in background_loop.iterate(job.stream(last_event_id)):
+            yield sse(event, event_id)
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Trace-Id': job.trace_id,
+            'Access-Control-Allow-Origin': '*',
+        }
+    )
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({"error": "Endpoint not found"}), 404
@@ -0,0 +1,272 @@
+import os
+import asyncio
+import logging
+from typing import Any, AsyncIterator
+
+import anyio
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from api_common import (parse_query, research_options, find_stored_report, refresh_if_stale, start_research,
+                        chunk_event, stored_report_events, stored_report_response, is_report, sse)
+from cache import cache_registry
+from jobs import research_jobs, JobQueueFull
+from prefetch import follow_up_prefetcher
+from tracing import metrics, recent_traces
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds of silence after which an SSE comment is sent to keep proxies from closing the stream
+SSE_HEARTBEAT = float(os.getenv('SSE_HEARTBEAT', '15'))
+HEARTBEAT_FRAME = ": keep-alive\n\n"
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive',
+    # Stop nginx from buffering the stream
+    'X-Accel-Buffering': 'no',
+}
+
+
+async def with_heartbeats(events: AsyncIterator[Any], interval: float = SSE_HEARTBEAT) -> AsyncIterator[Any]:
+    """Yield from ``events``, and None whenever ``interval`` passes without one.
+
+    The pending ``__anext__`` is never cancelled by a heartbeat, only when
+    the response itself is cancelled (client disconnect), in which case
+    ``events`` is closed so upstream work stops.
+    """
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(events.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield None
+                continue
+            try:
+                event = pending.result()
+            except StopAsyncIteration:
+                pending = None
+                return
+            pending = None
+            yield event
+    finally:
+        # Cancellation of the response is level-triggered; shield the cleanup
+        with anyio.CancelScope(shield=True):
+            if pending is not None:
+                pending.cancel()
+                await asyncio.gather(pending, return_exceptions=True)
+            await events.aclose()
+
+
+async def read_json(request: Request) -> dict:
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(400, "Invalid JSON body")
+    if not isinstance(data, dict):
+        raise HTTPException(400, "Invalid JSON body")
+    return data
+
+
+async def health_check(request: Request):
+    return JSONResponse({"status": "healthy", "service": "Reddit Research Engine"})
+
+
+async def cache_stats(request: Request):
+    """Hit, miss and eviction counters for every registered cache"""
+    # Disk tiers count their SQLite rows
+    stats = await run_in_threadpool(lambda: {name: cache.stats_dict() for name, cache in cache_registry.items()})
+    return JSONResponse(stats)
+
+
+async def prefetch_stats(request: Request):
+    """Follow-up prefetch hit rate and spent / wasted tokens and searches"""
+    return JSONResponse(follow_up_prefetcher.stats_dict())
+
+
+async def prometheus_metrics(request: Request):
+    """Prometheus text exposition of stage latency, token and cache metrics"""
+    body = await run_in_threadpool(metrics.render)
+    return Response(body, media_type='text/plain; version=0.0.4')
+
+
+async def get_trace(request: Request):
+    """JSON span dump for a recent request (id from the X-Trace-Id header)"""
+    trace = recent_traces.get(request.path_params['trace_id'])
+    if trace is None:
+        return JSONResponse({"error": "Trace not found"}, status_code=404)
+    return JSONResponse(trace.to_dict())
+
+
+def request_user(request: Request) -> str:
+    """Who is asking, for per-user budgets: X-User-Id, else the client address"""
+    return request.headers.get('X-User-Id') or (request.client.host if request.client else None)
+
+
+async def parse_research_request(request: Request) -> tuple:
+    data = await read_json(request)
+    try:
+        return data, parse_query(data), research_options(data)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+async def search(request: Request):
+    """Streaming search endpoint (text/event-stream)"""
+    data, query, options = await parse_research_request(request)
+
+    match = await run_in_threadpool(find_stored_report, data, query, options)
+    if match is not None:
+        refresh_if_stale(match, options)
+
+        async def replay():
+            for event in stored_report_events(match):
+                yield sse(event)
+
+        return StreamingResponse(replay(), media_type='text/event-stream', headers={
+            **SSE_HEADERS, 'X-Report-Store': 'exact' if match.exact else 'similar',
+        })
+
+    # Concurrent identical queries attach to one running pipeline
+    flight = start_research("search", query, options, stream_report=True, user=request_user(request))
+
+    async def generate():
+        try:
+            async for chunk in with_heartbeats(flight.subscribe()):
+                yield HEARTBEAT_FRAME if chunk is None else sse(chunk_event(chunk))
+            yield sse({'type': 'complete'})
+        except asyncio.CancelledError:
+            logger.info(f"[{flight.trace_id}] Client disconnected")
+            raise
+        except Exception as e:
+            logger.error(f"Research error: {e}")
+            yield sse({'type': 'error', 'message': str(e)})
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers={
+        **SSE_HEADERS, 'X-Trace-Id': flight.trace_id,
+    })
+
+
+async def search_simple(request: Request):
+    """Non-streaming endpoint for testing"""
+    data, query, options = await parse_research_request(request)
+
+    match = await run_in_threadpool(find_stored_report, data, query, options)
+    if match is not None:
+        refresh_if_stale(match, options)
+        return JSONResponse(stored_report_response(query, match))
+
+    flight = start_research("search_simple", query, options, user=request_user(request))
+    updates = []
+    final_report = None
+    try:
+        async for chunk in flight.subscribe():
+            if is_report(chunk):  # Likely the final report
+                final_report = chunk
+            else:
+                updates.append(chunk)
+    except Exception as e:
+        logger.error(f"Simple search error: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+    return JSONResponse({
+        "query": query,
+        "updates": updates,
+        "report": final_report or "No report generated",
+        "status": "completed",
+        "trace_id": flight.trace_id,
+    })
+
+
+async def create_research_job(request: Request):
+    """Queue a research run that continues independently of this connection"""
+    _, query, options = await parse_research_request(request)
+    try:
+        job = research_jobs.submit(query, options)
+    except JobQueueFull as e:
+        return JSONResponse({"error": str(e)}, status_code=503, headers={'Retry-After': '5'})
+    return JSONResponse({
+        **job.to_dict(include_report=False),
+        "events_url": f"/research/{job.id}/events",
+    }, status_code=202)
+
+
+async def get_research_job(request: Request):
+    """Status of a research job, with the report once it is done"""
+    job = await research_jobs.get(request.path_params['job_id'])
+    if job is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    return JSONResponse(job.to_dict())
+
+
+async def cancel_research_job(request: Request):
+    """Cancel a queued or running research job"""
+    job = await research_jobs.cancel(request.path_params['job_id'])
+    if job is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    return JSONResponse(job.to_dict(include_report=False))
+
+
+async def research_job_events(request: Request):
+    """SSE stream of a job's events, resuming after Last-Event-ID if given"""
+    job = await research_jobs.get(request.path_params['job_id'])
+    if job is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id') or 0
+    try:
+        last_event_id = int(last_event_id)
+    except ValueError:
+        return JSONResponse({"error": "Last-Event-ID must be an integer"}, status_code=400)
+
+    async def generate():
+        # Disconnecting only stops this stream; the job keeps running
+        async for item in with_heartbeats(job.stream(last_event_id)):
+            yield HEARTBEAT_FRAME if item is None else sse(item[1], item[0])
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers={
+        **SSE_HEADERS, 'X-Trace-Id': job.trace_id,
+    })
+
+
+async def http_error(request: Request, exc: HTTPException):
+    if exc.status_code == 404:
+        return JSONResponse({"error": "Endpoint not found"}, status_code=404)
+    return JSONResponse({"error": exc.detail}, status_code=exc.status_code)
+
+
+async def internal_error(request: Request, exc: Exception):
+    logger.error(f"{request.url.path} error: {exc}")
+    return JSONResponse({"error": "Internal server error"}, status_code=500)
+
+
+app = Starlette(
+    routes=[
+        Route('/health', health_check, methods=['GET']),
+        Route('/cache/stats', cache_stats, methods=['GET']),
+        Route('/prefetch/stats', prefetch_stats, methods=['GET']),
+        Route('/metrics', prometheus_metrics, methods=['GET']),
+        Route('/traces/{trace_id}', get_trace, methods=['GET']),
+        Route('/search', search, methods=['POST']),
+        Route('/search_simple', search_simple, methods=['POST']),
+        Route('/research', create_research_job, methods=['POST']),
+        Route('/research/{job_id}', get_research_job, methods=['GET']),
+        Route('/research/{job_id}', cancel_research_job, methods=['DELETE']),
+        Route('/research/{job_id}/events', research_job_events, methods=['GET']),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['GET', 'POST', 'DELETE', 'OPTIONS'],
+                   allow_headers=['Content-Type', 'Last-Event-ID', 'X-User-Id'],
+                   expose_headers=['X-Trace-Id', 'X-Report-Store']),
+    ],
+    exception_handlers={HTTPException: http_error, Exception: internal_error},
+)
@@ -0,0 +1,100 @@
+"""Micro-benchmark structured-output parsing and schema prompt construction.
+
+Runs the previous parser (json.loads / greedy ``\\{.*\\}`` regex, then
+``Model(**data)``) and ``structured_output.parse_output`` over a corpus of
+well-formed and malformed model outputs, reporting µs per call and whether
+each one recovered the object. Also times building the schema prompt per
+call against the precomputed per-agent version.
+
+    uv run backend/benchmarks/bench_parsing.py --iterations 200
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("REPORT_STORE_PATH", "")
+
+from structured_output import parse_output, response_format, schema_instruction
+from planner_agent import WebSearchPlan
+from writer_agent import ReportData
+
+
+def legacy_parse(content: str, output_type):
+    """The parser RunResult used before structured_output"""
+    if content.strip().startswith('{'):
+        return output_type(**json.loads(content))
+    match = re.search(r'\{.*\}', content, re.DOTALL)
+    if match:
+        return output_type(**json.loads(match.group()))
+    raise ValueError("No valid JSON found in response")
+
+
+def corpus() -> list:
+    plan = json.dumps({"searches": [
+        {"reason": f"Angle {i} on budget keyboards", "query": f"site:reddit.com budget keyboard angle {i}"}
+        for i in range(5)
+    ]})
+    report = json.dumps({
+        "short_summary": "Redditors favour hot-swappable boards. Switch choice matters more than brand.",
+        "markdown_report": "# Budget Keyboards\n\n" + (
+            "Users say {tactile} switches [1] feel better; see `config = {\"layout\": \"tkl\"}` [2].\n\n" * 400),
+        "follow_up_questions": ["Which switches?", "Are wireless boards worth it?", "Best keycaps?"],
+    })
+    noisy_prose = "Here is my analysis { of the thread, with {braces} and \"quotes\" scattered around. " * 300
+    return [
+        ("plan: clean", plan, WebSearchPlan),
+        ("report: clean (60KB)", report, ReportData),
+        ("plan: code fence", f"```json\n{plan}\n```", WebSearchPlan),
+        ("plan: prose around", f"Sure! Here is the plan:\n{plan}\nLet me know if you need more.", WebSearchPlan),
+        ("report: prose + trailing {", f"Report follows.\n{report}\nNote: {{ unfinished", ReportData),
+        ("plan: stray { before", f"Thinking {{ about it... {plan}", WebSearchPlan),
+        ("plan: two objects", f"{{\"note\": \"draft\"}} then final: {plan}", WebSearchPlan),
+        ("plan: truncated", plan[: len(plan) // 2], WebSearchPlan),
+        ("noisy prose (25KB), no JSON", noisy_prose, WebSearchPlan),
+        ("5k unclosed {", "{" * 5000, WebSearchPlan),
+    ]
+
+
+def timed(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def attempt(parser, content, output_type):
+    try:
+        return isinstance(parser(content, output_type), output_type)
+    except Exception:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    print(f"{'case':<30} {'legacy µs':>12} {'ok':>4} {'new µs':>12} {'ok':>4}")
+    for label, content, output_type in corpus():
+        legacy_ok = attempt(legacy_parse, content, output_type)
+        new_ok = attempt(parse_output, content, output_type)
+        legacy = timed(lambda: attempt(legacy_parse, content, output_type), args.iterations)
+        new = timed(lambda: attempt(parse_output, content, output_type), args.iterations)
+        print(f"{label:<30} {legacy:12.1f} {'y' if legacy_ok else 'n':>4} {new:12.1f} {'y' if new_ok else 'n':>4}")
+
+    iterations = args.iterations * 10
+    per_call = timed(lambda: f"\n\nRespond with valid JSON matching this schema: {ReportData.model_json_schema()}",
+                     iterations)
+    cached = timed(lambda: (schema_instruction(ReportData), response_format(ReportData, True)), iterations)
+    print(f"\n{'schema prompt per call':<30} {per_call:12.1f} µs")
+    print(f"{'schema prompt precomputed':<30} {cached:12.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
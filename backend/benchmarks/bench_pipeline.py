@@ -0,0 +1,71 @@
+"""Compare end-to-end latency of waiting for every search vs a quorum/deadline.
+
+One planned search is made much slower than the others on the fake Tavily
+server. The baseline waits for it; the pipelined run writes the report
+from the quorum once the deadline passes and drops the straggler.
+
+    uv run backend/benchmarks/bench_pipeline.py --slow 3.0 --deadline 1.0 --quorum 2
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.stubs import StubServer, fake_openai, fake_tavily
+
+
+async def research(manager, query):
+    async for _ in manager.run(query):
+        pass
+    return manager.timings
+
+
+def show(label, timings):
+    stages = ", ".join(
+        f"{stage}={value:.3f}s" if isinstance(value, float) else f"{stage}={value}"
+        for stage, value in timings.items()
+    )
+    print(f"{label:<10} {stages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fast", type=float, default=0.3, help="latency of normal searches")
+    parser.add_argument("--slow", type=float, default=3.0, help="latency of the straggler search")
+    parser.add_argument("--quorum", type=int, default=2)
+    parser.add_argument("--deadline", type=float, default=1.0)
+    parser.add_argument("--openai-latency", type=float, default=0.1)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    def tavily_latency(path, payload):
+        return args.slow if payload.get("query", "").endswith("angle 3") else args.fast
+
+    with StubServer(fake_openai, latency=args.openai_latency) as openai_stub, \
+            StubServer(fake_tavily, latency=tavily_latency) as tavily_stub:
+        os.environ.update({
+            "OPENAI_BASE_URL": f"{openai_stub.url}/v1",
+            "OPENAI_API_KEY": "stub",
+            "TAVILY_BASE_URL": tavily_stub.url,
+            "TAVILY_API_KEY": "stub",
+            "PLANNER_CACHE_DISK_PATH": "",
+            "WRITER_CACHE_DISK_PATH": "",
+        })
+        from research_manager import ResearchManager
+
+        baseline = asyncio.run(research(ResearchManager(), "benchmark baseline"))
+        pipelined = asyncio.run(research(
+            ResearchManager(quorum=args.quorum, deadline=args.deadline), "benchmark pipelined"
+        ))
+
+    show("baseline", baseline)
+    show("pipelined", pipelined)
+    print(f"end-to-end saved: {baseline['total'] - pipelined['total']:.3f}s "
+          f"({1 - pipelined['total'] / baseline['total']:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Compare the local search planner with the planner agent.
+
+Reports, for a set of realistic queries:
+
+- how long plan_locally takes per plan, against a planner agent call
+- how closely the local plan matches the planner agent's: share of the
+  agent's search terms the local plan also covers, mean best-match term
+  overlap (Dice) per agent search, and shared subreddits
+- time from the start of a research run to its first search, and total
+  run time, for the llm, local and hybrid planner strategies
+
+Against the stand-in servers the planner agent only echoes the query, so
+the overlap numbers are meaningful with --live alone, which calls the
+real planner agent (OPENAI_API_KEY must be set) and skips the pipeline
+runs so no searches are billed.
+
+    uv run backend/benchmarks/bench_planner.py
+    uv run backend/benchmarks/bench_planner.py --live
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+# Local plans repeat across strategies; nothing but the planner may be served from a cache
+os.environ.update({"PLANNER_CACHE_DISK_PATH": "", "WRITER_CACHE_DISK_PATH": "", "WRITER_CACHE_TTL": "0",
+                   "SEARCH_CACHE_TTL": "0", "REPORT_STORE_PATH": ""})
+
+from benchmarks.stubs import StubServer, fake_openai, fake_tavily
+
+QUERIES = [
+    "What are the best noise cancelling headphones for travel?",
+    "python vs javascript for beginners",
+    "how to fix wifi dropping on my laptop",
+    "Is the Steam Deck worth it?",
+    "tips for learning spanish fast",
+    "what does reddit think about index funds vs individual stocks",
+    "best espresso machine under 500",
+    "how do people deal with adhd at work",
+    "best budget mechanical keyboard",
+    "is a standing desk worth it",
+    "what running shoes do redditors recommend for flat feet",
+    "how to get started with homelab servers",
+    "mirrorless camera for beginners",
+    "cheap meal prep ideas for the gym",
+    "is it worth buying an electric car in 2024",
+    "how to stop procrastinating",
+]
+
+_SUBREDDIT = re.compile(r"reddit\.com/r/(\w+)", re.IGNORECASE)
+_run_ids = itertools.count()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def local_plan_seconds(count: int, repeats: int) -> float:
+    """Mean seconds per plan_locally call over every query"""
+    from local_planner import plan_locally
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for query in QUERIES:
+            plan_locally(query, count)
+    return (time.perf_counter() - start) / (repeats * len(QUERIES))
+
+
+def overlap(local_searches, agent_searches) -> dict:
+    """How much of the agent's plan the local plan covers"""
+    from local_planner import search_terms
+    from report_store import term_similarity
+
+    local_terms = [search_terms(item.query) for item in local_searches]
+    agent_terms = [search_terms(item.query) for item in agent_searches]
+    covered = set().union(*local_terms) if local_terms else set()
+    wanted = set().union(*agent_terms) if agent_terms else set()
+    best = [max((term_similarity(terms, other) for other in local_terms), default=0.0) for terms in agent_terms]
+    local_subs = {name.lower() for item in local_searches for name in _SUBREDDIT.findall(item.query)}
+    agent_subs = {name.lower() for item in agent_searches for name in _SUBREDDIT.findall(item.query)}
+    return {
+        "recall": len(wanted & covered) / len(wanted) if wanted else 0.0,
+        "best_match": sum(best) / len(best) if best else 0.0,
+        "shared_subs": len(local_subs & agent_subs),
+        "agent_subs": len(agent_subs),
+    }
+
+
+async def compare_plans(count: int, show: bool) -> dict:
+    from agent_base import Runner
+    from depth_profiles import DEPTH_PROFILES
+    from local_planner import plan_locally
+    from planner_agent import WebSearchPlan
+
+    planner = DEPTH_PROFILES["standard"].planner
+    agent_latencies = []
+    rows = []
+    for query in QUERIES:
+        start = time.perf_counter()
+        result = await Runner.run(planner, f"Query: {query}")
+        agent_latencies.append(time.perf_counter() - start)
+        agent = result.final_output_as(WebSearchPlan).searches
+        local_plan = plan_locally(query, count)
+        local = local_plan.searches if local_plan is not None else []
+        rows.append(overlap(local, agent))
+        if show:
+            print(f"\n{query}")
+            for label, searches in (("agent", agent), ("local", local)):
+                for item in searches:
+                    print(f"  {label:<6} {item.query}")
+    return {
+        "agent_p50": percentile(agent_latencies, 50),
+        "recall": sum(row["recall"] for row in rows) / len(rows),
+        "best_match": sum(row["best_match"] for row in rows) / len(rows),
+        "shared_subs": sum(row["shared_subs"] for row in rows),
+        "agent_subs": sum(row["agent_subs"] for row in rows),
+    }
+
+
+async def first_search(planner: str, runs: int) -> dict:
+    """Time to the first search span, total time and searches run, per research run"""
+    from research_manager import ResearchManager
+    from tracing import recent_traces
+
+    to_first, totals, searches = [], [], []
+    for query in itertools.islice(itertools.cycle(QUERIES), runs):
+        manager = ResearchManager(planner=planner, adaptive=False)
+        async for _ in manager.run(f"{query} {next(_run_ids)} {time.time_ns()}"):
+            pass
+        trace = recent_traces[manager.trace_id]
+        starts = [span.start_time for span in trace.spans if span.name == "search"]
+        to_first.append(min(starts) - trace.start_time)
+        totals.append(manager.timings["total"])
+        searches.append(len(starts))
+    return {
+        "first_p50": percentile(to_first, 50),
+        "first_p95": percentile(to_first, 95),
+        "total_p50": percentile(totals, 50),
+        "searches": sum(searches) / len(searches),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--live", action="store_true", help="compare against the real planner agent")
+    parser.add_argument("--show", action="store_true", help="print both plans for every query")
+    parser.add_argument("--count", type=int, default=3, help="searches per local plan")
+    parser.add_argument("--runs", type=int, default=8, help="research runs per planner strategy")
+    parser.add_argument("--repeats", type=int, default=200, help="passes over the queries when timing plan_locally")
+    parser.add_argument("--openai-latency", type=float, default=0.6)
+    parser.add_argument("--tavily-latency", type=float, default=0.4)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    print(f"plan_locally: {local_plan_seconds(args.count, args.repeats) * 1e6:.1f}us per plan")
+    if args.live:
+        result = asyncio.run(compare_plans(args.count, args.show))
+    else:
+        with StubServer(fake_openai, latency=args.openai_latency) as openai_stub, \
+                StubServer(fake_tavily, latency=args.tavily_latency) as tavily_stub:
+            os.environ.update({
+                "OPENAI_BASE_URL": f"{openai_stub.url}/v1",
+                "OPENAI_API_KEY": "stub",
+                "TAVILY_BASE_URL": tavily_stub.url,
+                "TAVILY_API_KEY": "stub",
+            })
+            result = asyncio.run(compare_plans(args.count, args.show))
+            print(f"\n{'planner':<8} {'first search p50':>17} {'p95':>8} {'total p50':>10} {'searches':>9}")
+            for planner in ("llm", "local", "hybrid"):
+                timing = asyncio.run(first_search(planner, args.runs))
+                print(f"{planner:<8} {timing['first_p50']:16.4f}s {timing['first_p95']:7.4f}s "
+                      f"{timing['total_p50']:9.3f}s {timing['searches']:>9.1f}")
+
+    print(f"\nplanner agent p50: {result['agent_p50']:.3f}s")
+    print(f"overlap with the planner agent: term recall {result['recall']:.0%}, "
+          f"best-match Dice {result['best_match']:.2f}, "
+          f"subreddits shared {result['shared_subs']}/{result['agent_subs']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark speculative follow-up prefetching.
+
+Simulated users ask a question through the ASGI app, read the report for
+a while, and then some of them ask one of its follow-up questions. The
+run is done with prefetching off and on. For each pass it reports the
+follow-up latency, upstream request counts and the prefetcher's
+accounting: hit rate, and tokens/searches spent vs wasted (unused
+prefetches are expired at the end).
+
+    uv run backend/benchmarks/bench_prefetch.py --users 20 --think 3 --click-rate 0.6
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ["REPORT_STORE_PATH"] = os.path.join(tempfile.mkdtemp(), "reports.sqlite3")
+
+from benchmarks.stubs import FOLLOW_UP_TEMPLATES, StubServer, fake_openai, fake_tavily
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def session(client, user: int, label: str, args, follow_up_latencies: list):
+    rng = random.Random(args.seed + user)
+    headers = {"X-User-Id": f"user-{user}"}
+    topic = f"{label}gizmo{user} {label}widget{user} {label}gadget{user}"
+    response = await client.post("/search_simple", json={"query": topic}, headers=headers)
+    response.raise_for_status()
+    await asyncio.sleep(args.think * rng.uniform(0.5, 1.5))
+    if rng.random() >= args.click_rate:
+        return
+    follow_up = rng.choice(FOLLOW_UP_TEMPLATES).format(topic)
+    start = time.perf_counter()
+    response = await client.post("/search_simple", json={"query": follow_up}, headers=headers)
+    response.raise_for_status()
+    follow_up_latencies.append(time.perf_counter() - start)
+
+
+async def run_pass(label: str, enabled: bool, args, openai_stub, tavily_stub) -> dict:
+    import httpx
+    import research_manager
+    from asgi import app
+    from prefetch import follow_up_prefetcher
+
+    research_manager.PREFETCH_FOLLOW_UPS = enabled
+    before = (openai_stub.requests, tavily_stub.requests)
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        await asyncio.gather(*(session(client, user, label, args, latencies) for user in range(args.users)))
+        # Let prefetches nobody asked for finish so their spend is counted
+        while follow_up_prefetcher._running:
+            await asyncio.sleep(0.05)
+    follow_up_prefetcher.ttl = 0
+    stats = follow_up_prefetcher.stats_dict()
+    follow_up_prefetcher.ttl = args.ttl
+    return {
+        "follow_ups": len(latencies),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "openai": openai_stub.requests - before[0],
+        "tavily": tavily_stub.requests - before[1],
+        "stats": stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--think", type=float, default=3.0, help="mean seconds spent reading a report")
+    parser.add_argument("--click-rate", type=float, default=0.6, help="share of users asking a follow-up")
+    parser.add_argument("--openai-latency", type=float, default=0.3)
+    parser.add_argument("--tavily-latency", type=float, default=0.4)
+    parser.add_argument("--ttl", type=float, default=86400)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    with StubServer(fake_openai, latency=args.openai_latency) as openai_stub, \
+            StubServer(fake_tavily, latency=args.tavily_latency) as tavily_stub:
+        os.environ.update({
+            "OPENAI_BASE_URL": f"{openai_stub.url}/v1",
+            "OPENAI_API_KEY": "stub",
+            "TAVILY_BASE_URL": tavily_stub.url,
+            "TAVILY_API_KEY": "stub",
+        })
+        print(f"{'prefetch':<9} {'follow-ups':>10} {'p50':>8} {'p95':>8} {'openai':>7} {'tavily':>7} "
+              f"{'hit rate':>9} {'tokens':>8} {'wasted':>8} {'searches':>9} {'wasted':>7}")
+        for label, enabled in (("off", False), ("on", True)):
+            result = asyncio.run(run_pass(label, enabled, args, openai_stub, tavily_stub))
+            stats = result["stats"]
+            print(f"{label:<9} {result['follow_ups']:>10} {result['p50']:7.3f}s {result['p95']:7.3f}s "
+                  f"{result['openai']:>7} {result['tavily']:>7} {stats['hit_rate']:>9.0%} "
+                  f"{stats['tokens']:>8} {stats['tokens_wasted']:>8} {stats['searches']:>9} "
+                  f"{stats['searches_wasted']:>7}")
+
+
+if __name__ == "__main__":
+    main()
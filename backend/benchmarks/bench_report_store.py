@@ -0,0 +1,135 @@
+"""Benchmark report store index build and lookup at scale.
+
+Bulk-loads synthetic reports into a fresh SQLite report store, then times
+exact, reworded (same content words), partial (one extra word, served by
+the BM25 index when fuzzy matching is on) and unrelated (miss) lookups
+plus single inserts into the full store, and reports the hit rate of
+each.
+
+    uv run backend/benchmarks/bench_report_store.py --reports 100000 --lookups 2000
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+# Leave the app's own report store alone; the benchmark builds its own
+os.environ["REPORT_STORE_PATH"] = ""
+
+from report_store import ReportStore, content_words
+
+TEMPLATES = (
+    "best {0} {1} for {2}",
+    "is {0} {1} worth it for {2}",
+    "what do people think about {0} {1} and {2}",
+    "{0} vs {1} for {2}",
+    "how to choose a {0} {1} for {2}",
+)
+SYLLABLES = "ka ri mo ta ne lu sa vi po de xo qui ban tor mel fin gra".split()
+
+
+def vocabulary(rng: random.Random, size: int) -> list:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_query(rng: random.Random, words: list) -> str:
+    # Zipf-ish: a few head terms are shared by many queries, most are rare
+    picks = [words[min(len(words) - 1, int(rng.paretovariate(0.8)) - 1)] for _ in range(2)]
+    picks.append(rng.choice(words))
+    return rng.choice(TEMPLATES).format(*picks)
+
+
+def paraphrase(rng: random.Random, query: str) -> str:
+    """Same content words, different framing (the kind of match we want to serve)"""
+    words = content_words(query)
+    return rng.choice(("what does reddit say about {}", "{} thoughts?", "what do people think of {}")).format(
+        " ".join(rng.sample(words, len(words))))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def timed_lookups(store: ReportStore, queries: list, expected: list = None) -> tuple:
+    latencies, hits, correct = [], 0, 0
+    for index, query in enumerate(queries):
+        start = time.perf_counter()
+        match = store.lookup(query)
+        latencies.append(time.perf_counter() - start)
+        hits += match is not None
+        correct += match is not None and expected is not None and match.query == expected[index]
+    return latencies, hits, correct
+
+
+def report_line(label: str, latencies: list, hits: int, correct: int):
+    print(f"{label:<12} p50={percentile(latencies, 50) * 1e3:7.3f}ms  "
+          f"p95={percentile(latencies, 95) * 1e3:7.3f}ms  hit rate={hits / len(latencies):6.1%}  "
+          f"original report={correct / len(latencies):6.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reports", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, default=5000, help="reports per bulk insert transaction")
+    parser.add_argument("--path", help="SQLite file to build (default: a temporary file)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--exact-only", action="store_true", help="leave fuzzy (BM25) matching off")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    rng = random.Random(args.seed)
+    words = vocabulary(rng, args.vocabulary)
+    # Repeated queries would replace each other, so draw until there are enough distinct ones
+    unique = {}
+    while len(unique) < args.reports:
+        unique.setdefault(make_query(rng, words), None)
+    queries = list(unique)
+    report = {
+        "short_summary": "Summary of what Reddit users said.",
+        "markdown_report": "# Report\n\n" + "Findings paragraph citing [1] and [2]. " * 60,
+        "follow_up_questions": ["What about durability?", "Any cheaper alternatives?"],
+    }
+
+    path = args.path or os.path.join(tempfile.mkdtemp(), "reports.sqlite3")
+    store = ReportStore(path, max_entries=len(queries) + args.lookups, fuzzy=not args.exact_only)
+    start = time.perf_counter()
+    for offset in range(0, len(queries), args.batch):
+        store.add_many((query, report, None) for query in queries[offset:offset + args.batch])
+    build = time.perf_counter() - start
+    size_mb = sum(os.path.getsize(path + suffix) for suffix in ("", "-wal") if os.path.exists(path + suffix)) / 2**20
+    print(f"build        {len(queries)} reports in {build:.2f}s, {len(store)} stored "
+          f"({len(queries) / build:,.0f} reports/s, {size_mb:.1f} MiB)")
+
+    start = time.perf_counter()
+    store = ReportStore(path, max_entries=len(queries) + args.lookups, fuzzy=not args.exact_only)
+    print(f"reopen       {(time.perf_counter() - start) * 1e3:.2f}ms")
+
+    sample = rng.sample(queries, min(args.lookups, len(queries)))
+    report_line("exact", *timed_lookups(store, sample, sample))
+    reworded = [paraphrase(rng, query) for query in sample]
+    report_line("reworded", *timed_lookups(store, reworded, sample))
+    partial = [f"{query} {rng.choice(words)}x" for query in reworded]
+    report_line("partial", *timed_lookups(store, partial, sample))
+    unrelated = [" ".join(rng.choices(SYLLABLES, k=6)) + " zz" for _ in sample]
+    report_line("miss", *timed_lookups(store, unrelated))
+
+    latencies = []
+    for i in range(min(args.lookups, 500)):
+        start = time.perf_counter()
+        store.add(f"{make_query(rng, words)} extra {i}", report)
+        latencies.append(time.perf_counter() - start)
+    print(f"insert       p50={percentile(latencies, 50) * 1e3:7.3f}ms  p95={percentile(latencies, 95) * 1e3:7.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Benchmark concurrent WebSearchTool searches against a local fake Tavily.
+
+Each query sleeps for a different amount of time on the server. With a
+non-blocking search path the wall-clock time of the fan-out should track the
+slowest search, not the sum of all of them.
+
+    uv run backend/benchmarks/bench_search_parallel.py
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.stubs import StubServer, fake_tavily
+
+
+async def fan_out(tool, queries):
+    start = time.perf_counter()
+    await asyncio.gather(*(tool.search(q) for q in queries))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latencies", default="0.3,0.6,0.9",
+                        help="comma separated per-search server latency in seconds")
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    latencies = [float(x) for x in args.latencies.split(",")]
+    queries = [f"site:reddit.com stub query {i}" for i in range(len(latencies))]
+    by_query = dict(zip(queries, latencies))
+
+    with StubServer(fake_tavily, latency=lambda path, payload: by_query.get(payload.get("query"), 0.0)) as server:
+        os.environ["TAVILY_BASE_URL"] = server.url
+        os.environ["TAVILY_MAX_CONCURRENCY"] = str(args.max_concurrency)
+        os.environ.setdefault("TAVILY_API_KEY", "stub")
+        from agent_base import WebSearchTool
+
+        tool = WebSearchTool()
+        timings = [asyncio.run(fan_out(tool, queries)) for _ in range(args.rounds)]
+
+    best = min(timings)
+    print(f"searches:        {len(queries)}")
+    print(f"slowest search:  {max(latencies):.3f}s")
+    print(f"sum of searches: {sum(latencies):.3f}s")
+    print(f"fan-out (best of {args.rounds}): {best:.3f}s")
+    print(f"speedup vs serial: {sum(latencies) / best:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Offline benchmark suite for the whole research pipeline.
+
+Runs ResearchManager.run directly and the Flask /search endpoint against
+local OpenAI and Tavily stand-ins with configurable latency, jitter and
+failure rates, and reports:
+
+- end-to-end latency of the pipeline (p50/p95)
+- time to first SSE event on /search (p50/p95)
+- throughput and latency at several concurrency levels
+- peak Python memory (tracemalloc) and max RSS
+
+Use --save-baseline to record results and --baseline to fail (exit 1) when
+any metric regresses by more than --tolerance.
+
+    uv run backend/benchmarks/bench_suite.py --save-baseline bench_baseline.json
+    uv run backend/benchmarks/bench_suite.py --baseline bench_baseline.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.stubs import StubServer, fake_openai, fake_tavily
+
+# Metrics where a larger value is an improvement; everything else is lower-is-better
+HIGHER_IS_BETTER = ("throughput",)
+
+_query_ids = itertools.count()
+
+
+def unique_query(prefix: str) -> str:
+    """Fresh query text so caches never mask upstream latency"""
+    return f"{prefix} {next(_query_ids)} {time.time_ns()}"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def pipeline_latencies(runs: int, options: dict) -> list:
+    from research_manager import ResearchManager
+
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        async for _ in ResearchManager(**options).run(unique_query("pipeline")):
+            pass
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def stream_request(url: str, options: dict) -> tuple:
+    """POST to /search; return (time to first SSE event, total time)"""
+    body = json.dumps({"query": unique_query("endpoint"), "strategy": options["summarize_strategy"],
+                       "depth": options["depth"], "adaptive": options["adaptive"],
+                       "planner": options["planner"]}).encode()
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    first_event = None
+    with urllib.request.urlopen(request, timeout=300) as response:
+        for line in response:
+            if first_event is None and line.startswith(b"data:"):
+                first_event = time.perf_counter() - start
+    return first_event or 0.0, time.perf_counter() - start
+
+
+def run_suite(args) -> dict:
+    results = {}
+    options = {"summarize_strategy": args.strategy, "depth": args.depth, "adaptive": args.adaptive,
+               "planner": args.planner}
+    from werkzeug.serving import make_server
+    from app import app
+
+    # Direct pipeline latency
+    latencies = asyncio.run(pipeline_latencies(args.runs, options))
+    results["pipeline_p50"] = percentile(latencies, 50)
+    results["pipeline_p95"] = percentile(latencies, 95)
+
+    # Endpoint latency, time to first event and throughput per concurrency level
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/search"
+    try:
+        stream_request(url, options)  # warm up the shared loop and connection pool
+        for concurrency in args.concurrency:
+            total = max(args.runs, concurrency * 2)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                samples = list(pool.map(lambda _: stream_request(url, options), range(total)))
+            elapsed = time.perf_counter() - start
+            first_events = [first for first, _ in samples]
+            durations = [duration for _, duration in samples]
+            results[f"c{concurrency}_throughput"] = total / elapsed
+            results[f"c{concurrency}_latency_p50"] = percentile(durations, 50)
+            results[f"c{concurrency}_latency_p95"] = percentile(durations, 95)
+            results[f"c{concurrency}_first_event_p50"] = percentile(first_events, 50)
+            results[f"c{concurrency}_first_event_p95"] = percentile(first_events, 95)
+    finally:
+        server.shutdown()
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float, noise_floor: float) -> list:
+    """Return a description of every metric that got worse than allowed"""
+    regressions = []
+    for name, old in baseline.items():
+        new = results.get(name)
+        if new is None or not old:
+            continue
+        if any(marker in name for marker in HIGHER_IS_BETTER):
+            change = (old - new) / old
+        else:
+            # Millisecond-scale metrics are noisy in relative terms
+            if new - old < noise_floor:
+                continue
+            change = (new - old) / old
+        if change > tolerance:
+            regressions.append(f"{name}: {old:.4g} -> {new:.4g} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="sequential pipeline runs / min requests per level")
+    parser.add_argument("--concurrency", type=lambda v: [int(x) for x in v.split(",")], default=[1, 4, 16])
+    parser.add_argument("--openai-latency", type=float, default=0.15)
+    parser.add_argument("--tavily-latency", type=float, default=0.25)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--strategy", choices=["per_search", "batched"], default="per_search",
+                        help="ResearchManager summarize strategy to benchmark")
+    parser.add_argument("--depth", choices=["quick", "standard", "deep"], default="standard",
+                        help="research depth profile to benchmark")
+    parser.add_argument("--adaptive", action="store_true", help="enable adaptive follow-up searches")
+    parser.add_argument("--planner", choices=["llm", "local", "hybrid"], default="llm",
+                        help="search planner strategy to benchmark")
+    parser.add_argument("--baseline", help="JSON file to compare against; exit 1 on regression")
+    parser.add_argument("--save-baseline", help="write results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--noise-floor", type=float, default=0.05,
+                        help="ignore lower-is-better increases smaller than this absolute amount")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    stub_options = dict(jitter=args.jitter, failure_rate=args.failure_rate, seed=args.seed)
+    with StubServer(fake_openai, latency=args.openai_latency, **stub_options) as openai_stub, \
+            StubServer(fake_tavily, latency=args.tavily_latency, **stub_options) as tavily_stub:
+        os.environ.update({
+            "OPENAI_BASE_URL": f"{openai_stub.url}/v1",
+            "OPENAI_API_KEY": "stub",
+            "TAVILY_BASE_URL": tavily_stub.url,
+            "TAVILY_API_KEY": "stub",
+            "PLANNER_CACHE_DISK_PATH": "",
+            "WRITER_CACHE_DISK_PATH": "",
+            "REPORT_STORE_PATH": "",
+        })
+        tracemalloc.start()
+        results = run_suite(args)
+        results["peak_traced_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+        # ru_maxrss is KiB on Linux
+        results["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"stub requests: openai={openai_stub.requests} (failed {openai_stub.failures}), "
+              f"tavily={tavily_stub.requests} (failed {tavily_stub.failures})")
+
+    for name, value in results.items():
+        print(f"{name:<28} {value:10.4f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.noise_floor)
+        if regressions:
+            print(f"REGRESSIONS (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
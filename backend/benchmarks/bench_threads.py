@@ -0,0 +1,97 @@
+"""Benchmark the Reddit thread fetcher and the compressed thread corpus.
+
+Threads are served by a local fixture server shaped like Reddit's JSON
+API, with ETags. Every thread is fetched four times:
+
+- cold: every thread is downloaded, parsed and stored
+- warm: stored threads are still fresh, so no requests are made
+- revalidate: stored threads are stale, and conditional requests get 304s
+- edited: every thread has changed upstream and is downloaded again
+
+For each pass it reports threads per second, requests and 304s, and body
+bytes on the wire. It then compares bytes per thread (upstream JSON,
+parsed thread, compressed in the corpus), parse and excerpt time, and
+the context each search result gets: the Tavily snippet vs the thread
+excerpt.
+
+    uv run backend/benchmarks/bench_threads.py --threads 200 --comments 150 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.stubs import ThreadFixtureServer, fake_thread
+
+
+async def fetch_all(fetcher, ids) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(fetcher.fetch(tid) for tid in ids))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=200)
+    parser.add_argument("--comments", type=int, default=150, help="comments per fixture thread")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent requests to the fixture")
+    parser.add_argument("--latency", type=float, default=0.05, help="fixture seconds per request")
+    parser.add_argument("--excerpt-tokens", type=int, default=200)
+    parser.add_argument("--level", type=int, default=6, help="zlib compression level")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    # The fixture is local; only the concurrency limit should bound throughput
+    os.environ.update({"REDDIT_RPS": "100000", "REDDIT_BURST": "100000",
+                       "REDDIT_MAX_CONCURRENCY": str(args.concurrency), "THREAD_CORPUS_PATH": ""})
+
+    from agent_base import SNIPPET_TOKENS
+    from prompt_builder import token_counter, truncate_to_tokens
+    from reddit_threads import ThreadFetcher, excerpt, parse_thread
+    from thread_corpus import ThreadCorpus
+
+    ids = [f"t{index:05x}" for index in range(args.threads)]
+    corpus = ThreadCorpus(os.path.join(tempfile.mkdtemp(), "threads.sqlite3"), level=args.level)
+    with ThreadFixtureServer(comments=args.comments, latency=args.latency) as fixture:
+        fetcher = ThreadFetcher(corpus=corpus, base_url=fixture.url, refresh_after=3600,
+                                max_comments=args.comments)
+        print(f"{'pass':<11} {'threads/s':>10} {'requests':>9} {'304s':>6} {'wire MB':>8}")
+        for label in ("cold", "warm", "revalidate", "edited"):
+            if label == "revalidate":
+                fetcher.refresh_after = 0
+            if label == "edited":
+                fixture.version += 1
+            before = (fixture.requests, fixture.not_modified, fixture.bytes_sent)
+            elapsed = asyncio.run(fetch_all(fetcher, ids))
+            print(f"{label:<11} {args.threads / elapsed:>10.1f} {fixture.requests - before[0]:>9} "
+                  f"{fixture.not_modified - before[1]:>6} {(fixture.bytes_sent - before[2]) / 1e6:>8.2f}")
+
+    stats = corpus.stats()
+    listings = [fake_thread(tid, args.comments) for tid in ids[:50]]
+    raw = [json.dumps(listing).encode() for listing in listings]
+    start = time.perf_counter()
+    threads = [parse_thread(json.loads(body), args.comments) for body in raw]
+    parse_seconds = (time.perf_counter() - start) / len(raw)
+    parsed = sum(len(json.dumps(thread, separators=(",", ":"))) for thread in threads) / len(threads)
+    print(f"\nbytes per thread: upstream {stats['raw_bytes'] / stats['threads']:,.0f}, parsed {parsed:,.0f}, "
+          f"stored {stats['stored_bytes'] / stats['threads']:,.0f} "
+          f"({stats['compression_ratio']}x smaller than upstream)")
+
+    query = "battery comfort travel warranty"
+    start = time.perf_counter()
+    excerpts = [excerpt(thread, query, args.excerpt_tokens) for thread in threads]
+    excerpt_seconds = (time.perf_counter() - start) / len(threads)
+    count = token_counter()
+    snippet = truncate_to_tokens(threads[0]["selftext"] + " " + threads[0]["comments"][0]["body"], SNIPPET_TOKENS)
+    print(f"parse {parse_seconds * 1e3:.2f}ms per thread, excerpt {excerpt_seconds * 1e3:.2f}ms per thread")
+    print(f"context per result: snippet {count(snippet)} tokens, "
+          f"thread excerpt {sum(count(text) for text in excerpts) / len(excerpts):.0f} tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Micro-benchmark token counting, truncation and prompt assembly.
+
+Makes sure tokenization does not become a hot spot: reports microseconds
+per call for cold and memoised counts, sentence-boundary truncation and a
+full writer-sized PromptBuilder build.
+
+    uv run backend/benchmarks/bench_tokenizer.py --iterations 2000
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from prompt_builder import PromptBuilder, TokenCounter, truncate_to_tokens
+
+WORDS = ("keyboard switch budget reddit thread users recommend quality price noise tactile linear "
+         "keycaps build firmware warranty typing feel latency wireless battery review").split()
+
+
+def sentence(rng: random.Random) -> str:
+    words = rng.choices(WORDS, k=rng.randint(6, 18))
+    return " ".join(words).capitalize() + f" [{rng.randint(1, 9)}]."
+
+
+def passage(rng: random.Random, sentences: int) -> str:
+    return " ".join(sentence(rng) for _ in range(sentences))
+
+
+def timed(label: str, iterations: int, fn):
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    per_call = (time.perf_counter() - start) / iterations * 1e6
+    print(f"{label:<34} {per_call:10.1f} µs/call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--model", default="gpt-4o-mini")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    rng = random.Random(0)
+    snippets = [passage(rng, 4) for _ in range(args.iterations)]
+    findings = [passage(rng, 40) for _ in range(50)]
+    sources = "\n".join(f"[{i}] r/stub thread {i} - https://reddit.com/comments/{i:06d}" for i in range(1, 40))
+
+    counter = TokenCounter.for_model(args.model)
+    print(f"tokenizer: {'tiktoken ' + counter.encoding.name if counter.exact else 'character estimate'}")
+
+    timed("count snippet (cold)", args.iterations, lambda i: counter.count(snippets[i]))
+    timed("count snippet (memoised)", args.iterations, lambda i: counter.count(snippets[i]))
+    counter.cache_clear()
+    timed("truncate snippet to 50 tokens", args.iterations,
+          lambda i: truncate_to_tokens(snippets[i] + " " + snippets[-i], 50, counter))
+    timed("writer prompt build (6k budget)", max(args.iterations // 20, 1),
+          lambda i: PromptBuilder(args.model, 6000)
+          .add("Query: best budget mechanical keyboard", truncate=False)
+          .add("Findings:\n" + findings[i % len(findings)] * 3)
+          .add("Available Sources:\n" + sources, max_tokens=400, unit="line")
+          .build())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark the tool-calling loop: parallel tool calls vs one call per round.
+
+The stub model asks for one web_search per "Search:" line of the input,
+either all in one round (parallel tool calls) or one per round. Parallel
+rounds should finish in about one search + two completions regardless of
+how many searches there are. One search can be made to hang to show that
+the per-call timeout bounds the round.
+
+    uv run backend/benchmarks/bench_tool_loop.py --searches 4 --slow-search 5 --tool-timeout 1
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.stubs import StubServer, fake_openai, fake_tavily
+
+
+async def run_agent(agent, user_input: str) -> tuple:
+    from agent_base import Runner
+
+    start = time.perf_counter()
+    result = await Runner.run(agent, user_input)
+    return time.perf_counter() - start, len(result.sources)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--searches", type=int, default=4)
+    parser.add_argument("--openai-latency", type=float, default=0.3)
+    parser.add_argument("--tavily-latency", type=float, default=0.5)
+    parser.add_argument("--slow-search", type=float, default=0.0,
+                        help="latency of the last search (0 = same as the others)")
+    parser.add_argument("--tool-timeout", type=float, default=30.0)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    queries = [f"site:reddit.com stub query {i}" for i in range(args.searches)]
+    slow_query = queries[-1] if args.slow_search else None
+
+    def tavily_latency(path, payload):
+        return args.slow_search if payload.get("query") == slow_query else args.tavily_latency
+
+    with StubServer(fake_openai, latency=args.openai_latency) as openai_stub, \
+            StubServer(fake_tavily, latency=tavily_latency) as tavily_stub:
+        os.environ.update({
+            "OPENAI_BASE_URL": f"{openai_stub.url}/v1",
+            "OPENAI_API_KEY": "stub",
+            "TAVILY_BASE_URL": tavily_stub.url,
+            "TAVILY_API_KEY": "stub",
+            "REPORT_STORE_PATH": "",
+        })
+        from agent_base import Agent, ModelSettings, WebSearchTool
+
+        user_input = "\n".join(f"Search: {query}" for query in queries)
+        for label, parallel in (("one call per round", False), ("parallel tool calls", True)):
+            agent = Agent(
+                name="ToolLoopBench",
+                instructions="Search for each line, then summarize the findings.",
+                tools=[WebSearchTool()],
+                model_settings=ModelSettings(parallel_tool_calls=parallel),
+                max_tool_rounds=args.searches + 1,
+                tool_timeout=args.tool_timeout,
+            )
+            before = openai_stub.requests
+            elapsed, sources = asyncio.run(run_agent(agent, user_input))
+            print(f"{label:<22} {elapsed:7.3f}s  completions={openai_stub.requests - before}  "
+                  f"sources={sources}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Load test the backend against local OpenAI and Tavily stubs.
+
+Starts both stub servers and the Flask app (threaded werkzeug) or the ASGI
+app (uvicorn) in-process, fires requests at a fixed concurrency and reports
+throughput, latency percentiles and the peak number of server threads.
+
+    uv run backend/benchmarks/load_test.py --requests 60 --concurrency 12
+    uv run backend/benchmarks/load_test.py --server asgi --requests 200 --concurrency 100
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.stubs import StubServer, fake_openai, fake_tavily
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def post(url: str, query: str) -> float:
+    body = json.dumps({"query": query}).encode()
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=120) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def server_threads() -> int:
+    """Live threads other than stub handlers and load-generating clients"""
+    return sum(not thread.name.startswith(("stub-handler", "ThreadPoolExecutor"))
+               for thread in threading.enumerate())
+
+
+class ThreadSampler:
+    """Record the peak number of server threads while the load runs"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = server_threads()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, server_threads())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def start_flask():
+    from werkzeug.serving import make_server
+    from app import app
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_port, server.shutdown
+
+
+def start_asgi():
+    import uvicorn
+    from asgi import app
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+    threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def shutdown():
+        server.should_exit = True
+
+    return sock.getsockname()[1], shutdown
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=12)
+    parser.add_argument("--endpoint", default="/search", choices=["/search", "/search_simple"])
+    parser.add_argument("--server", default="flask", choices=["flask", "asgi"])
+    parser.add_argument("--openai-latency", type=float, default=0.2)
+    parser.add_argument("--tavily-latency", type=float, default=0.3)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with StubServer(fake_openai, latency=args.openai_latency) as openai_stub, \
+            StubServer(fake_tavily, latency=args.tavily_latency) as tavily_stub:
+        os.environ.update({
+            "OPENAI_BASE_URL": f"{openai_stub.url}/v1",
+            "OPENAI_API_KEY": "stub",
+            "TAVILY_BASE_URL": tavily_stub.url,
+            "TAVILY_API_KEY": "stub",
+            "REPORT_STORE_PATH": "",
+        })
+        port, shutdown = start_asgi() if args.server == "asgi" else start_flask()
+        url = f"http://127.0.0.1:{port}{args.endpoint}"
+
+        post(url, "warm up")
+        baseline = server_threads()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool, ThreadSampler() as threads:
+            start = time.perf_counter()
+            latencies = list(pool.map(lambda i: post(url, f"load test query {i}"), range(args.requests)))
+            elapsed = time.perf_counter() - start
+        shutdown()
+
+    print(f"server:      {args.server}")
+    print(f"endpoint:    {args.endpoint}")
+    print(f"requests:    {args.requests} @ concurrency {args.concurrency}")
+    print(f"throughput:  {args.requests / elapsed:.2f} req/s")
+    print(f"latency p50: {percentile(latencies, 50):.3f}s")
+    print(f"latency p95: {percentile(latencies, 95):.3f}s")
+    print(f"latency max: {max(latencies):.3f}s")
+    print(f"extra threads under load: {threads.peak - baseline}")
+
+
+if __name__ == "__main__":
+    main()
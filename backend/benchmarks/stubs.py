@@ -0,0 +1,412 @@
+"""Local stand-in servers for benchmarking without live API keys"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import urlsplit
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients cancelling in-flight requests is expected, not an error
+        pass
+
+
+class StubServer:
+    """Minimal JSON-over-HTTP server running in a background thread.
+
+    ``handler`` receives ``(path, payload)`` and returns a JSON-serialisable
+    response body, or an iterator of bodies which is sent as server-sent
+    events. ``latency`` is either a fixed number of seconds or a callable
+    ``(path, payload) -> seconds``; ``jitter`` adds up to that many seconds
+    at random. A ``failure_rate`` fraction of requests is answered with
+    ``failure_status`` instead (429s carry ``Retry-After: retry_after``).
+    """
+
+    def __init__(self, handler: Callable[[str, dict], dict], latency=0.0, host: str = "127.0.0.1",
+                 jitter: float = 0.0, failure_rate: float = 0.0, failure_status: int = 500,
+                 retry_after: float = 1.0, seed: int = None):
+        self.handler = handler
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.retry_after = retry_after
+        self.requests = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        stub = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                # Lets load tests tell stub threads apart from the app's own
+                threading.current_thread().name = "stub-handler"
+                super().setup()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                delay = stub.latency(self.path, payload) if callable(stub.latency) else stub.latency
+                with stub._lock:
+                    stub.requests += 1
+                    delay += stub._random.uniform(0, stub.jitter)
+                    failed = stub._random.random() < stub.failure_rate
+                    stub.failures += failed
+                if delay:
+                    time.sleep(delay)
+                if failed:
+                    self._send_json(stub.failure_status, {"error": {"message": "injected failure"}})
+                    return
+                result = stub.handler(self.path, payload)
+                if not isinstance(result, dict):
+                    self._stream(result)
+                    return
+                self._send_json(200, result)
+
+            def _send_json(self, status: int, result: dict):
+                body = json.dumps(result).encode()
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", str(stub.retry_after))
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self, events):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for event in events:
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _QuietServer((host, 0), _Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def fake_tavily(path: str, payload: dict) -> dict:
+    """Tavily /search response shaped like the real API"""
+    query = payload.get("query", "")
+    max_results = payload.get("max_results", 5)
+    return {
+        "query": query,
+        "answer": f"Redditors discussing '{query}' mostly agree on a few recurring points.",
+        "results": [
+            {
+                "title": f"r/stub thread {i} about {query}",
+                "url": f"https://www.reddit.com/r/stub/comments/{abs(hash((query, i))) % 10**6:06d}/thread_{i}/",
+                "content": f"Comment {i} on {query}. " * 20,
+                "score": 1.0 / i,
+            }
+            for i in range(1, max_results + 1)
+        ],
+    }
+
+
+def _completion(model: str, message: dict, prompt: str, finish_reason: str = "stop") -> dict:
+    completion_text = message.get("content") or json.dumps(message.get("tool_calls", ""))
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(completion_text) // 4
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _stream_completion(completion: dict, chunk_size: int = 16, token_latency: float = 0.0):
+    """Replay a completion as chat.completion.chunk events"""
+    base = {key: completion[key] for key in ("id", "created", "model")}
+    content = completion["choices"][0]["message"].get("content") or ""
+    for start in range(0, len(content), chunk_size):
+        if token_latency:
+            time.sleep(token_latency)
+        yield dict(base, object="chat.completion.chunk", choices=[
+            {"index": 0, "delta": {"content": content[start:start + chunk_size]}, "finish_reason": None}
+        ])
+    yield dict(base, object="chat.completion.chunk", choices=[
+        {"index": 0, "delta": {}, "finish_reason": "stop"}
+    ])
+    yield dict(base, object="chat.completion.chunk", choices=[], usage=completion["usage"])
+
+
+def fake_openai(path: str, payload: dict, token_latency: float = 0.0):
+    """OpenAI /chat/completions response that mimics each of the agents.
+
+    Bind ``token_latency`` with functools.partial to slow down streamed chunks.
+    """
+    completion = _fake_completion(payload)
+    if payload.get("stream"):
+        return _stream_completion(completion, token_latency=token_latency)
+    return completion
+
+
+# Follow-up questions the stub writer suggests for a report on ``topic``
+FOLLOW_UP_TEMPLATES = (
+    "how durable is {} after several years of use",
+    "which cheaper alternatives to {} do owners recommend",
+    "common problems people regret about {} purchases",
+)
+
+
+def _fake_completion(payload: dict) -> dict:
+    messages = payload.get("messages", [])
+    system = messages[0]["content"] if messages else ""
+    # Strict structured outputs carry the schema in response_format instead of the prompt
+    system += json.dumps(payload.get("response_format") or {})
+    user = next((m["content"] for m in messages if m["role"] == "user"), "")
+    prompt = "\n".join(str(m.get("content") or "") for m in messages)
+    model = payload.get("model", "stub")
+
+    if payload.get("tools") and payload.get("tool_choice") != "none":
+        # One web_search per "Search: ..." line not answered yet; all at once
+        # unless parallel tool calls are disabled
+        answered = sum(1 for m in messages if m["role"] == "tool")
+        queries = [line.removeprefix("Search: ") for line in user.splitlines() if line.startswith("Search: ")]
+        pending = (queries or [user.split("\n", 1)[0]])[answered:]
+        if pending:
+            if payload.get("parallel_tool_calls") is False:
+                pending = pending[:1]
+            calls = [
+                {"id": f"call_{answered + i}", "type": "function",
+                 "function": {"name": "web_search", "arguments": json.dumps({"query": query})}}
+                for i, query in enumerate(pending)
+            ]
+            return _completion(model, {"role": "assistant", "content": None, "tool_calls": calls},
+                               prompt, "tool_calls")
+
+    if '"searches"' in system or "'searches'" in system:
+        topic = user.removeprefix("Query: ")
+        content = json.dumps({"searches": [
+            {"reason": f"Angle {i} on the topic", "query": f"site:reddit.com {topic} angle {i}"}
+            for i in range(1, 4)
+        ]})
+    elif '"summaries"' in system or "'summaries'" in system:
+        count = user.count("=== Search ")
+        content = json.dumps({"summaries": [
+            {"index": i, "summary": f"Search {i}: Redditors broadly agree [1], with some dissent [2]. " * 4}
+            for i in range(1, count + 1)
+        ]})
+    elif "markdown_report" in system:
+        topic = user.split("\n", 1)[0].removeprefix("Query: ")
+        content = json.dumps({
+            "short_summary": "Stub summary. Second sentence.",
+            "markdown_report": "# Stub Report\n\n" + "Findings paragraph citing [1] and [2]. " * 30
+                               + "\n\n## References\n\n1. stub\n2. stub",
+            "follow_up_questions": [template.format(topic) for template in FOLLOW_UP_TEMPLATES],
+        })
+    else:
+        content = "Redditors broadly agree [1], with some dissent [2]. " * 8
+    return _completion(model, {"role": "assistant", "content": content}, prompt)
+
+
+_FIXTURE_WORDS = (
+    "battery", "comfort", "price", "noise", "fit", "build", "warranty", "sound", "value", "durability",
+    "setup", "support", "travel", "upgrade", "returned", "daily", "cheaper", "premium", "issue", "months",
+)
+
+
+# Filler words from random syllables, so comment text compresses about as well as prose
+_FILLER_RNG = random.Random(0)
+_FIXTURE_VOCABULARY = _FIXTURE_WORDS + tuple(
+    "".join(_FILLER_RNG.choice(("ka", "lo", "mi", "ter", "sun", "ba", "ri", "en", "op", "la", "dre", "vi"))
+            for _ in range(_FILLER_RNG.randint(1, 4)))
+    for _ in range(2000)
+)
+
+
+def _fixture_text(rng: random.Random, sentences: int) -> str:
+    return " ".join(
+        " ".join(rng.choice(_FIXTURE_VOCABULARY) for _ in range(rng.randint(6, 14))).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+
+def _fixture_comment(rng: random.Random, thread_id: str, comment_id: str, parent: str, depth: int) -> dict:
+    """A t1 comment carrying the metadata fields the real API sends"""
+    body = _fixture_text(rng, rng.randint(1, 5))
+    author = f"user{rng.randint(1, 5000)}"
+    score = int(rng.paretovariate(1.2)) - 1
+    created = 1700000000 + rng.randint(0, 10 ** 7)
+    return {"kind": "t1", "data": {
+        "subreddit_id": "t5_stub", "approved_at_utc": None, "author_is_blocked": False, "comment_type": None,
+        "awarders": [], "mod_reason_by": None, "banned_by": None, "author_flair_type": "text",
+        "total_awards_received": 0, "subreddit": "stub", "author_flair_template_id": None, "likes": None,
+        "replies": "", "user_reports": [], "saved": False, "id": comment_id, "banned_at_utc": None,
+        "mod_reason_title": None, "gilded": 0, "archived": False, "collapsed_reason_code": None,
+        "no_follow": score < 2, "author": author, "can_mod_post": False, "created_utc": created,
+        "send_replies": True, "parent_id": parent, "score": score, "author_fullname": f"t2_{author}",
+        "approved_by": None, "mod_note": None, "all_awardings": [], "collapsed": False, "body": body,
+        "edited": False, "top_awarded_type": None, "author_flair_css_class": None, "name": f"t1_{comment_id}",
+        "is_submitter": False, "downs": 0, "author_flair_richtext": [], "author_patreon_flair": False,
+        "body_html": f"&lt;div class=\"md\"&gt;&lt;p&gt;{body}&lt;/p&gt;\n&lt;/div&gt;",
+        "removal_reason": None, "collapsed_reason": None, "distinguished": None, "associated_award": None,
+        "stickied": False, "author_premium": False, "can_gild": True, "gildings": {},
+        "unrepliable_reason": None, "author_flair_text_color": None, "score_hidden": False,
+        "permalink": f"/r/stub/comments/{thread_id}/stub_thread/{comment_id}/", "subreddit_type": "public",
+        "locked": False, "report_reasons": None, "created": created, "author_flair_text": None,
+        "treatment_tags": [], "link_id": f"t3_{thread_id}", "subreddit_name_prefixed": "r/stub",
+        "controversiality": 0, "depth": depth, "author_flair_background_color": None,
+        "collapsed_because_crowd_control": None, "mod_reports": [], "num_reports": None, "ups": score,
+    }}
+
+
+def fake_thread(thread_id: str, comments: int = 100, max_depth: int = 4, version: int = 0) -> list:
+    """Reddit ``/comments/<id>.json`` listing: the post and a comment tree of ``comments`` comments.
+
+    Deterministic for a given ``(thread_id, version)``; a new version is an edited thread.
+    """
+    rng = random.Random(f"{thread_id}:{version}")
+    post = {
+        "id": thread_id, "name": f"t3_{thread_id}", "subreddit": "stub", "author": "op",
+        "title": f"Thread {thread_id}: {_fixture_text(rng, 1)}", "selftext": _fixture_text(rng, 4),
+        "score": rng.randint(10, 5000), "num_comments": comments, "created_utc": 1700000000,
+        "permalink": f"/r/stub/comments/{thread_id}/stub_thread/", "over_18": False, "locked": False,
+        "stickied": False,
+    }
+    post["url"] = f"https://www.reddit.com{post['permalink']}"
+    nodes = []
+    top_level = []
+    for index in range(comments):
+        parents = [node for node in nodes[-20:] if node["data"]["depth"] < max_depth - 1]
+        parent = rng.choice(parents) if parents and rng.random() < 0.7 else None
+        depth = parent["data"]["depth"] + 1 if parent else 0
+        node = _fixture_comment(rng, thread_id, f"c{index:x}{thread_id}", parent["data"]["name"] if parent
+                                else f"t3_{thread_id}", depth)
+        nodes.append(node)
+        if parent is None:
+            top_level.append(node)
+        else:
+            if not parent["data"]["replies"]:
+                parent["data"]["replies"] = {"kind": "Listing", "data": {"children": []}}
+            parent["data"]["replies"]["data"]["children"].append(node)
+    top_level.append({"kind": "more", "data": {"count": 42, "children": ["more1", "more2"]}})
+    return [
+        {"kind": "Listing", "data": {"children": [{"kind": "t3", "data": post}]}},
+        {"kind": "Listing", "data": {"children": top_level}},
+    ]
+
+
+class ThreadFixtureServer:
+    """Serves generated threads at ``/comments/<id>.json`` like Reddit's JSON API.
+
+    Every response carries an ETag for the thread's ``version``; a request
+    whose If-None-Match matches is answered 304 without a body. Bump
+    ``version`` to simulate every thread being edited. ``latency`` seconds
+    are added to each request. Counts requests, 304s and body bytes sent.
+    """
+
+    def __init__(self, comments: int = 100, max_depth: int = 4, latency: float = 0.0, host: str = "127.0.0.1"):
+        self.comments = comments
+        self.max_depth = max_depth
+        self.latency = latency
+        self.version = 0
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self._bodies = {}
+        self._lock = threading.Lock()
+        fixture = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                threading.current_thread().name = "stub-handler"
+                super().setup()
+
+            def do_GET(self):
+                match = re.fullmatch(r"/comments/(\w+)\.json", urlsplit(self.path).path)
+                if fixture.latency:
+                    time.sleep(fixture.latency)
+                with fixture._lock:
+                    fixture.requests += 1
+                if match is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body, etag = fixture.render(match.group(1))
+                if self.headers.get("If-None-Match") == etag:
+                    with fixture._lock:
+                        fixture.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                with fixture._lock:
+                    fixture.bytes_sent += len(body)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=UTF-8")
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _QuietServer((host, 0), _Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def render(self, thread_id: str) -> tuple:
+        """Response body and ETag for a thread at the current version"""
+        key = (thread_id, self.version)
+        with self._lock:
+            cached = self._bodies.get(key)
+        if cached is None:
+            listing = fake_thread(thread_id, self.comments, self.max_depth, self.version)
+            body = json.dumps(listing).encode()
+            cached = (body, f'"{hashlib.md5(body).hexdigest()}"')
+            with self._lock:
+                self._bodies[key] = cached
+        return cached
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
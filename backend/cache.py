@@ -0,0 +1,274 @@
+import os
+import re
+import json
+import asyncio
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from tracing import Gauge, metrics
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCT = re.compile(r"[\s?!.,;]+$")
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a query so near-identical phrasings share a key"""
+    query = _WHITESPACE.sub(" ", query.strip().lower())
+    return _TRAILING_PUNCT.sub("", query)
+
+
+def make_key(*parts: Any) -> str:
+    """Content-addressed cache key: sha256 over the JSON-encoded parts"""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CacheStats:
+    """Hit/miss/eviction counters plus the upstream latency saved by hits"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.saved_seconds = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+
+class LRUCache:
+    """In-memory LRU tier with a per-entry TTL"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 900):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[tuple]:
+        """Return ``(value, cost)`` or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            value, cost, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            self.stats.saved_seconds += cost
+            return value, cost
+
+    def set(self, key: str, value: Any, cost: float = 0.0):
+        with self._lock:
+            self._entries[key] = (value, cost, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """On-disk tier: JSON values in a SQLite table, LRU by last access.
+
+    The table may exceed ``max_entries`` by up to ``PRUNE_EVERY - 1`` rows
+    between prunes.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str, ttl: float = 86400, max_entries: int = 100_000, table: str = "cache"):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.table = table
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._inserts = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, cost REAL NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table}(accessed_at)")
+
+    def get(self, key: str) -> Optional[tuple]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, cost, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+            value, cost, expires_at = row
+            if expires_at < now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self.stats.hits += 1
+            self.stats.saved_seconds += cost
+            return json.loads(value), cost
+
+    def set(self, key: str, value: Any, cost: float = 0.0):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, cost, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(value), cost, now + self.ttl, now),
+            )
+            # Counting rows is O(n), so the table is only trimmed every PRUNE_EVERY inserts
+            self._inserts += 1
+            if self._inserts >= self.PRUNE_EVERY:
+                self._inserts = 0
+                self._prune()
+
+    def _prune(self):
+        (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+            self.stats.evictions += overflow
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class TieredCache:
+    """Memory LRU in front of an optional SQLite tier.
+
+    Disk hits are promoted into memory. ``cost`` is the upstream latency the
+    value took to produce, so hits can report the time they saved.
+    """
+
+    def __init__(self, memory: LRUCache, disk: SQLiteCache = None):
+        self.memory = memory
+        self.disk = disk
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> Any:
+        """Return the cached value, or None on a miss"""
+        entry = self.memory.get(key)
+        if entry is None and self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                self.memory.set(key, *entry)
+        return self._counted(entry)
+
+    def set(self, key: str, value: Any, cost: float = 0.0):
+        self.memory.set(key, value, cost)
+        if self.disk is not None:
+            self.disk.set(key, value, cost)
+
+    async def aget(self, key: str) -> Any:
+        """``get`` for use on the event loop: the disk tier is read on a worker thread"""
+        entry = self.memory.get(key)
+        if entry is None and self.disk is not None:
+            entry = await asyncio.to_thread(self.disk.get, key)
+            if entry is not None:
+                self.memory.set(key, *entry)
+        return self._counted(entry)
+
+    async def aset(self, key: str, value: Any, cost: float = 0.0):
+        """``set`` for use on the event loop: the disk tier is written on a worker thread"""
+        self.memory.set(key, value, cost)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value, cost)
+
+    def _counted(self, entry: Optional[tuple]) -> Any:
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        self.stats.saved_seconds += entry[1]
+        return entry[0]
+
+    def stats_dict(self) -> Dict[str, Any]:
+        stats = self.stats.as_dict()
+        stats["memory"] = dict(self.memory.stats.as_dict(), entries=len(self.memory))
+        if self.disk is not None:
+            stats["disk"] = dict(self.disk.stats.as_dict(), entries=len(self.disk))
+        return stats
+
+
+# Default on-disk location for caches that should survive a restart
+DEFAULT_CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+# Named caches exposed through the /cache/stats endpoint
+cache_registry: Dict[str, TieredCache] = {}
+
+
+def cache_from_env(name: str, memory_ttl: float = 900, disk_ttl: float = 86400,
+                   max_entries: int = 1024, disk_path: str = None) -> TieredCache:
+    """Build and register a cache configured by ``<NAME>_CACHE_*`` env vars.
+
+    ``<NAME>_CACHE_DISK_PATH`` (or ``disk_path``) enables the SQLite tier;
+    without either the cache is memory-only. Set the env var to an empty
+    string to disable a default ``disk_path``.
+    """
+    prefix = f"{name.upper()}_CACHE"
+    memory = LRUCache(
+        max_entries=int(os.getenv(f"{prefix}_MAX_ENTRIES", max_entries)),
+        ttl=float(os.getenv(f"{prefix}_TTL", memory_ttl)),
+    )
+    disk = None
+    disk_path = os.getenv(f"{prefix}_DISK_PATH", disk_path)
+    if disk_path:
+        disk = SQLiteCache(disk_path, ttl=float(os.getenv(f"{prefix}_DISK_TTL", disk_ttl)), table=name)
+    cache = TieredCache(memory, disk)
+    cache_registry[name] = cache
+    return cache
+
+
+def _cache_series(field: str):
+    def collect():
+        for name, cache in cache_registry.items():
+            tiers = [("all", cache.stats), ("memory", cache.memory.stats)]
+            if cache.disk is not None:
+                tiers.append(("disk", cache.disk.stats))
+            for tier, stats in tiers:
+                yield {"cache": name, "tier": tier}, getattr(stats, field)
+    return collect
+
+
+metrics.register(Gauge("cache_hits_total", "Cache hits", _cache_series("hits"), kind="counter"))
+metrics.register(Gauge("cache_misses_total", "Cache misses", _cache_series("misses"), kind="counter"))
+metrics.register(Gauge("cache_evictions_total", "Entries evicted for capacity", _cache_series("evictions"), kind="counter"))
+metrics.register(Gauge("cache_saved_seconds_total", "Upstream latency avoided by cache hits",
+                       _cache_series("saved_seconds"), kind="counter"))
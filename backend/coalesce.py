@@ -0,0 +1,126 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List
+
+from tracing import Counter, Gauge, metrics
+
+logger = logging.getLogger(__name__)
+
+COALESCED_REQUESTS = metrics.register(Counter(
+    "research_coalesced_requests_total", "Requests attached to an already running pipeline"))
+
+# Seconds a joined request has to start its subscription before it stops keeping the flight alive
+SUBSCRIBE_GRACE = 10.0
+
+
+class Flight:
+    """One running pipeline and every event it has produced so far.
+
+    Subscribers that join late first replay the events they missed, so all
+    of them see the same stream from the start. The task is cancelled once
+    nobody is subscribed and no joined request is still due to subscribe
+    (a request that never starts its subscription counts for
+    ``SUBSCRIBE_GRACE`` seconds).
+    """
+
+    def __init__(self, key: str, trace_id: str = None):
+        self.key = key
+        self.trace_id = trace_id
+        self.events: List[Any] = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        # join() calls, subscriptions started, and joins whose grace period has passed
+        self._joins = 0
+        self._started = 0
+        self._expired = 0
+        # Set once the last subscriber left and the task was cancelled; never joined again
+        self.cancelled = False
+        self._changed = asyncio.Event()
+
+    def _publish(self, event: Any):
+        self.events.append(event)
+        self._wake()
+
+    def _wake(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def _cancel_if_unwatched(self):
+        waiting = self._joins - max(self._started, self._expired)
+        if self.subscribers == 0 and waiting <= 0 and not self.done and self.task is not None:
+            # Nobody is listening any more; stop the upstream work
+            self.cancelled = True
+            self.task.cancel()
+
+    def _expire_join(self):
+        self._expired += 1
+        self._cancel_if_unwatched()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        """Yield every event of the flight, replaying those already produced"""
+        index = 0
+        # Counted here, not in join(): a subscription closed before it starts never runs its finally
+        self._started += 1
+        self.subscribers += 1
+        try:
+            while True:
+                changed = self._changed
+                while index < len(self.events):
+                    yield self.events[index]
+                    index += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await changed.wait()
+        finally:
+            self.subscribers -= 1
+            self._cancel_if_unwatched()
+
+
+class SingleFlight:
+    """Deduplicate concurrent runs that share a key (must be used on one loop)"""
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+
+    def join(self, key: str, start: Callable[[], AsyncIterator[Any]], trace_id: str = None) -> Flight:
+        """Attach to the running flight for ``key``, starting one if needed"""
+        flight = self._flights.get(key)
+        # A cancelled flight is still winding down; it would only end in CancelledError
+        if flight is None or flight.cancelled:
+            flight = Flight(key, trace_id)
+            self._flights[key] = flight
+            flight.task = asyncio.get_running_loop().create_task(self._drive(flight, start()))
+        else:
+            COALESCED_REQUESTS.inc()
+            logger.info(f"[{flight.trace_id}] Coalesced request onto running pipeline")
+        flight._joins += 1
+        asyncio.get_running_loop().call_later(SUBSCRIBE_GRACE, flight._expire_join)
+        return flight
+
+    async def _drive(self, flight: Flight, events: AsyncIterator[Any]):
+        try:
+            async for event in events:
+                flight._publish(event)
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            # Later requests start a fresh pipeline
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+            flight._wake()
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+
+research_flights = SingleFlight()
+
+metrics.register(Gauge("research_inflight_pipelines", "Distinct research pipelines currently running",
+                       lambda: [({}, len(research_flights))]))
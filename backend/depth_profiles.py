@@ -0,0 +1,74 @@
+import os
+from functools import cached_property
+
+from agent_base import Agent, WebSearchTool
+from planner_agent import planner_agent, planner_instructions
+from search_agent import search_agent, search_cache, batch_summary_agent
+from writer_agent import writer_agent
+
+DEFAULT_DEPTH = os.getenv('RESEARCH_DEPTH', 'standard')
+# Launch a follow-up wave of searches when the first one covers the query poorly
+DEFAULT_ADAPTIVE = os.getenv('ADAPTIVE_SEARCH', 'false').lower() in ('1', 'true', 'yes')
+
+
+class DepthProfile:
+    """How much a research run searches and which models it uses.
+
+    ``extra_searches``, ``min_sources`` and ``min_coverage`` drive the
+    adaptive mode: when the first wave yields fewer unique sources or covers
+    less of the query's terms than required, up to ``extra_searches`` more
+    searches are planned for what is missing. Agents are built on first use.
+    """
+
+    def __init__(self, name: str, searches: int, search_context_size: str, max_results: int,
+                 model: str, writer_model: str, extra_searches: int, min_sources: int,
+                 min_coverage: float):
+        self.name = name
+        self.searches = searches
+        self.search_context_size = search_context_size
+        self.max_results = max_results
+        self.model = model
+        self.writer_model = writer_model
+        self.extra_searches = extra_searches
+        self.min_sources = min_sources
+        self.min_coverage = min_coverage
+
+    @cached_property
+    def planner(self) -> Agent:
+        return planner_agent.clone(instructions=planner_instructions(self.searches), model=self.model)
+
+    @cached_property
+    def follow_up_planner(self) -> Agent:
+        return planner_agent.clone(instructions=planner_instructions(self.extra_searches), model=self.model)
+
+    @cached_property
+    def search_tool(self) -> WebSearchTool:
+        return WebSearchTool(search_context_size=self.search_context_size,
+                             max_results=self.max_results, cache=search_cache)
+
+    @cached_property
+    def searcher(self) -> Agent:
+        return search_agent.clone(model=self.model, tools=[self.search_tool])
+
+    @cached_property
+    def batch_summarizer(self) -> Agent:
+        return batch_summary_agent.clone(model=self.model)
+
+    @cached_property
+    def writer(self) -> Agent:
+        return writer_agent.clone(model=self.writer_model)
+
+
+DEPTH_PROFILES = {
+    profile.name: profile for profile in (
+        DepthProfile("quick", searches=2, search_context_size="low", max_results=3,
+                     model="gpt-4o-mini", writer_model="gpt-4o-mini",
+                     extra_searches=1, min_sources=4, min_coverage=0.5),
+        DepthProfile("standard", searches=3, search_context_size="low", max_results=5,
+                     model="gpt-4o-mini", writer_model="gpt-4o-mini",
+                     extra_searches=2, min_sources=8, min_coverage=0.6),
+        DepthProfile("deep", searches=5, search_context_size="high", max_results=8,
+                     model="gpt-4o-mini", writer_model=os.getenv('DEEP_WRITER_MODEL', 'gpt-4o'),
+                     extra_searches=3, min_sources=15, min_coverage=0.8),
+    )
+}
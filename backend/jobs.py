@@ -0,0 +1,268 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from collections import deque
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from cache import DEFAULT_CACHE_DIR, SQLiteCache
+from research_manager import ResearchManager, ReportDelta
+from tracing import Counter, Gauge, gen_trace_id, metrics
+
+logger = logging.getLogger(__name__)
+
+# Worker pool and queue bounds
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', '100'))
+# Events kept per job for resuming; older ones are dropped (the report is kept separately)
+JOB_EVENT_BUFFER = int(os.getenv('JOB_EVENT_BUFFER', '2000'))
+# Finished jobs are kept this long, up to JOB_MAX_RETAINED of them
+JOB_RETENTION = float(os.getenv('JOB_RETENTION', '86400'))
+JOB_MAX_RETAINED = int(os.getenv('JOB_MAX_RETAINED', '10000'))
+# In memory only the most recent finished jobs; the rest are read back from SQLite
+JOB_MEMORY_RETAINED = int(os.getenv('JOB_MEMORY_RETAINED', '200'))
+JOBS_DB_PATH = os.getenv('JOBS_DB_PATH', os.path.join(DEFAULT_CACHE_DIR, "jobs.sqlite3"))
+
+FINISHED = ("done", "failed", "cancelled")
+
+JOBS_FINISHED = metrics.register(Counter(
+    "research_jobs_finished_total", "Research jobs that reached a final state"))
+
+
+class JobQueueFull(Exception):
+    """Raised when the job queue has no room for another job"""
+
+
+class Job:
+    """One research run and the bounded, numbered log of events it produced"""
+
+    def __init__(self, query: str, options: dict = None, buffer_size: int = JOB_EVENT_BUFFER,
+                 job_id: str = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.query = query
+        # ResearchManager keyword arguments (strategy, depth, adaptive, planner)
+        self.options = options or {}
+        self.trace_id = gen_trace_id()
+        self.status = "queued"
+        self.report = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.events = deque(maxlen=buffer_size)
+        self.last_event_id = 0
+        self.task = None
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def publish(self, event: dict):
+        self.last_event_id += 1
+        self.events.append((self.last_event_id, event))
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def finish(self, status: str, event: dict):
+        self.status = status
+        self.finished_at = time.time()
+        self.publish(event)
+        JOBS_FINISHED.inc(status=status)
+
+    async def stream(self, after: int = 0) -> AsyncIterator[Tuple[Optional[int], dict]]:
+        """Yield ``(event_id, event)`` for every event after ``after`` until the job ends.
+
+        If some of those events were already dropped from the buffer, a
+        ``gap`` event (with no id) reports how many were missed.
+        """
+        while True:
+            changed = self._changed
+            if self.events:
+                first = self.events[0][0]
+                if after < first - 1:
+                    yield None, {"type": "gap", "missed": first - 1 - after}
+                    after = first - 1
+                for event_id, event in list(self.events):
+                    if event_id > after:
+                        yield event_id, event
+                        after = event_id
+            if self.finished and after >= self.last_event_id:
+                return
+            await changed.wait()
+
+    def to_dict(self, include_report: bool = True) -> dict:
+        data = {
+            "job_id": self.id,
+            "query": self.query,
+            "options": self.options,
+            "status": self.status,
+            "trace_id": self.trace_id,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "last_event_id": self.last_event_id,
+            "error": self.error,
+        }
+        if include_report:
+            data["report"] = self.report
+        return data
+
+    def to_record(self) -> dict:
+        return {"job": self.to_dict(), "events": list(self.events)}
+
+    @classmethod
+    def from_record(cls, record: dict) -> "Job":
+        """Rebuild a finished job from its stored record"""
+        data = record["job"]
+        # Records written before options existed only carry the strategy
+        options = data.get("options", {"summarize_strategy": data.get("strategy")})
+        job = cls(data["query"], options, job_id=data["job_id"])
+        for field in ("status", "trace_id", "report", "error", "created_at",
+                      "started_at", "finished_at", "last_event_id"):
+            setattr(job, field, data[field])
+        job.events.extend((event_id, event) for event_id, event in record["events"])
+        return job
+
+
+class JobQueue:
+    """In-process queue of research jobs run by a pool of workers on one loop.
+
+    Jobs outlive the HTTP request that created them: clients poll or
+    (re)attach to the event stream by job id. Finished jobs are written to
+    SQLite (when ``store`` is set) so they can still be fetched after they
+    fall out of memory or the process restarts. Must be used on one loop.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queued: int = JOB_QUEUE_SIZE,
+                 buffer_size: int = JOB_EVENT_BUFFER, memory_retained: int = JOB_MEMORY_RETAINED,
+                 retention: float = JOB_RETENTION, store: SQLiteCache = None):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.buffer_size = buffer_size
+        self.memory_retained = memory_retained
+        self.retention = retention
+        self.store = store
+        self.jobs: Dict[str, Job] = {}
+        self._queue = None
+        self._workers = []
+
+    def submit(self, query: str, options: dict = None) -> Job:
+        """Queue a research run and return its job"""
+        self._ensure_workers()
+        if self._queue.qsize() >= self.max_queued:
+            raise JobQueueFull(f"Job queue is full ({self.max_queued} jobs waiting)")
+        self._prune()
+        job = Job(query, options, self.buffer_size)
+        self.jobs[job.id] = job
+        self._queue.put_nowait(job)
+        job.publish({"type": "queued", "position": self._queue.qsize()})
+        logger.info(f"[{job.trace_id}] Queued research job {job.id}")
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        """A job in memory, or else a finished one from the store (read on a worker thread)"""
+        job = self.jobs.get(job_id)
+        if job is None and self.store is not None:
+            hit = await asyncio.to_thread(self.store.get, job_id)
+            if hit is not None:
+                job = Job.from_record(hit[0])
+        return job
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued or running job; finished jobs are left as they are"""
+        job = await self.get(job_id)
+        if job is None or job.finished:
+            return job
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            # Still queued: the worker skips it when it comes up
+            await self._finish(job, "cancelled", {"type": "cancelled"})
+        return job
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def count(self, status: str) -> int:
+        return sum(1 for job in list(self.jobs.values()) if job.status == status)
+
+    def _ensure_workers(self):
+        if self._workers:
+            return
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._workers = [loop.create_task(self._worker(n)) for n in range(self.workers)]
+
+    async def _worker(self, n: int):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.finished:
+                    continue
+                job.task = asyncio.get_running_loop().create_task(self._run(job))
+                # Wait without propagating a cancellation of the job itself
+                await asyncio.wait([job.task])
+            except Exception as e:
+                logger.error(f"Job worker {n} error: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        job.status = "running"
+        job.started_at = time.time()
+        job.publish({"type": "started"})
+        manager = ResearchManager(stream_report=True, trace_id=job.trace_id, **job.options)
+        report_next = False
+        try:
+            async for chunk in manager.run(job.query):
+                if isinstance(chunk, ReportDelta):
+                    job.publish({"type": "report_delta", "delta": chunk.text})
+                    continue
+                if report_next:
+                    job.report = chunk
+                report_next = chunk == "✅ Report complete"
+                job.publish({"type": "update", "message": chunk})
+        except asyncio.CancelledError:
+            await self._finish(job, "cancelled", {"type": "cancelled"})
+        except Exception as e:
+            logger.error(f"[{job.trace_id}] Research job {job.id} failed: {e}")
+            job.error = str(e)
+            await self._finish(job, "failed", {"type": "error", "message": str(e)})
+        else:
+            status = "done" if job.report is not None else "failed"
+            await self._finish(job, status, {"type": "complete", "status": status})
+        finally:
+            job.task = None
+
+    async def _finish(self, job: Job, status: str, event: dict):
+        job.finish(status, event)
+        if self.store is not None:
+            try:
+                # SQLite write (and the occasional prune) on a worker thread, not the loop
+                await asyncio.to_thread(self.store.set, job.id, job.to_record(), job.finished_at - job.created_at)
+            except Exception as e:
+                logger.warning(f"Could not persist job {job.id}: {e}")
+
+    def _prune(self):
+        """Drop expired finished jobs, and the oldest beyond the in-memory limit"""
+        now = time.time()
+        finished = sorted((job for job in self.jobs.values() if job.finished),
+                          key=lambda job: job.finished_at)
+        excess = len(finished) - self.memory_retained
+        for index, job in enumerate(finished):
+            if index < excess or job.finished_at + self.retention < now:
+                del self.jobs[job.id]
+
+
+research_jobs = JobQueue(
+    store=SQLiteCache(JOBS_DB_PATH, ttl=JOB_RETENTION, max_entries=JOB_MAX_RETAINED, table="jobs")
+    if JOBS_DB_PATH else None,
+)
+
+metrics.register(Gauge("research_jobs_queued", "Research jobs waiting for a worker",
+                       lambda: [({}, research_jobs.queued)]))
+metrics.register(Gauge("research_jobs_running", "Research jobs currently running",
+                       lambda: [({}, research_jobs.count("running"))]))
@@ -0,0 +1,197 @@
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from planner_agent import WebSearchItem, WebSearchPlan, HOW_MANY_SEARCHES
+from report_store import content_words, query_terms, term_similarity
+
+# Topic keyword (as written, singular) -> subreddits where it is discussed most
+_SUBREDDITS: Dict[str, Tuple[str, ...]] = {
+    "headphone": ("headphones", "audiophile"), "earbud": ("headphones",), "iem": ("iems",),
+    "speaker": ("audiophile", "BudgetAudiophile"), "audio": ("audiophile",),
+    "laptop": ("SuggestALaptop", "laptops"), "macbook": ("mac", "apple"), "iphone": ("iphone", "apple"),
+    "android": ("Android",), "phone": ("PickAnAndroidForMe", "smartphones"), "pixel": ("GooglePixel",),
+    "samsung": ("samsung",), "tablet": ("tablets",), "ipad": ("ipad",), "monitor": ("Monitors",),
+    "keyboard": ("MechanicalKeyboards",), "mouse": ("MouseReview",), "pc": ("buildapc", "pcmasterrace"),
+    "gpu": ("buildapc", "nvidia"), "cpu": ("buildapc",), "router": ("HomeNetworking",),
+    "wifi": ("HomeNetworking",), "nas": ("DataHoarder", "homelab"), "server": ("homelab", "selfhosted"),
+    "camera": ("photography", "Cameras"), "lens": ("photography",), "drone": ("drones",),
+    "tv": ("4kTV", "hometheater"), "console": ("gaming",), "game": ("gaming", "patientgamers"),
+    "nintendo": ("NintendoSwitch",), "playstation": ("playstation",), "ps5": ("PS5",), "xbox": ("xbox",),
+    "steam": ("Steam",), "vr": ("virtualreality",),
+    "python": ("learnpython", "Python"), "javascript": ("learnjavascript", "javascript"),
+    "typescript": ("typescript",), "react": ("reactjs",), "rust": ("rust",), "golang": ("golang",),
+    "java": ("java",), "linux": ("linux", "linuxquestions"), "windows": ("Windows11", "techsupport"),
+    "docker": ("docker", "selfhosted"), "kubernetes": ("kubernetes", "devops"), "aws": ("aws",),
+    "programming": ("learnprogramming", "programming"), "coding": ("learnprogramming",),
+    "developer": ("cscareerquestions", "ExperiencedDevs"), "database": ("Database",),
+    "ai": ("artificial", "MachineLearning"), "llm": ("LocalLLaMA",), "chatgpt": ("ChatGPT",),
+    "job": ("jobs", "careerguidance"), "career": ("careerguidance",), "interview": ("cscareerquestions",),
+    "salary": ("personalfinance",), "resume": ("resumes",), "fund": ("Bogleheads", "investing"),
+    "invest": ("investing", "Bogleheads"), "investing": ("investing", "Bogleheads"),
+    "stock": ("stocks", "investing"), "etf": ("ETFs", "Bogleheads"), "crypto": ("CryptoCurrency",),
+    "bitcoin": ("Bitcoin",), "retirement": ("retirement",),
+    "mortgage": ("RealEstate", "personalfinance"), "credit": ("CreditCards", "personalfinance"),
+    "tax": ("tax",), "insurance": ("Insurance",),
+    "car": ("cars", "whatcarshouldIbuy"), "ev": ("electricvehicles",), "tesla": ("TeslaMotors",),
+    "tire": ("Tires", "cars"), "bike": ("bicycling",), "motorcycle": ("motorcycles",),
+    "coffee": ("Coffee",), "espresso": ("espresso",), "cooking": ("Cooking",), "recipe": ("Cooking",),
+    "knife": ("chefknives", "TrueChefKnives"), "pan": ("Cooking", "castiron"), "baking": ("Baking",),
+    "diet": ("nutrition", "loseit"), "keto": ("keto",), "vegan": ("vegan",), "food": ("food",),
+    "workout": ("Fitness", "bodyweightfitness"), "fitness": ("Fitness",), "gym": ("Fitness", "GYM"),
+    "running": ("running",), "shoe": ("RunningShoeGeeks", "BuyItForLife"), "weight": ("loseit", "Fitness"),
+    "protein": ("Supplements", "Fitness"), "supplement": ("Supplements",), "yoga": ("yoga",),
+    "sleep": ("sleep",), "mattress": ("Mattress", "BuyItForLife"), "skincare": ("SkincareAddiction",),
+    "hair": ("HaircareScience",), "anxiety": ("Anxiety",), "adhd": ("ADHD",), "therapy": ("therapy",),
+    "travel": ("travel", "solotravel"), "flight": ("travel", "flights"), "hotel": ("travel",),
+    "backpack": ("onebag", "BuyItForLife"), "luggage": ("onebag",), "camping": ("camping", "CampingGear"),
+    "hiking": ("hiking", "Ultralight"), "tent": ("CampingGear", "Ultralight"),
+    "japan": ("JapanTravel",), "europe": ("travel", "solotravel"),
+    "apartment": ("AskNYC", "Renters"), "rent": ("Renters",), "house": ("RealEstate", "HomeImprovement"),
+    "home": ("HomeImprovement",), "furniture": ("BuyItForLife", "malelivingspace"),
+    "garden": ("gardening",), "plant": ("houseplants", "gardening"), "vacuum": ("VacuumCleaners",),
+    "dog": ("dogs", "DogAdvice"), "puppy": ("puppy101",), "cat": ("cats", "CatAdvice"),
+    "baby": ("NewParents", "beyondthebump"), "parenting": ("Parenting",), "wedding": ("weddingplanning",),
+    "book": ("books", "suggestmeabook"), "novel": ("suggestmeabook",), "movie": ("movies", "MovieSuggestions"),
+    "anime": ("anime", "Animesuggest"), "music": ("Music",),
+    "guitar": ("Guitar",), "piano": ("piano",), "language": ("languagelearning",),
+    "spanish": ("Spanish", "languagelearning"), "college": ("college", "ApplyingToCollege"),
+    "fashion": ("malefashionadvice", "femalefashionadvice"),
+    "boot": ("BuyItForLife", "goodyearwelt"), "jacket": ("malefashionadvice", "BuyItForLife"),
+}
+# Keywords that are as often a qualifier or a verb as the topic ("budget headphones", "switch
+# to linux"); their subreddits are only used when no other keyword has one
+_AMBIGUOUS_SUBREDDITS: Dict[str, Tuple[str, ...]] = {
+    "budget": ("personalfinance", "Frugal"), "switch": ("NintendoSwitch",), "show": ("television",),
+    "watch": ("Watches",),
+}
+
+# Intent cue words (as written) -> query suffixes, most useful first
+_INTENTS = (
+    ({"best", "recommend", "recommendation", "recommendations", "top", "buy", "choose", "pick"},
+     ("recommendations", "worth")),
+    ({"vs", "versus", "compare", "comparison", "or", "better", "difference"},
+     ("comparison", "better")),
+    ({"how", "guide", "tips", "learn", "start", "beginner", "beginners", "improve"},
+     ("tips", "beginner")),
+    ({"problem", "problems", "issue", "issues", "fix", "broken", "error", "wrong"},
+     ("problems", "fix")),
+    ({"worth", "review", "reviews", "experience", "think", "opinion", "opinions", "thoughts", "like"},
+     ("experience", "review")),
+)
+# Kept out of the topic keywords: intent cues and filler the report store keeps as content
+_NOT_TOPIC = set().union(*(cues for cues, _ in _INTENTS)) | {
+    "after", "all", "also", "around", "been", "before", "but", "could", "during", "good", "has", "have",
+    "if", "into", "just", "less", "more", "most", "much", "not", "over", "really", "should", "some",
+    "than", "then", "there", "these", "they", "this", "under", "was", "when", "where", "while", "will",
+    "would",
+}
+_FALLBACK_SUFFIXES = ("experience", "recommendations")
+# Angles added once the intent's own suffixes are used up, for queries about something you buy
+_EXTRA_SUFFIXES = ("durability", "regret", "alternatives", "mistakes")
+# Topic keywords (singular) that name a product
+_PRODUCTS = {
+    "headphone", "earbud", "iem", "speaker", "laptop", "macbook", "iphone", "phone", "pixel", "tablet",
+    "ipad", "monitor", "keyboard", "mouse", "pc", "gpu", "cpu", "router", "nas", "camera", "lens", "drone",
+    "tv", "console", "playstation", "ps5", "xbox", "switch", "car", "ev", "tesla", "tire", "bike",
+    "motorcycle", "espresso", "knife", "pan", "shoe", "mattress", "backpack", "luggage", "tent", "vacuum",
+    "furniture", "watch", "boot", "jacket", "supplement", "protein",
+}
+
+_WORDS = re.compile(r"[a-z0-9]+")
+_SITE = re.compile(r"site:\S+")
+# Keywords kept in each query, so queries stay 2-4 words with a one-word suffix
+_CORE_WORDS = 3
+# Term overlap (Dice) above which a planned search repeats one already running
+DUPLICATE_SEARCH_SIMILARITY = float(os.getenv('DUPLICATE_SEARCH_SIMILARITY', '0.75'))
+
+
+def _singular(word: str) -> str:
+    if len(word) > 3 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _suffixes(query: str) -> List[str]:
+    """Query suffixes for the intents the query's wording signals"""
+    words = set(_WORDS.findall(query.lower()))
+    suffixes = [suffix for cues, options in _INTENTS if words & cues for suffix in options]
+    return list(dict.fromkeys(suffixes or _FALLBACK_SUFFIXES))
+
+
+def _topic(keywords: List[str]) -> Optional[str]:
+    """The first keyword with subreddits of its own: most often the noun the query is about"""
+    return next((word for word in keywords if word in _SUBREDDITS or _singular(word) in _SUBREDDITS), None)
+
+
+def _subreddits(keywords: List[str]) -> List[str]:
+    """Subreddits for the query's keywords, in keyword order; ambiguous keywords only as a fallback"""
+    for table in (_SUBREDDITS, _AMBIGUOUS_SUBREDDITS):
+        found = []
+        for word in keywords:
+            found.extend(table.get(word) or table.get(_singular(word)) or ())
+        if found:
+            return list(dict.fromkeys(found))
+    return []
+
+
+def plan_locally(query: str, count: int = HOW_MANY_SEARCHES) -> Optional[WebSearchPlan]:
+    """Plan ``count`` Reddit searches from keywords, a subreddit table and templates (no LLM call).
+
+    None when the query has no usable topic keywords; the planner agent
+    should plan it instead.
+    """
+    # Cue words shape the suffixes; the rest is the topic. Single letters ("c" of "c++") say nothing.
+    keywords = [word for word in content_words(query) if word not in _NOT_TOPIC and len(word) > 1]
+    if not keywords:
+        return None
+    core = " ".join(keywords[:_CORE_WORDS])
+    suffixes = _suffixes(query)
+    subreddits = _subreddits(keywords)
+    topic = _topic(keywords)
+    extra = _EXTRA_SUFFIXES if any(_singular(word) in _PRODUCTS or word in _PRODUCTS for word in keywords) else ()
+
+    # Most specific first: the topic's own subreddit, the main intent, then the rest of the query
+    candidates = [(f"Discussion of {core} in r/{subreddits[0]}", f"site:reddit.com/r/{subreddits[0]} {core}")] \
+        if subreddits else []
+    angles = [(f"Threads on {core}: {suffix}", f"site:reddit.com {core} {suffix}")
+              for suffix in suffixes + list(extra)]
+    candidates += angles[:1]
+    # The words that did not fit the core, kept next to the topic noun so the topic stays whole
+    if topic is not None and len(keywords) > _CORE_WORDS:
+        rest = " ".join(keywords[_CORE_WORDS:_CORE_WORDS * 2])
+        candidates.append((f"Threads on {topic} and {rest}", f"site:reddit.com {topic} {rest}"))
+    candidates += angles[1:len(suffixes)]
+    candidates += [(f"Discussion of {core} in r/{name}", f"site:reddit.com/r/{name} {core}")
+                   for name in subreddits[1:]]
+    candidates += angles[len(suffixes):]
+
+    searches = []
+    seen = set()
+    for reason, search in candidates:
+        if search not in seen:
+            seen.add(search)
+            searches.append(WebSearchItem(reason=reason, query=search))
+    return WebSearchPlan(searches=searches[:count])
+
+
+def search_terms(query: str) -> List[str]:
+    """Content terms of a planned search, without its site: operator"""
+    return query_terms(_SITE.sub(" ", query))
+
+
+def new_searches(planned: List[WebSearchItem], searches: List[WebSearchItem],
+                 limit: int) -> List[WebSearchItem]:
+    """Up to ``limit`` planned searches that do not repeat one in ``searches`` or each other"""
+    known = [search_terms(item.query) for item in searches]
+    added = []
+    for item in planned:
+        if len(added) >= limit:
+            break
+        terms = search_terms(item.query)
+        if all(term_similarity(terms, other) < DUPLICATE_SEARCH_SIMILARITY for other in known):
+            known.append(terms)
+            added.append(item)
+    return added
@@ -1,10 +1,13 @@
 from pydantic import BaseModel, Field
+import os
 from agent_base import Agent
+from cache import cache_from_env, DEFAULT_CACHE_DIR
 
+# Searches per plan at the standard depth; other depths template their own count
 HOW_MANY_SEARCHES = 3
 
 # Optimized prompt - more concise, direct instructions
-INSTRUCTIONS = f"""Create {HOW_MANY_SEARCHES} Reddit search queries for the given topic.
+INSTRUCTIONS_TEMPLATE = """Create {count} Reddit search queries for the given topic.
 
 For each search:
 - Focus on different aspects/angles
@@ -14,6 +17,12 @@ For each search:
 
 Output JSON only."""
 
+def planner_instructions(count: int) -> str:
+    """Planner prompt asking for ``count`` searches"""
+    return INSTRUCTIONS_TEMPLATE.format(count=count)
+
+INSTRUCTIONS = planner_instructions(HOW_MANY_SEARCHES)
+
 class WebSearchItem(BaseModel):
     reason: str = Field(description="Why this search helps answer the query (max 15 words)")
     query: str = Field(description="Reddit search term with site:reddit.com prefix")
@@ -21,9 +30,14 @@ class WebSearchItem(BaseModel):
 class WebSearchPlan(BaseModel):
     searches: list[WebSearchItem] = Field(description="List of Reddit searches")
     
+# Plans only depend on the query, so cache them aggressively and persist across restarts
+planner_cache = cache_from_env("planner", memory_ttl=86400, disk_ttl=7 * 86400,
+                               disk_path=os.path.join(DEFAULT_CACHE_DIR, "llm.sqlite3"))
+
 planner_agent = Agent(
     name="PlannerAgent",
     instructions=INSTRUCTIONS,
     model="gpt-4o-mini",
     output_type=WebSearchPlan,
+    cache=planner_cache,
 )
\ No newline at end of file
@@ -0,0 +1,198 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Callable, Dict, List
+
+from cache import normalize_query
+from report_store import report_store, REPORT_FRESHNESS
+from tracing import Counter, Gauge, gen_trace_id, metrics, recent_traces
+
+logger = logging.getLogger(__name__)
+
+# Research a report's follow-up questions in the background, before anyone asks
+PREFETCH_FOLLOW_UPS = os.getenv('PREFETCH_FOLLOW_UPS', 'false').lower() in ('1', 'true', 'yes')
+# Follow-ups prefetched per report, and per user within the budget window
+PREFETCH_PER_REPORT = int(os.getenv('PREFETCH_PER_REPORT', '2'))
+PREFETCH_USER_BUDGET = int(os.getenv('PREFETCH_USER_BUDGET', '10'))
+PREFETCH_BUDGET_WINDOW = float(os.getenv('PREFETCH_BUDGET_WINDOW', '3600'))
+# Prefetch runs at once across all users
+PREFETCH_CONCURRENCY = int(os.getenv('PREFETCH_CONCURRENCY', '2'))
+# A prefetch nobody asked for within this many seconds counts as wasted
+PREFETCH_TTL = float(os.getenv('PREFETCH_TTL', str(REPORT_FRESHNESS)))
+PREFETCH_MAX_TRACKED = int(os.getenv('PREFETCH_MAX_TRACKED', '10000'))
+
+PREFETCH_RUNS = metrics.register(Counter(
+    "research_prefetch_total", "Follow-up prefetch decisions by outcome"))
+PREFETCH_USED = metrics.register(Counter(
+    "research_prefetch_used_total", "Prefetched follow-ups later asked for, by how they were served"))
+PREFETCH_SPEND = metrics.register(Counter(
+    "research_prefetch_spend_total", "Upstream spend of prefetches by kind (tokens/searches) and outcome"))
+
+
+class Prefetch:
+    """A finished prefetch and what it cost, until it is used or expires"""
+
+    def __init__(self, question: str, user: str, usage: Dict[str, int]):
+        self.question = question
+        self.user = user
+        self.usage = usage
+        self.finished_at = time.time()
+
+
+class FollowUpPrefetcher:
+    """Speculatively research follow-up questions at background priority.
+
+    Each run fills the search, LLM and report caches, so asking the
+    question afterwards is answered from them. Runs are bounded per user
+    by a sliding-window budget and globally by a concurrency limit. Every
+    prefetch is tracked until it is claimed by a real request (a hit) or
+    ages out (wasted spend), which is what tuning relies on.
+    """
+
+    def __init__(self, per_report: int = PREFETCH_PER_REPORT, user_budget: int = PREFETCH_USER_BUDGET,
+                 budget_window: float = PREFETCH_BUDGET_WINDOW, concurrency: int = PREFETCH_CONCURRENCY,
+                 ttl: float = PREFETCH_TTL, max_tracked: int = PREFETCH_MAX_TRACKED):
+        self.per_report = per_report
+        self.user_budget = user_budget
+        self.budget_window = budget_window
+        self.concurrency = concurrency
+        self.ttl = ttl
+        self.max_tracked = max_tracked
+        self._spent_by_user: Dict[str, deque] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        # Running prefetches already asked for; not tracked once they finish
+        self._claimed_running = set()
+        self._semaphore = None
+        # Claimed from request threads as well as the event loop
+        self._lock = threading.Lock()
+        self._finished: "OrderedDict[str, Prefetch]" = OrderedDict()
+        self.stats = {"scheduled": 0, "hits": 0, "wasted": 0, "tokens": 0, "searches": 0,
+                      "tokens_wasted": 0, "searches_wasted": 0}
+
+    def _take_budget(self, user: str) -> bool:
+        """Charge one prefetch to ``user`` if the window allows it"""
+        now = time.time()
+        spent = self._spent_by_user.setdefault(user, deque())
+        while spent and spent[0] <= now - self.budget_window:
+            spent.popleft()
+        if len(spent) >= self.user_budget:
+            return False
+        spent.append(now)
+        return True
+
+    def schedule(self, user: str, questions: List[str],
+                 start: Callable[[str, str], AsyncIterator[Any]], options: dict = None) -> int:
+        """Queue prefetches for a report's follow-ups (call on the event loop).
+
+        ``start(question, trace_id)`` returns the research run to drain,
+        written with ``options`` (questions with a stored report for those
+        options are skipped). Returns how many were scheduled.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        scheduled = 0
+        for question in questions[:self.per_report]:
+            key = normalize_query(question)
+            with self._lock:
+                known = key in self._finished
+            if not key or known or key in self._running:
+                PREFETCH_RUNS.inc(outcome="duplicate")
+                continue
+            if not self._take_budget(user):
+                PREFETCH_RUNS.inc(outcome="over_budget")
+                continue
+            # A fresh context: the prefetch must not record into the parent request's trace
+            task = asyncio.get_running_loop().create_task(
+                self._prefetch(key, question, user, start, options), context=contextvars.Context())
+            self._running[key] = task
+            scheduled += 1
+        self.stats["scheduled"] += scheduled
+        return scheduled
+
+    async def _prefetch(self, key: str, question: str, user: str,
+                        start: Callable[[str, str], AsyncIterator[Any]], options: dict = None):
+        try:
+            async with self._semaphore:
+                stored = report_store is not None and await asyncio.to_thread(
+                    report_store.lookup, question, options=options)
+                if stored:
+                    PREFETCH_RUNS.inc(outcome="stored")
+                    return
+                trace_id = gen_trace_id()
+                logger.info(f"[{trace_id}] Prefetching follow-up '{question}' for {user}")
+                async for _ in start(question, trace_id):
+                    pass
+            trace = recent_traces.get(trace_id)
+            usage = trace.usage() if trace is not None else {"tokens": 0, "searches": 0}
+            PREFETCH_RUNS.inc(outcome="completed")
+            for kind, amount in usage.items():
+                PREFETCH_SPEND.inc(amount, kind=kind, outcome="spent")
+            with self._lock:
+                self.stats["tokens"] += usage["tokens"]
+                self.stats["searches"] += usage["searches"]
+                if key in self._claimed_running:
+                    self._claimed_running.discard(key)
+                else:
+                    self._finished[key] = Prefetch(question, user, usage)
+                self._expire()
+        except asyncio.CancelledError:
+            PREFETCH_RUNS.inc(outcome="cancelled")
+            raise
+        except Exception as e:
+            PREFETCH_RUNS.inc(outcome="failed")
+            logger.warning(f"Prefetch failed for '{question}': {e}")
+        finally:
+            self._running.pop(key, None)
+            with self._lock:
+                self._claimed_running.discard(key)
+
+    def _expire(self):
+        """Count prefetches past their TTL (or over the tracking cap) as wasted; holds _lock"""
+        cutoff = time.time() - self.ttl
+        while self._finished:
+            key, prefetch = next(iter(self._finished.items()))
+            if prefetch.finished_at > cutoff and len(self._finished) <= self.max_tracked:
+                break
+            del self._finished[key]
+            self.stats["wasted"] += 1
+            for kind, amount in prefetch.usage.items():
+                self.stats[f"{kind}_wasted"] += amount
+                PREFETCH_SPEND.inc(amount, kind=kind, outcome="wasted")
+
+    def claim(self, query: str, served_by: str) -> bool:
+        """Record that a request asked for a prefetched question; True on a hit"""
+        key = normalize_query(query)
+        with self._lock:
+            self._expire()
+            prefetch = self._finished.pop(key, None)
+            if prefetch is None:
+                if key not in self._running or key in self._claimed_running:
+                    return False
+                # Asked for before the prefetch finished; it has still warmed part of the caches
+                self._claimed_running.add(key)
+                served_by = "running"
+            self.stats["hits"] += 1
+        PREFETCH_USED.inc(served_by=served_by)
+        logger.info(f"Prefetched follow-up '{query}' used ({served_by})")
+        return True
+
+    def stats_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            self._expire()
+            stats = dict(self.stats, pending=len(self._finished), running=len(self._running))
+        resolved = stats["hits"] + stats["wasted"]
+        stats["hit_rate"] = stats["hits"] / resolved if resolved else 0.0
+        stats["waste_rate"] = stats["tokens_wasted"] / stats["tokens"] if stats["tokens"] else 0.0
+        return stats
+
+
+follow_up_prefetcher = FollowUpPrefetcher()
+
+metrics.register(Gauge("research_prefetch_running", "Follow-up prefetches currently running",
+                       lambda: [({}, len(follow_up_prefetcher._running))]))
+metrics.register(Gauge("research_prefetch_pending", "Finished prefetches not yet used or expired",
+                       lambda: [({}, len(follow_up_prefetcher._finished))]))
@@ -0,0 +1,211 @@
+import re
+import math
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character-based estimate
+    tiktoken = None
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+ELLIPSIS = "…"
+# Texts longer than this are memoised under a digest, so the cache never holds whole prompts
+_MEMO_KEY_CHARS = 1024
+_MEMO_ENTRIES = 4096
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English)"""
+    return math.ceil(len(text) / 4)
+
+
+class TokenCounter:
+    """Counts tokens the way a given model bills them.
+
+    Uses tiktoken's encoding for the model when it is installed and its
+    vocabulary can be loaded, otherwise a character-based estimate.
+    """
+
+    def __init__(self, model: Optional[str] = None):
+        self.model = model
+        self.encoding = _load_encoding(model)
+        # Prompts repeat the same sources and instructions; memoise counts
+        self._count_short = lru_cache(maxsize=_MEMO_ENTRIES)(self._count)
+        self._long: "OrderedDict[bytes, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, text: str) -> int:
+        if len(text) <= _MEMO_KEY_CHARS:
+            return self._count_short(text)
+        key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        with self._lock:
+            tokens = self._long.get(key)
+            if tokens is not None:
+                self._long.move_to_end(key)
+                return tokens
+        tokens = self._count(text)
+        with self._lock:
+            self._long[key] = tokens
+            if len(self._long) > _MEMO_ENTRIES:
+                self._long.popitem(last=False)
+        return tokens
+
+    def cache_clear(self):
+        self._count_short.cache_clear()
+        with self._lock:
+            self._long.clear()
+
+    def _count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is None:
+            return estimate_tokens(text)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    @property
+    def exact(self) -> bool:
+        return self.encoding is not None
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def for_model(model: Optional[str] = None) -> 'TokenCounter':
+        return TokenCounter(model)
+
+
+def _load_encoding(model: Optional[str]):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model or "gpt-4o-mini")
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # e.g. the vocabulary cannot be downloaded in an offline sandbox
+        logger.warning(f"tiktoken unavailable for {model}, estimating tokens: {e}")
+        return None
+
+
+def truncate_to_tokens(text: str, max_tokens: int, counter: TokenCounter = None, unit: str = "sentence") -> str:
+    """Cut ``text`` to at most ``max_tokens`` on a sentence (or line) boundary.
+
+    Falls back to a word boundary when even the first sentence is too long,
+    so words and ``[n]`` citations are never split.
+    """
+    counter = counter or TokenCounter.for_model()
+    if max_tokens <= 0:
+        return ""
+    if counter.count(text) <= max_tokens:
+        return text
+
+    pieces = text.splitlines(keepends=True) if unit == "line" else _split_sentences(text)
+    budget = max_tokens - counter.count(ELLIPSIS)
+    kept = []
+    used = 0
+    for piece in pieces:
+        cost = counter.count(piece)
+        if used + cost > budget:
+            break
+        kept.append(piece)
+        used += cost
+    if kept:
+        return "".join(kept).rstrip() + (ELLIPSIS if unit == "sentence" else "")
+
+    # First sentence alone is over budget: cut between words
+    words = text.split(" ")
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if counter.count(" ".join(words[:middle])) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low]).rstrip() + ELLIPSIS if low else ""
+
+
+def _split_sentences(text: str) -> List[str]:
+    """Split into sentences, keeping the trailing whitespace on each piece"""
+    pieces = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        pieces.append(text[start:match.end()])
+        start = match.end()
+    if start < len(text):
+        pieces.append(text[start:])
+    return pieces
+
+
+class _Section:
+    def __init__(self, text: str, max_tokens: Optional[int], truncate: bool, unit: str):
+        self.text = text
+        self.max_tokens = max_tokens
+        self.truncate = truncate
+        self.unit = unit
+
+
+class PromptBuilder:
+    """Assemble a prompt from sections that share one token budget.
+
+    Sections added with ``truncate=False`` are kept whole. The remaining
+    budget is split fairly across the truncatable sections (each capped by
+    its own ``max_tokens``), with any share a small section does not need
+    passed on to the others, and each is cut on sentence boundaries.
+    """
+
+    def __init__(self, model: Optional[str], max_tokens: int, separator: str = "\n\n"):
+        self.counter = TokenCounter.for_model(model)
+        self.max_tokens = max_tokens
+        self.separator = separator
+        self._sections: List[_Section] = []
+
+    def add(self, text: str, max_tokens: int = None, truncate: bool = True, unit: str = "sentence") -> 'PromptBuilder':
+        if text:
+            self._sections.append(_Section(text, max_tokens, truncate, unit))
+        return self
+
+    def allocate(self) -> List[int]:
+        """Token allowance for each section, in order"""
+        count = self.counter.count
+        needs = [count(section.text) for section in self._sections]
+        overhead = count(self.separator) * max(len(self._sections) - 1, 0)
+        remaining = self.max_tokens - overhead - sum(
+            need for need, section in zip(needs, self._sections) if not section.truncate
+        )
+        allowance = [need if not section.truncate else 0 for need, section in zip(needs, self._sections)]
+        flexible = [i for i, section in enumerate(self._sections) if section.truncate]
+        wants = {i: min(needs[i], self._sections[i].max_tokens or needs[i]) for i in flexible}
+
+        # Water-filling: satisfy small sections fully, split the rest evenly
+        for position, i in enumerate(sorted(flexible, key=lambda i: wants[i])):
+            share = max(remaining, 0) // (len(flexible) - position)
+            allowance[i] = min(wants[i], share)
+            remaining -= allowance[i]
+        return allowance
+
+    def sections(self) -> List[str]:
+        """Each section's text after truncation to its allowance"""
+        fitted = []
+        for section, allowance in zip(self._sections, self.allocate()):
+            text = section.text
+            if section.truncate:
+                text = truncate_to_tokens(text, allowance, self.counter, section.unit)
+            fitted.append(text)
+        return fitted
+
+    def build(self) -> str:
+        return self.separator.join(text for text in self.sections() if text)
+
+    def count(self, text: str) -> int:
+        return self.counter.count(text)
+
+
+def token_counter(model: Optional[str] = None) -> Callable[[str], int]:
+    """Counting function for ``model``, for APIs that take a plain callable"""
+    return TokenCounter.for_model(model).count
@@ -0,0 +1,261 @@
+import os
+import re
+import json
+import math
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional
+
+from runtime import get_http_client
+from scheduler import scheduler
+from prompt_builder import token_counter, truncate_to_tokens
+from report_store import query_terms
+from thread_corpus import ThreadCorpus, thread_corpus
+from tracing import Counter, Histogram, SIZE_BUCKETS, metrics, span
+
+logger = logging.getLogger(__name__)
+
+# Replace search snippets of Reddit results with excerpts of the full thread
+FETCH_THREADS = os.getenv('FETCH_THREADS', 'false').lower() in ('1', 'true', 'yes')
+REDDIT_BASE_URL = os.getenv('REDDIT_BASE_URL', 'https://www.reddit.com').rstrip('/')
+# Reddit throttles requests without a descriptive User-Agent
+REDDIT_USER_AGENT = os.getenv('REDDIT_USER_AGENT', 'reddit-deep-research/0.1 (thread fetcher)')
+# Stored threads younger than this are used without asking Reddit; older ones
+# are revalidated with a conditional request
+THREAD_REFRESH_AFTER = float(os.getenv('THREAD_REFRESH_AFTER', '3600'))
+# Comments kept per thread, reply depth requested, and the largest response read
+THREAD_MAX_COMMENTS = int(os.getenv('THREAD_MAX_COMMENTS', '200'))
+THREAD_MAX_DEPTH = int(os.getenv('THREAD_MAX_DEPTH', '4'))
+THREAD_MAX_BYTES = int(os.getenv('THREAD_MAX_BYTES', str(4 * 1024 * 1024)))
+# Seconds a search waits for its threads; slower fetches finish in the background
+THREAD_FETCH_TIMEOUT = float(os.getenv('THREAD_FETCH_TIMEOUT', '8'))
+# Tokens of thread excerpt given to the search agent per result
+THREAD_EXCERPT_TOKENS = int(os.getenv('THREAD_EXCERPT_TOKENS', '200'))
+
+_THREAD_ID = re.compile(r"(?:reddit\.com/(?:r/\w+/)?comments/|redd\.it/)([a-z0-9]{2,12})", re.IGNORECASE)
+_REMOVED = ("", "[deleted]", "[removed]")
+
+THREAD_FETCHES = metrics.register(Counter(
+    "reddit_thread_fetches_total",
+    "Thread lookups by outcome (fresh, fetched, unchanged, not_modified, stale, failed)"))
+THREAD_BYTES = metrics.register(Histogram(
+    "reddit_thread_bytes", "Size of Reddit thread responses", SIZE_BUCKETS))
+
+
+def thread_id(url: str) -> Optional[str]:
+    """Reddit thread ID in a post URL (any subdomain, with or without slug, or redd.it), or None"""
+    match = _THREAD_ID.search(url or "")
+    return match.group(1).lower() if match else None
+
+
+def parse_thread(listing: list, max_comments: int = THREAD_MAX_COMMENTS) -> dict:
+    """Post and comments from a thread's ``.json`` listing.
+
+    The comment tree is walked with an explicit stack (no recursion, so deep
+    reply chains are safe) in reading order, and the walk stops once
+    ``max_comments`` comments are kept. "Load more" stubs and deleted
+    comments are skipped.
+    """
+    try:
+        post = listing[0]["data"]["children"][0]["data"]
+        children = listing[1]["data"]["children"] if len(listing) > 1 else []
+    except (KeyError, IndexError, TypeError) as e:
+        raise ValueError(f"Not a Reddit thread listing: {e!r}")
+    comments = []
+    stack = list(reversed(children))
+    while stack and len(comments) < max_comments:
+        node = stack.pop()
+        if node.get("kind") != "t1":
+            continue
+        data = node.get("data") or {}
+        replies = data.get("replies")
+        if isinstance(replies, dict):
+            stack.extend(reversed(replies.get("data", {}).get("children", [])))
+        body = (data.get("body") or "").strip()
+        if body in _REMOVED:
+            continue
+        comments.append({
+            "id": data.get("id"),
+            "parent": (data.get("parent_id") or "").partition("_")[2],
+            "depth": data.get("depth", 0),
+            "author": data.get("author"),
+            "score": data.get("score", 0),
+            "body": body,
+        })
+    return {
+        "id": post.get("id"),
+        "subreddit": post.get("subreddit"),
+        "title": post.get("title", ""),
+        "author": post.get("author"),
+        "score": post.get("score", 0),
+        "created": post.get("created_utc"),
+        "num_comments": post.get("num_comments", len(comments)),
+        "selftext": (post.get("selftext") or "").strip(),
+        "comments": comments,
+    }
+
+
+def excerpt(thread: dict, query: str, max_tokens: int = THREAD_EXCERPT_TOKENS) -> str:
+    """Passages of a thread most relevant to ``query``, within ``max_tokens``.
+
+    Extractive: the post opens the excerpt, then comments are chosen by
+    query-term overlap, with votes and closeness to the top of the tree
+    breaking ties, and shown in thread order with their scores.
+    """
+    count = token_counter()
+    terms = set(query_terms(query))
+    post = thread["title"]
+    if thread["selftext"] not in _REMOVED:
+        post = f"{post.rstrip('.')}. {thread['selftext']}"
+    opening = truncate_to_tokens(post, max(max_tokens // 3, 1))
+    budget = max_tokens - count(opening)
+
+    ranked = []
+    for position, comment in enumerate(thread["comments"]):
+        found = terms & set(query_terms(comment["body"]))
+        relevance = len(found) / len(terms) if terms else 0.0
+        weight = relevance + 0.1 * math.log1p(max(comment["score"] or 0, 0)) / (1 + comment["depth"])
+        ranked.append((weight, position))
+    ranked.sort(reverse=True)
+
+    chosen = []
+    per_comment = max(max_tokens // 3, 1)
+    for _, position in ranked:
+        if budget <= 0:
+            break
+        comment = thread["comments"][position]
+        body = truncate_to_tokens(comment["body"], min(per_comment, budget))
+        text = f"({int(comment['score'] or 0):+d}) {body}"
+        cost = count(text)
+        if cost <= budget:
+            chosen.append((position, text))
+            budget -= cost
+    return "\n  ".join([opening] + [text for _, text in sorted(chosen)])
+
+
+class ThreadFetcher:
+    """Fetch Reddit threads (post and top comments) through the thread corpus.
+
+    Threads come from Reddit's ``.json`` endpoint over the shared connection
+    pool, scheduled as the "reddit" provider. A stored thread is used as is
+    while younger than ``refresh_after``, then revalidated with its ETag /
+    Last-Modified; a 304 keeps it. If a refresh fails the stored copy is
+    served. Concurrent requests for the same thread share one fetch.
+    """
+
+    def __init__(self, corpus: Optional[ThreadCorpus] = thread_corpus, base_url: str = REDDIT_BASE_URL,
+                 refresh_after: float = THREAD_REFRESH_AFTER, max_comments: int = THREAD_MAX_COMMENTS,
+                 max_depth: int = THREAD_MAX_DEPTH, max_bytes: int = THREAD_MAX_BYTES,
+                 timeout: float = THREAD_FETCH_TIMEOUT):
+        self.corpus = corpus
+        self.base_url = base_url
+        self.refresh_after = refresh_after
+        self.max_comments = max_comments
+        self.max_depth = max_depth
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def fetch(self, thread_id: str) -> dict:
+        """Parsed thread by ID"""
+        task = self._inflight.get(thread_id)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self._fetch(thread_id))
+            self._inflight[thread_id] = task
+
+            def forget(_):
+                if self._inflight.get(thread_id) is task:
+                    del self._inflight[thread_id]
+
+            task.add_done_callback(forget)
+        # A caller giving up must not cancel the fetch for the others (or the corpus)
+        return await asyncio.shield(task)
+
+    async def _fetch(self, thread_id: str) -> dict:
+        stored = None
+        if self.corpus is not None:
+            stored = await asyncio.to_thread(self.corpus.get, thread_id)
+            if stored is not None and stored.age < self.refresh_after:
+                THREAD_FETCHES.inc(outcome="fresh")
+                return stored.thread
+        try:
+            response, body = await self._request(thread_id, stored)
+            thread = parse_thread(json.loads(body), self.max_comments) if body is not None else None
+        except Exception:
+            if stored is None:
+                THREAD_FETCHES.inc(outcome="failed")
+                raise
+            logger.warning(f"Refreshing thread {thread_id} failed, using the stored copy", exc_info=True)
+            THREAD_FETCHES.inc(outcome="stale")
+            return stored.thread
+        if body is None:
+            await asyncio.to_thread(self.corpus.touch, thread_id)
+            THREAD_FETCHES.inc(outcome="not_modified")
+            return stored.thread
+
+        changed = True
+        if self.corpus is not None:
+            changed = await asyncio.to_thread(
+                self.corpus.put, thread_id, thread, response.headers.get("etag"),
+                response.headers.get("last-modified"), len(body))
+        THREAD_FETCHES.inc(outcome="fetched" if changed else "unchanged")
+        return thread
+
+    async def _request(self, thread_id: str, stored) -> tuple:
+        """GET a thread's listing; the body is None on 304 Not Modified"""
+        headers = {"User-Agent": REDDIT_USER_AGENT}
+        if stored is not None and stored.etag:
+            headers["If-None-Match"] = stored.etag
+        if stored is not None and stored.last_modified:
+            headers["If-Modified-Since"] = stored.last_modified
+        params = {"limit": self.max_comments, "depth": self.max_depth, "sort": "top", "raw_json": 1}
+
+        async def get():
+            async with get_http_client().stream(
+                "GET", f"{self.base_url}/comments/{thread_id}.json", params=params, headers=headers,
+                timeout=self.timeout, follow_redirects=True,
+            ) as response:
+                if response.status_code == 304:
+                    return response, None
+                response.raise_for_status()
+                body = bytearray()
+                # Read incrementally so an enormous thread is abandoned early
+                async for chunk in response.aiter_bytes():
+                    body += chunk
+                    if len(body) > self.max_bytes:
+                        raise ValueError(f"Thread {thread_id} is larger than {self.max_bytes} bytes")
+                return response, bytes(body)
+
+        with span("reddit", thread_id=thread_id, conditional=len(headers) > 1) as current:
+            response, body = await scheduler.call("reddit", get)
+            current.set(status=response.status_code, response_bytes=len(body or b""))
+        if body is not None:
+            THREAD_BYTES.observe(len(body))
+        return response, body
+
+    async def excerpts(self, urls: Iterable[str], query: str,
+                       max_tokens: int = THREAD_EXCERPT_TOKENS) -> Dict[str, str]:
+        """Excerpts for the Reddit thread URLs among ``urls``.
+
+        Waits at most ``timeout`` seconds; threads not fetched by then (or
+        that failed) are left out, and late fetches still reach the corpus.
+        """
+        ids = {url: thread_id(url) for url in urls}
+        tasks = {tid: asyncio.ensure_future(self.fetch(tid)) for tid in dict.fromkeys(ids.values()) if tid}
+        if not tasks:
+            return {}
+        await asyncio.wait(tasks.values(), timeout=self.timeout)
+        threads = {}
+        for tid, task in tasks.items():
+            if not task.done():
+                task.cancel()
+            elif task.cancelled():
+                continue
+            elif task.exception() is not None:
+                logger.warning(f"Could not fetch thread {tid}: {task.exception()}")
+            else:
+                threads[tid] = task.result()
+        return {url: excerpt(threads[tid], query, max_tokens) for url, tid in ids.items() if tid in threads}
+
+
+thread_fetcher = ThreadFetcher()
@@ -0,0 +1,308 @@
+import os
+import re
+import math
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+from cache import DEFAULT_CACHE_DIR, normalize_query
+from tracing import Counter, Gauge, metrics
+
+logger = logging.getLogger(__name__)
+
+REPORT_STORE_PATH = os.getenv('REPORT_STORE_PATH', os.path.join(DEFAULT_CACHE_DIR, "reports.sqlite3"))
+REPORT_STORE_MAX_ENTRIES = int(os.getenv('REPORT_STORE_MAX_ENTRIES', '200000'))
+# Reports older than this are never served in place of a fresh run
+REPORT_FRESHNESS = float(os.getenv('REPORT_FRESHNESS', '86400'))
+# Served reports older than this also trigger a background refresh
+REPORT_REFRESH_AFTER = float(os.getenv('REPORT_REFRESH_AFTER', '21600'))
+# Serve reports of queries that only overlap (BM25 candidates above the threshold);
+# off by default, when only the same query or the same content words in any order match
+REPORT_FUZZY_MATCH = os.getenv('REPORT_FUZZY_MATCH', 'false').lower() in ('1', 'true', 'yes')
+# Minimum term overlap (Dice coefficient) for a similar query to count as a match
+REPORT_MATCH_THRESHOLD = float(os.getenv('REPORT_MATCH_THRESHOLD', '0.8'))
+# Queries with at most this many terms only match reports containing all of them
+REPORT_SHORT_QUERY_TERMS = int(os.getenv('REPORT_SHORT_QUERY_TERMS', '4'))
+
+_WORD = re.compile(r"[a-z0-9]+")
+# Function words plus the framing people wrap around a topic ("what does reddit think about ...").
+# Words that change the question ("best", "worth", "vs", "recommend") are content.
+_STOPWORDS = {
+    "a", "about", "an", "and", "any", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "get", "how", "i", "in", "is", "it", "me", "my", "of", "on", "opinion", "opinions", "or",
+    "people", "reddit", "redditor", "redditors", "say", "so", "that", "the", "think", "thoughts",
+    "to", "what", "which", "who", "why", "with", "you", "your",
+}
+# How many BM25 candidates are re-scored for each similarity lookup
+_CANDIDATES = 20
+
+REPORT_LOOKUPS = metrics.register(Counter(
+    "report_store_lookups_total", "Report store lookups by outcome (exact, similar, miss)"))
+
+
+def content_words(query: str) -> List[str]:
+    """Words of a query without function words or framing, in order and without repeats"""
+    return list(dict.fromkeys(word for word in _WORD.findall(query.lower()) if word not in _STOPWORDS))
+
+
+def query_terms(query: str) -> List[str]:
+    """Content words of a query, lightly stemmed, in order and without repeats"""
+    terms = []
+    seen = set()
+    for word in _WORD.findall(query.lower()):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        if word not in seen:
+            seen.add(word)
+            terms.append(word)
+    return terms
+
+
+def options_key(options: Optional[dict]) -> str:
+    """Stored form of the run options a report was written with ("" for none)"""
+    return json.dumps(options, sort_keys=True, separators=(",", ":")) if options else ""
+
+
+def term_similarity(first: List[str], second: List[str]) -> float:
+    """Dice coefficient of two term lists"""
+    if not first or not second:
+        return 0.0
+    return 2 * len(set(first) & set(second)) / (len(set(first)) + len(set(second)))
+
+
+class ReportMatch:
+    def __init__(self, report_id: int, query: str, report: dict, created_at: float,
+                 similarity: float, exact: bool):
+        self.id = report_id
+        self.query = query
+        self.report = report
+        self.created_at = created_at
+        self.similarity = similarity
+        self.exact = exact
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.created_at
+
+    def to_dict(self) -> dict:
+        return {
+            "query": self.query,
+            "age": round(self.age, 1),
+            "similarity": round(self.similarity, 3),
+            "exact": self.exact,
+        }
+
+
+class ReportStore:
+    """Finished reports in SQLite, indexed by normalized query and by query terms.
+
+    Lookups try the exact normalized query first, then the same set of
+    content terms in any order and framing. With ``fuzzy`` they then ask
+    an FTS5 index for the best BM25 candidates and re-score them by term
+    overlap, so a threshold means the same thing regardless of corpus
+    size; a query of at most ``short_query_terms`` terms only matches
+    reports containing every one of them. Only the
+    latest report per normalized query and run options is kept, and the
+    oldest reports are dropped beyond ``max_entries``. A report only
+    matches lookups with the options (depth, strategy, planner, ...) it was
+    written with.
+
+    A match needs a minimum number of shared terms, so any match must
+    contain one of the query's rarest few terms (prefix filtering). Only
+    those are sent to FTS5, which keeps lookups from walking the posting
+    lists of very common terms; per-term document counts live in
+    ``report_terms``.
+    """
+
+    def __init__(self, path: str, max_entries: int = REPORT_STORE_MAX_ENTRIES,
+                 threshold: float = REPORT_MATCH_THRESHOLD, fuzzy: bool = REPORT_FUZZY_MATCH,
+                 short_query_terms: int = REPORT_SHORT_QUERY_TERMS):
+        self.path = path
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.fuzzy = fuzzy
+        self.short_query_terms = short_query_terms
+        self._lock = threading.Lock()
+        self._inserts = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reports ("
+            "id INTEGER PRIMARY KEY, query TEXT NOT NULL, normalized TEXT NOT NULL, "
+            "terms TEXT NOT NULL, signature TEXT NOT NULL, report TEXT NOT NULL, created_at REAL NOT NULL, "
+            "options TEXT NOT NULL DEFAULT '')"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(reports)")}
+        if "options" not in columns:
+            # Stores written before options were recorded; their reports only match option-less lookups
+            self._conn.execute("ALTER TABLE reports ADD COLUMN options TEXT NOT NULL DEFAULT ''")
+            self._conn.execute("DROP INDEX IF EXISTS reports_normalized")
+            self._conn.execute("DROP INDEX IF EXISTS reports_signature")
+        self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS reports_variant ON reports(normalized, options)")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS reports_options_signature ON reports(signature, options, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS reports_created ON reports(created_at)")
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5("
+                "terms, content='reports', content_rowid='id')"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS report_terms (term TEXT PRIMARY KEY, docs INTEGER NOT NULL) "
+                "WITHOUT ROWID"
+            )
+            self.similarity_enabled = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite FTS5 unavailable, report store uses exact matches only: {e}")
+            self.similarity_enabled = False
+
+    def add(self, query: str, report: dict, created_at: float = None, options: dict = None) -> int:
+        """Store a finished report, replacing any older one for the same query and options"""
+        return self.add_many([(query, report, created_at)], options)[-1]
+
+    def add_many(self, items: Iterable[Tuple[str, dict, Optional[float]]], options: dict = None) -> List[int]:
+        """Store several reports written with the same options in one transaction (used for bulk loads)"""
+        ids = []
+        now = time.time()
+        key = options_key(options)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for query, report, created_at in items:
+                    ids.append(self._insert(query, report, created_at or now, key))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._inserts += len(ids)
+            if self._inserts >= 100:
+                self._inserts = 0
+                self._prune()
+        return ids
+
+    def _insert(self, query: str, report: dict, created_at: float, options: str) -> int:
+        normalized = normalize_query(query)
+        terms = query_terms(query)
+        signature = " ".join(sorted(terms))
+        terms = " ".join(terms)
+        old = self._conn.execute(
+            "SELECT id, terms FROM reports WHERE normalized = ? AND options = ?", (normalized, options)).fetchone()
+        if old is not None:
+            self._delete(*old)
+        cursor = self._conn.execute(
+            "INSERT INTO reports (query, normalized, terms, signature, report, created_at, options) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (query, normalized, terms, signature, json.dumps(report), created_at, options),
+        )
+        if self.similarity_enabled:
+            self._conn.execute("INSERT INTO reports_fts (rowid, terms) VALUES (?, ?)",
+                               (cursor.lastrowid, terms))
+            self._conn.executemany(
+                "INSERT INTO report_terms (term, docs) VALUES (?, 1) "
+                "ON CONFLICT(term) DO UPDATE SET docs = docs + 1",
+                [(term,) for term in terms.split()],
+            )
+        return cursor.lastrowid
+
+    def _delete(self, report_id: int, terms: str):
+        self._conn.execute("DELETE FROM reports WHERE id = ?", (report_id,))
+        if self.similarity_enabled:
+            # External-content FTS tables are told which terms to remove
+            self._conn.execute("INSERT INTO reports_fts (reports_fts, rowid, terms) VALUES ('delete', ?, ?)",
+                               (report_id, terms))
+            self._conn.executemany("UPDATE report_terms SET docs = docs - 1 WHERE term = ?",
+                                   [(term,) for term in terms.split()])
+
+    def _prune(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM reports").fetchone()
+        overflow = count - self.max_entries
+        if overflow <= 0:
+            return
+        rows = self._conn.execute(
+            "SELECT id, terms FROM reports ORDER BY created_at LIMIT ?", (overflow,)).fetchall()
+        self._conn.execute("BEGIN")
+        for row in rows:
+            self._delete(*row)
+        self._conn.execute("COMMIT")
+
+    def lookup(self, query: str, max_age: float = REPORT_FRESHNESS,
+               options: dict = None) -> Optional[ReportMatch]:
+        """Most similar stored report written with ``options`` and no older than ``max_age``, or None"""
+        since = time.time() - max_age
+        key = options_key(options)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, query, report, created_at FROM reports "
+                "WHERE normalized = ? AND options = ? AND created_at >= ?",
+                (normalize_query(query), key, since),
+            ).fetchone()
+            if row is not None:
+                REPORT_LOOKUPS.inc(outcome="exact")
+                return ReportMatch(row[0], row[1], json.loads(row[2]), row[3], 1.0, exact=True)
+
+            terms = query_terms(query)
+            if terms:
+                row = self._conn.execute(
+                    "SELECT id, query, report, created_at FROM reports "
+                    "WHERE signature = ? AND options = ? AND created_at >= ? ORDER BY created_at DESC LIMIT 1",
+                    (" ".join(sorted(terms)), key, since),
+                ).fetchone()
+                if row is not None:
+                    REPORT_LOOKUPS.inc(outcome="similar")
+                    return ReportMatch(row[0], row[1], json.loads(row[2]), row[3], 1.0, exact=False)
+            prefix = self._rarest_terms(terms) if terms and self.fuzzy and self.similarity_enabled else []
+            if not prefix:
+                REPORT_LOOKUPS.inc(outcome="miss")
+                return None
+            candidates = self._conn.execute(
+                "SELECT r.id, r.terms, r.created_at FROM reports_fts JOIN reports r ON r.id = reports_fts.rowid "
+                "WHERE reports_fts MATCH ? AND r.options = ? AND r.created_at >= ? "
+                "ORDER BY bm25(reports_fts) LIMIT ?",
+                (" OR ".join(f'"{term}"' for term in prefix), key, since, _CANDIDATES),
+            ).fetchall()
+            best, best_score = None, 0.0
+            short = len(terms) <= self.short_query_terms
+            for report_id, candidate_terms, created_at in candidates:
+                candidate_terms = candidate_terms.split()
+                if short and not set(terms) <= set(candidate_terms):
+                    continue
+                score = term_similarity(terms, candidate_terms)
+                if score > best_score:
+                    best, best_score = report_id, score
+            if best is None or best_score < self.threshold:
+                REPORT_LOOKUPS.inc(outcome="miss")
+                return None
+            row = self._conn.execute(
+                "SELECT query, report, created_at FROM reports WHERE id = ?", (best,)).fetchone()
+        REPORT_LOOKUPS.inc(outcome="similar")
+        return ReportMatch(best, row[0], json.loads(row[1]), row[2], best_score, exact=False)
+
+    def _rarest_terms(self, terms: List[str]) -> List[str]:
+        """Stored query terms any match must include at least one of"""
+        # A Dice score of t needs at least t / (2 - t) of the query's terms, short queries all of them
+        min_shared = len(terms) if len(terms) <= self.short_query_terms else \
+            math.ceil(self.threshold / (2 - self.threshold) * len(terms) - 1e-9)
+        docs = dict(self._conn.execute(
+            f"SELECT term, docs FROM report_terms WHERE term IN ({','.join('?' * len(terms))})", terms
+        ).fetchall())
+        by_rarity = sorted(terms, key=lambda term: docs.get(term, 0))
+        # Terms no report contains still use up places in the prefix
+        return [term for term in by_rarity[:len(terms) - min_shared + 1] if docs.get(term, 0) > 0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+
+report_store = ReportStore(REPORT_STORE_PATH) if REPORT_STORE_PATH else None
+
+if report_store is not None:
+    metrics.register(Gauge("report_store_entries", "Reports kept in the report store",
+                           lambda: [({}, len(report_store))]))
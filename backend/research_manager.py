@@ -1,8 +1,47 @@
-from agent_base import Runner, trace, gen_trace_id
-from search_agent import search_agent
-from planner_agent import planner_agent, WebSearchItem, WebSearchPlan
-from writer_agent import writer_agent, ReportData
+from agent_base import Runner, PartialJSONField, trace, gen_trace_id
+from tracing import span, record
+from scheduler import INTERACTIVE, BACKGROUND, priority_scope
+from source_merge import SourceRegistry, merge_findings
+from prompt_builder import PromptBuilder
+from report_store import report_store, query_terms
+from local_planner import plan_locally, new_searches
+from depth_profiles import DEPTH_PROFILES, DEFAULT_DEPTH, DEFAULT_ADAPTIVE, DepthProfile
+from prefetch import follow_up_prefetcher, PREFETCH_FOLLOW_UPS
+from search_agent import BatchSummaries
+from planner_agent import WebSearchItem, WebSearchPlan
+from writer_agent import ReportData
+import os
+import re
+import time
 import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+_CITATION = re.compile(r"\[(\d+)\]")
+
+# "direct" runs each planned query straight away with one summarization call;
+# "tool" lets the search agent issue the search itself (two LLM calls)
+DEFAULT_SEARCH_MODE = os.getenv('SEARCH_MODE', 'direct')
+
+# "per_search" summarizes each search with its own LLM call as it finishes;
+# "batched" fetches raw results and summarizes them all in one structured call
+SUMMARIZE_STRATEGIES = ("per_search", "batched")
+DEFAULT_SUMMARIZE_STRATEGY = os.getenv('SUMMARIZE_STRATEGY', 'per_search')
+
+# "llm" plans with the planner agent before searching; "local" plans from keywords and
+# templates without an LLM call; "hybrid" starts searching on the local plan while the
+# planner agent runs alongside and contributes any searches it adds
+PLANNER_STRATEGIES = ("llm", "local", "hybrid")
+DEFAULT_PLANNER = os.getenv('PLANNER_STRATEGY', 'llm')
+
+# Token allowance for the list of sources in the writer prompt
+SOURCES_TOKEN_BUDGET = int(os.getenv('WRITER_SOURCES_TOKENS', '400'))
+
+# Write the report once QUORUM searches are in and DEADLINE seconds have passed. A
+# deadline alone writes with whatever is in by then; a quorum alone as soon as it is met.
+DEFAULT_QUORUM = int(os.getenv('SEARCH_QUORUM', '0')) or None
+DEFAULT_DEADLINE = float(os.getenv('SEARCH_DEADLINE', '0')) or None
 
 class SearchResult:
     """Container for search results with sources"""
@@ -10,46 +49,96 @@ class SearchResult:
         self.content = content
         self.sources = sources or []
 
+class ReportDelta:
+    """Incremental piece of the markdown report while the writer is streaming"""
+    def __init__(self, text: str):
+        self.text = text
+
 class ResearchManager:
 
+    def __init__(self, stream_report: bool = False, quorum: int = None, deadline: float = None,
+                 trace_id: str = None, priority: int = INTERACTIVE, search_mode: str = None,
+                 summarize_strategy: str = None, depth: str = None, adaptive: bool = None,
+                 user: str = None, prefetch: bool = None, planner: str = None):
+        # When set, run() also yields ReportDelta objects as the report is written
+        self.stream_report = stream_report
+        # Minimum searches to wait for, and seconds after which to stop waiting
+        # for the rest once that many are in. With neither set every search is
+        # waited for; with only one set the other does not hold the report back.
+        self.quorum = quorum if quorum is not None else DEFAULT_QUORUM
+        self.deadline = deadline if deadline is not None else DEFAULT_DEADLINE
+        # Stage durations in seconds for the last run
+        self.timings = {}
+        self.trace_id = trace_id or gen_trace_id()
+        # Scheduler priority for every upstream call this run makes
+        self.priority = priority
+        self.search_mode = search_mode or DEFAULT_SEARCH_MODE
+        self.summarize_strategy = summarize_strategy or DEFAULT_SUMMARIZE_STRATEGY
+        if self.summarize_strategy not in SUMMARIZE_STRATEGIES:
+            raise ValueError(f"Unknown summarize strategy '{self.summarize_strategy}'")
+        # Search count, search depth and models for this run
+        self.depth = depth or DEFAULT_DEPTH
+        if self.depth not in DEPTH_PROFILES:
+            raise ValueError(f"Unknown research depth '{self.depth}'")
+        self.profile: DepthProfile = DEPTH_PROFILES[self.depth]
+        self.planner = planner or DEFAULT_PLANNER
+        if self.planner not in PLANNER_STRATEGIES:
+            raise ValueError(f"Unknown planner '{self.planner}'")
+        # Run a second, targeted wave of searches when the first covers the query poorly
+        self.adaptive = DEFAULT_ADAPTIVE if adaptive is None else adaptive
+        # Who asked; follow-up prefetches are charged to their budget
+        self.user = user
+        self.prefetch = PREFETCH_FOLLOW_UPS if prefetch is None else prefetch
+
+    @property
+    def options(self) -> dict:
+        """The options that shape the report (what the report store matches on)"""
+        return {"summarize_strategy": self.summarize_strategy, "depth": self.depth,
+                "adaptive": self.adaptive, "planner": self.planner}
+
     async def run(self, query: str):
         """Run the research process, yielding status updates and final report"""
-        trace_id = gen_trace_id()
-        with trace("Research process", trace_id=trace_id):
+        trace_id = self.trace_id
+        self.timings = {}
+        run_start = time.perf_counter()
+        with trace("Research process", trace_id=trace_id), priority_scope(self.priority):
             yield "🔍 Starting research..."
             
             # Step 1: Planning
             yield "📋 Planning searches..."
             try:
-                search_plan = await self.plan_searches(query)
+                stage_start = time.perf_counter()
+                with span("plan", planner=self.planner) as current:
+                    search_plan = plan_locally(query, self.profile.searches) if self.planner != "llm" else None
+                    # No usable keywords for a local plan: the planner agent plans it up front
+                    planned_by_llm = search_plan is None
+                    if planned_by_llm:
+                        current.set(planner_agent=True)
+                        search_plan = await self.plan_searches(query)
+                self.timings['plan'] = time.perf_counter() - stage_start
                 yield f"✅ Planned {len(search_plan.searches)} searches"
             except Exception as e:
                 yield f"❌ Planning failed: {str(e)}"
                 return
             
-            # Step 2: Execute searches
+            # Step 2: Execute searches, mapping each result into notes as it arrives
             yield "🔎 Executing searches..."
             search_results = []
-            all_sources = []
-            completed = 0
+            # One reference number per canonical URL, shared across searches
+            registry = SourceRegistry()
+            all_sources = registry.sources
+            stage_start = time.perf_counter()
+            # The planner agent runs alongside the local plan's searches and may add to them
+            llm_plan = asyncio.create_task(self._plan_alongside(query)) \
+                if self.planner == "hybrid" and not planned_by_llm else None
+            async for update in self._search_wave(search_plan.searches, registry, search_results, llm_plan):
+                yield update
             
-            # Run searches concurrently
-            tasks = [asyncio.create_task(self.search(item)) for item in search_plan.searches]
+            if self.adaptive and search_results:
+                async for update in self._adaptive_wave(query, search_plan.searches, registry, search_results):
+                    yield update
             
-            for task in asyncio.as_completed(tasks):
-                try:
-                    result = await task
-                    if result:
-                        search_results.append(result.content)
-                        # Renumber sources globally
-                        for source in result.sources:
-                            source['global_id'] = len(all_sources) + 1
-                            all_sources.append(source)
-                    completed += 1
-                    yield f"🔎 Search progress: {completed}/{len(tasks)}"
-                except Exception as e:
-                    completed += 1
-                    yield f"⚠️ Search {completed} failed: {str(e)}"
+            self.timings['searches'] = time.perf_counter() - stage_start
             
             if not search_results:
                 yield "❌ No search results found"
@@ -57,25 +146,235 @@ class ResearchManager:
             
             yield f"✅ Completed {len(search_results)} searches"
             
-            # Step 3: Generate report
+            if self.summarize_strategy == "batched":
+                yield "🧾 Summarizing results..."
+                stage_start = time.perf_counter()
+                with span("summarize", searches=len(search_results)):
+                    search_results = await self.summarize_batch(search_results)
+                self.timings['summarize'] = time.perf_counter() - stage_start
+            
+            # Step 3: Reduce the notes into the final report
             yield "📝 Writing report..."
+            stage_start = time.perf_counter()
             try:
-                report = await self.write_report(query, search_results, all_sources)
+                if self.stream_report:
+                    streamed = self.write_report_streamed(query, search_results, all_sources)
+                    extractor = PartialJSONField("markdown_report")
+                    async for delta in streamed.stream_events():
+                        text = extractor.feed(delta)
+                        if text:
+                            yield ReportDelta(text)
+                    report = self._add_references(streamed.final_output_as(ReportData), all_sources)
+                else:
+                    with span("write"):
+                        report = await self.write_report(query, search_results, all_sources)
+                self.timings['write'] = time.perf_counter() - stage_start
+                if self.stream_report:
+                    record("write", self.timings['write'], stream=True)
+                if report_store is not None:
+                    await self._store_report(query, report)
+                if self.prefetch and self.user is not None:
+                    self._prefetch_follow_ups(report)
                 yield "✅ Report complete"
                 yield report.markdown_report
             except Exception as e:
                 yield f"❌ Report generation failed: {str(e)}"
+            finally:
+                self.timings['total'] = time.perf_counter() - run_start
+                logger.info(f"[{trace_id}] Timings: " + ", ".join(
+                    f"{stage}={value:.3f}s" if isinstance(value, float) else f"{stage}={value}"
+                    for stage, value in self.timings.items()
+                ))
+
+    async def _search_wave(self, searches: list[WebSearchItem], registry: SourceRegistry,
+                           search_results: list[str], extra_plan: asyncio.Task = None):
+        """Run searches concurrently, appending mapped results and yielding progress.
+
+        New searches from ``extra_plan``, a planning task still running, join
+        the wave when it finishes and are appended to ``searches``.
+        """
+        stage_start = time.perf_counter()
+        tasks = {asyncio.create_task(self.search(item)): item for item in searches}
+        total = len(tasks)
+        quorum = self._quorum(total)
+        deadline_at = stage_start + (self.deadline or 0.0) if self.quorum or self.deadline else None
+        pending = set(tasks)
+        if extra_plan is not None:
+            pending.add(extra_plan)
+        found = 0
+        completed = 0
+
+        try:
+            while pending:
+                timeout = None
+                if deadline_at is not None and found >= quorum:
+                    timeout = max(0.0, deadline_at - time.perf_counter())
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    reason = "Deadline reached" if self.deadline else "Quorum reached"
+                    yield f"⏱️ {reason}, writing with {found}/{total} searches"
+                    break
+
+                for task in done:
+                    if task is extra_plan:
+                        added = self._add_planned(task, searches)
+                        for item in added:
+                            search_task = asyncio.create_task(self.search(item))
+                            tasks[search_task] = item
+                            pending.add(search_task)
+                        total += len(added)
+                        quorum = self._quorum(total)
+                        if added:
+                            yield f"➕ Added {len(added)} searches from the planner agent"
+                        continue
+                    completed += 1
+                    try:
+                        result = task.result()
+                        if result:
+                            search_results.append(self._map_result(result, registry))
+                            found += 1
+                            self.timings.setdefault('first_result', time.perf_counter() - stage_start)
+                        yield f"🔎 Search progress: {completed}/{total}"
+                    except Exception as e:
+                        yield f"⚠️ Search {completed} failed: {str(e)}"
+        finally:
+            # Drop late (or, on client disconnect, all) searches cleanly
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            pending.discard(extra_plan)
+            self.timings['dropped_searches'] = self.timings.get('dropped_searches', 0) + len(pending)
+
+    def _quorum(self, total: int) -> int:
+        """Searches a wave of ``total`` must have in before the deadline can end it"""
+        if self.quorum:
+            return min(self.quorum, total)
+        # A deadline alone ends the wave with whatever is in; neither waits for all
+        return 0 if self.deadline else total
+
+    async def _plan_alongside(self, query: str) -> WebSearchPlan:
+        """Planner agent run for the hybrid planner, timed apart from the local plan"""
+        stage_start = time.perf_counter()
+        with span("plan", planner="llm", alongside=True):
+            plan = await self.plan_searches(query)
+        self.timings['llm_plan'] = time.perf_counter() - stage_start
+        return plan
+
+    def _add_planned(self, task: asyncio.Task, searches: list[WebSearchItem]) -> list[WebSearchItem]:
+        """Searches from a finished planning task that the wave has not run yet"""
+        try:
+            planned = task.result().searches
+        except Exception as e:
+            logger.warning(f"[{self.trace_id}] Planner agent failed alongside the local plan: {e}")
+            return []
+        added = new_searches(planned, searches, self.profile.searches)
+        searches.extend(added)
+        self.timings['llm_searches'] = len(added)
+        return added
+
+    def _coverage(self, query: str, search_results: list[str]) -> tuple[float, list[str]]:
+        """Share of the query's content words found in the results, and those missing"""
+        terms = query_terms(query)
+        if not terms:
+            return 1.0, []
+        if self.summarize_strategy == "batched":
+            # Raw results open with the planned query, which would count as coverage
+            search_results = [content.partition("\n\n")[2] for content in search_results]
+        found = set(query_terms("\n".join(search_results)))
+        missing = [term for term in terms if term not in found]
+        return 1 - len(missing) / len(terms), missing
+
+    async def _adaptive_wave(self, query: str, searches: list[WebSearchItem], registry: SourceRegistry,
+                             search_results: list[str]):
+        """Search again for what the first wave missed when coverage or sources fall short"""
+        profile = self.profile
+        coverage, missing = self._coverage(query, search_results)
+        source_count = len(registry.sources)
+        self.timings['coverage_pct'] = round(coverage * 100)
+        if not profile.extra_searches or (coverage >= profile.min_coverage
+                                          and source_count >= profile.min_sources):
+            return
+
+        yield f"🔁 Coverage {coverage:.0%} with {source_count} sources, planning follow-up searches..."
+        stage_start = time.perf_counter()
+        try:
+            with span("plan", follow_up=True):
+                extra = await self.plan_follow_up(query, searches, missing)
+        except Exception as e:
+            logger.warning(f"[{self.trace_id}] Follow-up planning failed: {e}")
+            return
+        self.timings['follow_up_plan'] = time.perf_counter() - stage_start
+        self.timings['adaptive_searches'] = len(extra)
+        if not extra:
+            return
+
+        yield f"🔎 Running {len(extra)} follow-up searches..."
+        async for update in self._search_wave(extra, registry, search_results):
+            yield update
+
+    async def _store_report(self, query: str, report: ReportData):
+        """Keep the finished report so similar queries can be answered instantly"""
+        try:
+            await asyncio.to_thread(report_store.add, query, report.model_dump(), options=self.options)
+        except Exception as e:
+            logger.warning(f"Could not store report for '{query}': {e}")
+
+    def _prefetch_follow_ups(self, report: ReportData):
+        """Research the report's follow-up questions in the background to warm the caches"""
+        options = {**self.options, "adaptive": False}
+
+        def start(question: str, trace_id: str):
+            return ResearchManager(trace_id=trace_id, priority=BACKGROUND, search_mode=self.search_mode,
+                                   prefetch=False, **options).run(question)
+
+        scheduled = follow_up_prefetcher.schedule(self.user, report.follow_up_questions, start, options)
+        self.timings['prefetched'] = scheduled
+
+    def _map_result(self, result: SearchResult, registry: SourceRegistry) -> str:
+        """Map step: number the result's sources globally and rewrite its citations"""
+        local_to_global = {}
+        for source in result.sources:
+            local_to_global[str(source.get('id'))] = registry.register(source)
+        
+        def renumber(match):
+            global_id = local_to_global.get(match.group(1))
+            return f"[{global_id}]" if global_id else match.group(0)
+        
+        return _CITATION.sub(renumber, result.content)
 
     async def plan_searches(self, query: str) -> WebSearchPlan:
         """Plan Reddit searches for the query"""
-        result = await Runner.run(planner_agent, f"Query: {query}")
+        result = await Runner.run(self.profile.planner, f"Query: {query}")
         return result.final_output_as(WebSearchPlan)
 
+    async def plan_follow_up(self, query: str, searches: list[WebSearchItem],
+                             missing: list[str]) -> list[WebSearchItem]:
+        """Plan extra searches for the parts of the query the first wave missed"""
+        done = "\n".join(f"- {item.query}" for item in searches)
+        focus = ", ".join(missing) if missing else "more sources and perspectives"
+        result = await Runner.run(
+            self.profile.follow_up_planner,
+            f"Query: {query}\nAlready searched:\n{done}\nFocus on: {focus}",
+        )
+        seen = {item.query.lower() for item in searches}
+        extra = [item for item in result.final_output_as(WebSearchPlan).searches
+                 if item.query.lower() not in seen]
+        return extra[:self.profile.extra_searches]
+
     async def search(self, item: WebSearchItem) -> SearchResult | None:
         """Execute a single search and return results with sources"""
+        if self.summarize_strategy == "batched":
+            return await self.fetch_results(item)
         try:
             input_text = f"Search: {item.query}\nFocus: {item.reason}"
-            result = await Runner.run(search_agent, input_text)
+            with span("search", query=item.query, mode=self.search_mode):
+                if self.search_mode == "direct":
+                    result = await Runner.run_direct(self.profile.searcher, input_text, query=item.query)
+                else:
+                    result = await Runner.run(self.profile.searcher, input_text)
             return SearchResult(
                 content=str(result.final_output),
                 sources=result.sources
@@ -84,26 +383,50 @@ class ResearchManager:
             print(f"Search failed for '{item.query}': {e}")
             return None
 
-    async def write_report(self, query: str, search_results: list[str], sources: list[dict]) -> ReportData:
-        """Generate final report from search results with sources"""
-        # Limit input size to control costs
-        combined_results = "\n\n---\n\n".join(search_results)
-        if len(combined_results) > 3000:  # Truncate if too long
-            combined_results = combined_results[:3000] + "...\n[Results truncated]"
+    async def fetch_results(self, item: WebSearchItem) -> SearchResult | None:
+        """Run a search without summarizing it (batched strategy)"""
+        with span("search", query=item.query, mode="raw"):
+            results = await self.profile.search_tool.search(item.query)
+        if not results['sources']:
+            return None
+        return SearchResult(
+            content=f"Query: {item.query}\nFocus: {item.reason}\n\n{results['content']}",
+            sources=results['sources']
+        )
+
+    async def summarize_batch(self, raw_results: list[str]) -> list[str]:
+        """Summarize every search's raw results in one structured LLM call"""
+        input_text = "\n\n".join(
+            f"=== Search {index} ===\n{content}" for index, content in enumerate(raw_results, 1)
+        )
+        result = await Runner.run(self.profile.batch_summarizer, input_text)
+        by_index = {s.index: s.summary for s in result.final_output_as(BatchSummaries).summaries}
+        # Fall back to the raw results for any search the model skipped
+        return [by_index.get(index) or content for index, content in enumerate(raw_results, 1)]
+
+    def _report_input(self, query: str, search_results: list[str], sources: list[dict]) -> str:
+        """Writer prompt built from the search findings and numbered sources"""
+        writer = self.profile.writer
+        builder = PromptBuilder(writer.model, writer.max_input_tokens)
+        
+        # Deduplicate and rank the findings, then pack them into a token budget
+        combined_results, cited = merge_findings(query, search_results, count_tokens=builder.count)
         
-        # Format sources for the AI
+        # Format sources for the AI; only those the packed findings cite
+        cited_sources = [src for src in sources if src['global_id'] in cited] or sources
         sources_text = "\n".join([
             f"[{src['global_id']}] {src['title']} - {src['url']}" 
-            for src in sources
+            for src in cited_sources
         ])
         
-        input_text = f"Query: {query}\n\nFindings:\n{combined_results}\n\nAvailable Sources:\n{sources_text}"
-        result = await Runner.run(writer_agent, input_text)
-        
-        # Get the report and add sources if not included
-        report_data = result.final_output_as(ReportData)
-        
-        # Ensure references section is included
+        return (builder
+                .add(f"Query: {query}", truncate=False)
+                .add(f"Findings:\n{combined_results}", truncate=False)
+                .add(f"Available Sources:\n{sources_text}", max_tokens=SOURCES_TOKEN_BUDGET, unit="line")
+                .build())
+
+    def _add_references(self, report_data: ReportData, sources: list[dict]) -> ReportData:
+        """Ensure references section is included"""
         if "## References" not in report_data.markdown_report and sources:
             references_section = "\n\n## References\n\n" + "\n".join([
                 f"{src['global_id']}. {src['title']} - {src['url']}"
@@ -111,4 +434,16 @@ class ResearchManager:
             ])
             report_data.markdown_report += references_section
             
-        return report_data
\ No newline at end of file
+        return report_data
+
+    async def write_report(self, query: str, search_results: list[str], sources: list[dict]) -> ReportData:
+        """Generate final report from search results with sources"""
+        input_text = self._report_input(query, search_results, sources)
+        result = await Runner.run(self.profile.writer, input_text)
+        
+        # Get the report and add sources if not included
+        return self._add_references(result.final_output_as(ReportData), sources)
+
+    def write_report_streamed(self, query: str, search_results: list[str], sources: list[dict]):
+        """Start a streamed writer run; references are added by the caller once it finishes"""
+        return Runner.run_streamed(self.profile.writer, self._report_input(query, search_results, sources))
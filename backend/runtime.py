@@ -0,0 +1,125 @@
+import os
+import asyncio
+import logging
+import threading
+import weakref
+import contextvars
+from typing import AsyncIterator, Awaitable, Callable, Iterator, TypeVar
+
+import httpx
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Connection pool shared by every agent and the search tool
+HTTP_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv('HTTP_MAX_CONNECTIONS', '100')),
+    max_keepalive_connections=int(os.getenv('HTTP_MAX_KEEPALIVE', '20')),
+    keepalive_expiry=30.0,
+)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+
+class BackgroundLoop:
+    """A single long-lived event loop running in a daemon thread.
+
+    Flask handlers are synchronous, so instead of creating (and closing) an
+    event loop per request they submit coroutines here. Keeping one loop
+    alive means pooled connections and loop-bound primitives stay valid
+    across requests.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    ready = threading.Event()
+
+                    def _run():
+                        asyncio.set_event_loop(loop)
+                        loop.call_soon(ready.set)
+                        loop.run_forever()
+
+                    self._thread = threading.Thread(target=_run, name="research-loop", daemon=True)
+                    self._thread.start()
+                    ready.wait()
+                    self._loop = loop
+        return self._loop
+
+    def submit(self, coro: Awaitable[T]):
+        """Schedule a coroutine on the loop and return a concurrent future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable[T], timeout: float = None) -> T:
+        """Run a coroutine on the loop and block until it finishes"""
+        return self.submit(coro).result(timeout)
+
+    def call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Call a plain function on the loop thread (for loop-bound state)"""
+        async def _call():
+            return fn(*args, **kwargs)
+        return self.run(_call())
+
+    def iterate(self, agen: AsyncIterator[T]) -> Iterator[T]:
+        """Drive an async generator from synchronous code, one item at a time"""
+        # Every step runs in the same context, as it would under a single
+        # ``async for``, so context variables (e.g. the current trace) set by
+        # the generator survive across yields.
+        context = contextvars.Context()
+
+        def _step(awaitable):
+            async def _runner():
+                async def _await():
+                    return await awaitable
+                return await asyncio.get_running_loop().create_task(_await(), context=context)
+            return self.run(_runner())
+
+        try:
+            while True:
+                try:
+                    yield _step(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            # Also runs when the client disconnects mid-stream
+            _step(agen.aclose())
+
+
+background_loop = BackgroundLoop()
+
+# One client per event loop. The server only ever uses ``background_loop``,
+# so in practice there is a single pool; scripts that call asyncio.run()
+# repeatedly still get a client bound to their own loop.
+_http_clients = weakref.WeakKeyDictionary()
+_openai_clients = weakref.WeakKeyDictionary()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared keep-alive HTTP client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+        _http_clients[loop] = client
+    return client
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """Shared OpenAI client for the running event loop, on the pooled transport"""
+    loop = asyncio.get_running_loop()
+    client = _openai_clients.get(loop)
+    if client is None:
+        # Retries are owned by the scheduler, which also honours Retry-After
+        client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'), http_client=get_http_client(),
+                             max_retries=0)
+        _openai_clients[loop] = client
+    return client
@@ -0,0 +1,242 @@
+import os
+import time
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import httpx
+import openai
+
+from tracing import Counter, Gauge, metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Lower value is served first
+INTERACTIVE = 0
+BACKGROUND = 10
+
+request_priority: ContextVar[int] = ContextVar("request_priority", default=INTERACTIVE)
+
+UPSTREAM_RETRIES = metrics.register(Counter(
+    "upstream_retries_total", "Upstream calls retried by the scheduler, by provider and reason"))
+UPSTREAM_THROTTLED = metrics.register(Counter(
+    "upstream_throttled_total", "429 responses received, by provider"))
+
+
+@contextmanager
+def priority_scope(priority: int):
+    """Run upstream calls made inside the block at ``priority``"""
+    token = request_priority.set(priority)
+    try:
+        yield
+    finally:
+        try:
+            request_priority.reset(token)
+        except ValueError:
+            request_priority.set(INTERACTIVE)
+
+
+def classify_error(error: Exception) -> Tuple[bool, bool, Optional[float]]:
+    """Return ``(retryable, throttled, retry_after_seconds)`` for an upstream error"""
+    if isinstance(error, (httpx.TransportError, openai.APIConnectionError)):
+        return True, False, None
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is None:
+        return False, False, None
+    retry_after = None
+    headers = getattr(response, 'headers', {}) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            retry_after = float(headers['retry-after-ms']) / 1000
+        elif headers.get('retry-after'):
+            retry_after = float(headers['retry-after'])
+    except ValueError:
+        # HTTP-date form; fall back to computed backoff
+        retry_after = None
+    if status == 429:
+        return True, True, retry_after
+    return status >= 500 or status == 408, False, retry_after
+
+
+class TokenBucket:
+    """Requests-per-second limit with bursts up to ``capacity``"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ProviderLimiter:
+    """Adaptive concurrency limit, rate limit and retry policy for one upstream API.
+
+    The concurrency limit follows AIMD: it grows by roughly one slot per
+    window of successful calls and is halved on a 429 (or cut by 10% when a
+    call is slower than ``latency_target``). Waiters are served in priority
+    order, FIFO within a priority.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, max_limit: int,
+                 min_limit: int = 1, initial_limit: int = None, latency_target: float = None,
+                 max_retries: int = 4, base_delay: float = 0.5, max_delay: float = 20.0):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(initial_limit or max_limit)
+        self.latency_target = latency_target
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.in_flight = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    def queue_depth(self, priority: int = None) -> int:
+        return sum(1 for p, _, future in self._waiters
+                   if not future.done() and (priority is None or p == priority))
+
+    async def _acquire(self, priority: int):
+        if self.in_flight < int(self.limit) and not self.queue_depth():
+            self.in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._sequence), future)
+        heapq.heappush(self._waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was handed over just as we were cancelled; pass it on
+                self._release()
+            raise
+
+    def _release(self):
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+
+    def _on_success(self, latency: float):
+        if self.latency_target and latency > self.latency_target:
+            self.limit = max(self.min_limit, self.limit * 0.9)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / max(self.limit, 1))
+
+    def _on_throttle(self):
+        self.limit = max(self.min_limit, self.limit / 2)
+        UPSTREAM_THROTTLED.inc(provider=self.name)
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter exponential backoff
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def call(self, fn: Callable[[], Awaitable[T]], priority: int = None) -> T:
+        """Run ``fn()`` within the limits, retrying transient failures"""
+        priority = request_priority.get() if priority is None else priority
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            await self._acquire(priority)
+            start = time.perf_counter()
+            try:
+                result = await fn()
+            except Exception as e:
+                retryable, throttled, retry_after = classify_error(e)
+                if throttled:
+                    self._on_throttle()
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                if retry_after is not None and retry_after > self.max_delay and priority <= INTERACTIVE:
+                    # Someone is waiting; fail now rather than stall for the upstream's Retry-After
+                    raise
+                delay = min(retry_after, self.max_delay) if retry_after is not None else self._backoff(attempt)
+                UPSTREAM_RETRIES.inc(provider=self.name, reason="throttled" if throttled else "error")
+                logger.warning(f"{self.name} call failed ({e}); retry {attempt + 1} in {delay:.2f}s")
+            else:
+                self._on_success(time.perf_counter() - start)
+                return result
+            finally:
+                self._release()
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+class Scheduler:
+    """Global registry of per-provider limiters shared by all requests"""
+
+    def __init__(self):
+        self.providers: Dict[str, ProviderLimiter] = {}
+
+    def add(self, limiter: ProviderLimiter) -> ProviderLimiter:
+        self.providers[limiter.name] = limiter
+        return limiter
+
+    async def call(self, provider: str, fn: Callable[[], Awaitable[T]], priority: int = None) -> T:
+        return await self.providers[provider].call(fn, priority)
+
+
+scheduler = Scheduler()
+scheduler.add(ProviderLimiter(
+    "openai",
+    rate=float(os.getenv('OPENAI_RPS', '50')),
+    burst=float(os.getenv('OPENAI_BURST', '20')),
+    max_limit=int(os.getenv('OPENAI_MAX_CONCURRENCY', '32')),
+    latency_target=float(os.getenv('OPENAI_LATENCY_TARGET', '30')),
+))
+scheduler.add(ProviderLimiter(
+    "tavily",
+    rate=float(os.getenv('TAVILY_RPS', '20')),
+    burst=float(os.getenv('TAVILY_BURST', '10')),
+    max_limit=int(os.getenv('TAVILY_MAX_CONCURRENCY', '8')),
+    latency_target=float(os.getenv('TAVILY_LATENCY_TARGET', '10')),
+))
+# Thread fetches (FETCH_THREADS); unauthenticated Reddit allows little more than one request a second
+scheduler.add(ProviderLimiter(
+    "reddit",
+    rate=float(os.getenv('REDDIT_RPS', '1')),
+    burst=float(os.getenv('REDDIT_BURST', '10')),
+    max_limit=int(os.getenv('REDDIT_MAX_CONCURRENCY', '4')),
+    latency_target=float(os.getenv('REDDIT_LATENCY_TARGET', '5')),
+))
+
+
+def _scheduler_series(read: Callable[[ProviderLimiter], float]):
+    def collect():
+        for name, limiter in scheduler.providers.items():
+            yield {"provider": name}, read(limiter)
+    return collect
+
+
+def _queue_depths():
+    for name, limiter in scheduler.providers.items():
+        for priority, label in ((INTERACTIVE, "interactive"), (BACKGROUND, "background")):
+            yield {"provider": name, "priority": label}, limiter.queue_depth(priority)
+
+
+metrics.register(Gauge("scheduler_queue_depth", "Calls waiting for a concurrency slot", _queue_depths))
+metrics.register(Gauge("scheduler_in_flight", "Upstream calls in flight",
+                       _scheduler_series(lambda limiter: limiter.in_flight)))
+metrics.register(Gauge("scheduler_concurrency_limit", "Current adaptive concurrency limit",
+                       _scheduler_series(lambda limiter: round(limiter.limit, 2))))
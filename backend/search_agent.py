@@ -1,4 +1,6 @@
+from pydantic import BaseModel, Field
 from agent_base import Agent, WebSearchTool, ModelSettings
+from cache import cache_from_env
 
 # Optimized prompt - shorter, more direct
 INSTRUCTIONS = """Search Reddit and summarize findings in 2-3 paragraphs (under 250 words).
@@ -9,12 +11,43 @@ Focus on:
 - Different perspectives if any
 
 Use reference numbers [1], [2] etc. when mentioning specific sources.
+Thread excerpts list comments with their votes, e.g. (+42); weigh well-upvoted views accordingly.
 Be concise but cite relevant posts."""
 
+# Repeat planner queries are common; Tavily calls are paid
+search_cache = cache_from_env("search", memory_ttl=900, disk_ttl=86400)
+
+web_search_tool = WebSearchTool(search_context_size="low", cache=search_cache)
+
 search_agent = Agent(
     name="SearchAgent",
     instructions=INSTRUCTIONS,
-    tools=[WebSearchTool(search_context_size="low")],
+    tools=[web_search_tool],
     model="gpt-4o-mini",
     model_settings=ModelSettings(tool_choice="required"),
-)
\ No newline at end of file
+)
+
+# Summarizes the raw results of every search in a single request
+BATCH_INSTRUCTIONS = """You are given the raw results of several Reddit searches, each under a "Search N" heading.
+
+For EACH search, summarize its findings in 2-3 short paragraphs (under 200 words):
+- Key insights and common themes
+- Specific examples/experiences mentioned
+- Different perspectives if any
+
+Keep the reference numbers [n] exactly as they appear in that search's results.
+Return one summary per search, with its index. Output JSON only."""
+
+class SearchSummary(BaseModel):
+    index: int = Field(description="Number N of the search heading")
+    summary: str = Field(description="Summary of that search's results with [n] citations")
+
+class BatchSummaries(BaseModel):
+    summaries: list[SearchSummary] = Field(description="One summary per search")
+
+batch_summary_agent = Agent(
+    name="BatchSummaryAgent",
+    instructions=BATCH_INSTRUCTIONS,
+    model="gpt-4o-mini",
+    output_type=BatchSummaries,
+)
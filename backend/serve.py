@@ -0,0 +1,55 @@
+"""Production launcher: the ASGI app under uvicorn, optionally with several worker processes.
+
+Each worker has its own event loop, connection pool, in-memory caches and
+single-flight table; the SQLite cache and report store are shared on
+disk. Queued and running research jobs (and their event streams) live in
+the memory of the worker that accepted them, so with more than one
+worker, /research/<job_id> requests need sticky routing to that worker.
+
+    uv run backend/serve.py --port 5001
+    uv run backend/serve.py --workers 4 --port 5001   # behind a sticky load balancer
+"""
+import argparse
+import os
+import sys
+
+import uvicorn
+from dotenv import load_dotenv
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=os.getenv('HOST', '0.0.0.0'))
+    parser.add_argument("--port", type=int, default=int(os.getenv('PORT', '5001')))
+    parser.add_argument("--workers", type=int, default=int(os.getenv('WEB_CONCURRENCY', '1')),
+                        help="worker processes (default: WEB_CONCURRENCY or 1); jobs need sticky routing above 1")
+    parser.add_argument("--log-level", default=os.getenv('LOG_LEVEL', 'info'))
+    args = parser.parse_args()
+
+    load_dotenv()
+    missing_vars = [var for var in ('OPENAI_API_KEY', 'TAVILY_API_KEY') if not os.getenv(var)]
+    if missing_vars:
+        print(f"❌ Missing environment variables: {', '.join(missing_vars)}")
+        print("Please set them in a .env file or environment")
+        sys.exit(1)
+    if args.workers > 1:
+        print(f"⚠️  {args.workers} workers: research jobs are only served by the worker that accepted them; "
+              "route /research/<job_id> requests stickily")
+
+    uvicorn.run(
+        "asgi:app",
+        app_dir=BACKEND_DIR,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+        # Let running reports finish (or be cancelled cleanly) on deploys
+        timeout_graceful_shutdown=30,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import os
+import re
+import random
+import hashlib
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from prompt_builder import token_counter
+
+# Query parameters that never change which page a URL points at
+_TRACKING_PARAMS = {"ref", "ref_source", "ref_campaign", "share_id", "context", "sort", "rdt", "st", "sh", "si"}
+_REDDIT_HOSTS = {"reddit.com", "www.reddit.com", "old.reddit.com", "new.reddit.com", "np.reddit.com",
+                 "m.reddit.com", "i.reddit.com", "sh.reddit.com"}
+_REDDIT_THREAD = re.compile(r"^/(?:r/[^/]+/)?comments/([a-z0-9]+)", re.IGNORECASE)
+_WORD = re.compile(r"[a-z0-9]+")
+_CITATION = re.compile(r"\[(\d+)\]")
+
+# Token budget for the findings section of the writer prompt
+FINDINGS_TOKEN_BUDGET = int(os.getenv('WRITER_FINDINGS_TOKENS', '800'))
+
+
+def canonicalize_url(url: str) -> str:
+    """Normalise a URL so different links to the same page compare equal.
+
+    Reddit thread links (any subdomain, slug, comment permalink or redd.it
+    short link) collapse to ``https://reddit.com/comments/<id>``.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().split("@")[-1].split(":")[0]
+    path = parts.path or "/"
+    if host == "redd.it" and path.strip("/"):
+        return f"https://reddit.com/comments/{path.strip('/').split('/')[0].lower()}"
+    if host in _REDDIT_HOSTS:
+        match = _REDDIT_THREAD.match(path)
+        if match:
+            return f"https://reddit.com/comments/{match.group(1).lower()}"
+        host = "reddit.com"
+    elif host.startswith("www."):
+        host = host[4:]
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query)
+        if not key.lower().startswith("utm_") and key.lower() not in _TRACKING_PARAMS
+    ))
+    path = path.rstrip("/") or "/"
+    return urlunsplit(("https", host, path, query, ""))
+
+
+class SourceRegistry:
+    """Assigns one global reference number per canonical URL"""
+
+    def __init__(self):
+        self.sources: List[dict] = []
+        self._ids: Dict[str, int] = {}
+
+    def register(self, source: dict) -> int:
+        """Set ``source['global_id']``; only the first copy of a page is kept"""
+        key = canonicalize_url(source.get('url') or source.get('title', ''))
+        global_id = self._ids.get(key)
+        if global_id is None:
+            global_id = len(self.sources) + 1
+            self._ids[key] = global_id
+            source['canonical_url'] = key
+            self.sources.append(source)
+        source['global_id'] = global_id
+        return global_id
+
+
+class MinHasher:
+    """MinHash signatures over word shingles for near-duplicate detection"""
+
+    _PRIME = (1 << 61) - 1
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, seed: int = 42):
+        rng = random.Random(seed)
+        self.shingle_size = shingle_size
+        self._perms = [(rng.randrange(1, self._PRIME), rng.randrange(0, self._PRIME)) for _ in range(num_perm)]
+
+    def shingles(self, text: str) -> set:
+        words = _WORD.findall(_CITATION.sub("", text.lower()))
+        k = self.shingle_size
+        if len(words) < k:
+            return {" ".join(words)} if words else set()
+        return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+    def signature(self, text: str) -> Optional[Tuple[int, ...]]:
+        # Not hash(): it is salted per process, and the dedup decides what goes into cached writer prompts
+        hashes = [int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=6).digest(), "big")
+                  for shingle in self.shingles(text)]
+        if not hashes:
+            return None
+        prime = self._PRIME
+        return tuple(min((a * h + b) % prime for h in hashes) for a, b in self._perms)
+
+    @staticmethod
+    def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+        """Estimated Jaccard similarity of the two shingle sets"""
+        return sum(x == y for x, y in zip(first, second)) / len(first)
+
+
+def _passages(summary: str) -> List[str]:
+    return [part.strip() for part in re.split(r"\n\s*\n", summary) if part.strip()]
+
+
+def merge_findings(query: str, summaries: List[str], token_budget: int = None,
+                   duplicate_threshold: float = 0.8,
+                   count_tokens: Callable[[str], int] = None) -> Tuple[str, List[int]]:
+    """Deduplicate, rank and pack search summaries into a token budget.
+
+    Summaries are split into passages; near-identical passages (MinHash
+    similarity above ``duplicate_threshold``) are dropped, the rest are
+    ranked by query-term overlap, citation count and position, and packed
+    greedily until ``token_budget`` is used. Returns the packed findings and
+    the reference numbers they cite.
+    """
+    token_budget = token_budget or FINDINGS_TOKEN_BUDGET
+    count_tokens = count_tokens or token_counter()
+    hasher = MinHasher()
+    query_terms = set(_WORD.findall(query.lower()))
+
+    candidates = []
+    kept_signatures = []
+    for summary_index, summary in enumerate(summaries):
+        for position, passage in enumerate(_passages(summary)):
+            signature = hasher.signature(passage)
+            if signature is not None and any(
+                MinHasher.similarity(signature, other) >= duplicate_threshold for other in kept_signatures
+            ):
+                continue
+            if signature is not None:
+                kept_signatures.append(signature)
+            words = _WORD.findall(passage.lower())
+            overlap = len(query_terms.intersection(words)) / max(len(query_terms), 1)
+            citations = len(set(_CITATION.findall(passage)))
+            score = overlap + 0.25 * min(citations, 4) + (0.5 if position == 0 else 0.0)
+            candidates.append((score, summary_index, position, passage))
+
+    candidates.sort(key=lambda c: (-c[0], c[1], c[2]))
+    separator_tokens = count_tokens("\n\n")
+    packed = []
+    used = 0
+    for candidate in candidates:
+        cost = count_tokens(candidate[3]) + separator_tokens
+        if used + cost > token_budget:
+            continue
+        packed.append(candidate)
+        used += cost
+
+    # Present packed passages grouped by their search, in original order
+    packed.sort(key=lambda c: (c[1], c[2]))
+    text = "\n\n".join(passage for _, _, _, passage in packed)
+    cited = sorted({int(n) for n in _CITATION.findall(text)})
+    return text, cited
@@ -0,0 +1,99 @@
+import json
+from functools import lru_cache
+from typing import Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+T = TypeVar('T', bound=BaseModel)
+
+# Recovery scans at most this much text and tries this many candidate objects
+MAX_EXTRACT_CHARS = 1_000_000
+MAX_EXTRACT_CANDIDATES = 8
+
+_DECODER = json.JSONDecoder()
+
+
+@lru_cache(maxsize=None)
+def schema_instruction(output_type: Type[BaseModel]) -> str:
+    """System prompt suffix describing the expected JSON (json_object mode)"""
+    return f"\n\nRespond with valid JSON matching this schema: {output_type.model_json_schema()}"
+
+
+@lru_cache(maxsize=None)
+def response_format(output_type: Type[BaseModel], strict: bool = True) -> dict:
+    """``response_format`` for a chat completion returning ``output_type``"""
+    if not strict:
+        return {"type": "json_object"}
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": output_type.__name__,
+            "schema": strict_json_schema(output_type.model_json_schema()),
+            "strict": True,
+        },
+    }
+
+
+def strict_json_schema(schema: dict) -> dict:
+    """Adapt a Pydantic JSON schema to OpenAI's strict structured-output subset.
+
+    Every object forbids extra keys and lists all of its properties as
+    required, defaults are dropped, and ``$ref`` may not carry sibling keys.
+    """
+    if isinstance(schema, list):
+        return [strict_json_schema(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    if "$ref" in schema:
+        return {"$ref": schema["$ref"]}
+    strict = {key: strict_json_schema(value) for key, value in schema.items() if key != "default"}
+    if "properties" in strict:
+        # Keys under "properties" are field names, not schema keywords
+        strict["properties"] = {name: strict_json_schema(value) for name, value in schema["properties"].items()}
+    if "$defs" in strict:
+        strict["$defs"] = {name: strict_json_schema(value) for name, value in schema["$defs"].items()}
+    if strict.get("type") == "object":
+        strict["additionalProperties"] = False
+        strict["required"] = list(strict.get("properties", {}))
+    return strict
+
+
+def extract_json(text: str, max_chars: int = MAX_EXTRACT_CHARS,
+                 max_candidates: int = MAX_EXTRACT_CANDIDATES):
+    """Yield the JSON objects embedded in ``text`` (e.g. JSON wrapped in prose).
+
+    Each ``{`` is handed to the C JSON decoder, which stops at the end of a
+    valid object or at the first error, and the scan resumes after it. At
+    most ``max_candidates`` starting points are tried, so the cost stays
+    linear in the (capped) text length however messy the output is.
+    """
+    text = text[:max_chars]
+    pos = text.find("{")
+    attempts = 0
+    while pos != -1 and attempts < max_candidates:
+        attempts += 1
+        try:
+            value, end = _DECODER.raw_decode(text, pos)
+        except ValueError:
+            pos = text.find("{", pos + 1)
+            continue
+        yield value
+        pos = text.find("{", end)
+
+def parse_output(content: str, output_type: Type[T]) -> T:
+    """Validate model output as ``output_type``, recovering JSON embedded in prose"""
+    if not content:
+        raise ValueError("Empty response")
+    if content.lstrip().startswith("{"):
+        try:
+            # Fast path: pydantic-core parses and validates in one pass
+            return output_type.model_validate_json(content)
+        except ValidationError:
+            pass
+    for candidate in extract_json(content):
+        try:
+            return output_type.model_validate(candidate)
+        except ValidationError:
+            continue
+    raise ValueError(f"No valid {output_type.__name__} JSON found in response")
+
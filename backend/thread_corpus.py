@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from cache import DEFAULT_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+THREAD_CORPUS_PATH = os.getenv('THREAD_CORPUS_PATH', os.path.join(DEFAULT_CACHE_DIR, "threads.sqlite3"))
+THREAD_CORPUS_MAX_ENTRIES = int(os.getenv('THREAD_CORPUS_MAX_ENTRIES', '100000'))
+# zlib level for stored threads: 1 is fastest, 9 smallest
+THREAD_COMPRESSION_LEVEL = int(os.getenv('THREAD_COMPRESSION_LEVEL', '6'))
+
+
+def content_hash(thread: dict) -> str:
+    """Stable hash of a parsed thread, independent of key order"""
+    return hashlib.sha1(json.dumps(thread, sort_keys=True).encode()).hexdigest()
+
+
+class StoredThread:
+    def __init__(self, thread_id: str, thread: dict, content_hash: str, etag: Optional[str],
+                 last_modified: Optional[str], fetched_at: float, checked_at: float):
+        self.thread_id = thread_id
+        self.thread = thread
+        self.content_hash = content_hash
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.checked_at = checked_at
+
+    @property
+    def age(self) -> float:
+        """Seconds since the thread was last confirmed current upstream"""
+        return time.time() - self.checked_at
+
+
+class ThreadCorpus:
+    """Parsed Reddit threads in SQLite, zlib-compressed and keyed by thread ID.
+
+    Every URL form of a thread maps to one row. Each row keeps the
+    validators (ETag, Last-Modified) of the response it came from for
+    conditional refreshes, and a content hash: a refresh that parses to
+    the same thread only updates the check time instead of rewriting the
+    body. The oldest threads are dropped beyond ``max_entries``.
+    """
+
+    def __init__(self, path: str, max_entries: int = THREAD_CORPUS_MAX_ENTRIES,
+                 level: int = THREAD_COMPRESSION_LEVEL):
+        self.path = path
+        self.max_entries = max_entries
+        self.level = level
+        self._lock = threading.Lock()
+        self._inserts = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS threads ("
+            "thread_id TEXT PRIMARY KEY, content_hash TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+            "fetched_at REAL NOT NULL, checked_at REAL NOT NULL, raw_bytes INTEGER NOT NULL, "
+            "body BLOB NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS threads_checked ON threads(checked_at)")
+
+    def get(self, thread_id: str) -> Optional[StoredThread]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, etag, last_modified, fetched_at, checked_at, body "
+                "FROM threads WHERE thread_id = ?", (thread_id,)).fetchone()
+        if row is None:
+            return None
+        thread = json.loads(zlib.decompress(row[5]))
+        return StoredThread(thread_id, thread, row[0], row[1], row[2], row[3], row[4])
+
+    def put(self, thread_id: str, thread: dict, etag: str = None, last_modified: str = None,
+            raw_bytes: int = 0) -> bool:
+        """Store a freshly fetched thread; False when its content had not changed"""
+        digest = content_hash(thread)
+        now = time.time()
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE threads SET etag = ?, last_modified = ?, checked_at = ?, raw_bytes = ? "
+                "WHERE thread_id = ? AND content_hash = ?",
+                (etag, last_modified, now, raw_bytes, thread_id, digest)).rowcount
+            if updated:
+                return False
+            body = zlib.compress(json.dumps(thread, separators=(",", ":")).encode(), self.level)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO threads "
+                "(thread_id, content_hash, etag, last_modified, fetched_at, checked_at, raw_bytes, body) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, digest, etag, last_modified, now, now, raw_bytes, body))
+            self._inserts += 1
+            if self._inserts >= 100:
+                self._inserts = 0
+                self._prune()
+        return True
+
+    def touch(self, thread_id: str):
+        """Mark a stored thread as confirmed current (a 304 response)"""
+        with self._lock:
+            self._conn.execute("UPDATE threads SET checked_at = ? WHERE thread_id = ?", (time.time(), thread_id))
+
+    def _prune(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM threads").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM threads WHERE thread_id IN "
+                "(SELECT thread_id FROM threads ORDER BY checked_at LIMIT ?)", (overflow,))
+
+    def stats(self) -> Dict[str, Any]:
+        """Thread count, and upstream vs stored bytes"""
+        with self._lock:
+            count, raw, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(raw_bytes), 0), COALESCE(SUM(LENGTH(body)), 0) FROM threads"
+            ).fetchone()
+        return {"threads": count, "raw_bytes": raw, "stored_bytes": stored,
+                "compression_ratio": round(raw / stored, 2) if stored else 0.0}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0]
+
+
+thread_corpus = ThreadCorpus(THREAD_CORPUS_PATH) if THREAD_CORPUS_PATH else None
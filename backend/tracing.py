@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers sub-millisecond cache hits up to slow multi-call stages
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Tuple[Tuple[str, Any], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """Metric whose values are read from a callback at scrape time.
+
+    ``kind`` may be set to "counter" for monotonic values kept elsewhere.
+    """
+
+    def __init__(self, name: str, help: str, collect: Callable[[], Iterable[Tuple[dict, float]]],
+                 kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.collect = collect
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self.collect():
+            lines.append(f"{self.name}{_format_labels(tuple(sorted(labels.items())))} {value}")
+        return lines
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram with optional labels"""
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # per-bucket counts (+Inf last), sum, count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in self._series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = OrderedDict()
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.register(Histogram(
+    "research_stage_duration_seconds", "Duration of each traced stage (plan, search, llm, tavily, write, ...)"))
+LLM_TOKENS = metrics.register(Counter(
+    "llm_tokens_total", "Tokens billed by OpenAI, by agent and kind (prompt/completion)"))
+LLM_PROMPT_TOKENS = metrics.register(Histogram(
+    "llm_prompt_tokens", "Prompt tokens per LLM call", TOKEN_BUCKETS))
+TAVILY_RESPONSE_BYTES = metrics.register(Histogram(
+    "tavily_response_bytes", "Size of Tavily search responses", SIZE_BUCKETS))
+
+
+def gen_trace_id() -> str:
+    """Generate a unique trace ID"""
+    return str(uuid.uuid4())[:8]
+
+
+class Span:
+    def __init__(self, name: str, trace_id: Optional[str], parent_id: Optional[str], attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self):
+        self.duration = time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start_time,
+            "duration": self.duration,
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """All spans recorded for one research request"""
+
+    def __init__(self, trace_id: str, description: str):
+        self.trace_id = trace_id
+        self.description = description
+        self.start_time = time.time()
+        self.spans: List[Span] = []
+
+    def add(self, span: Span):
+        self.spans.append(span)
+
+    def usage(self) -> Dict[str, int]:
+        """Upstream spend of the trace: LLM tokens billed and Tavily searches made"""
+        tokens = sum(span.attributes.get("prompt_tokens", 0) + span.attributes.get("completion_tokens", 0)
+                     for span in self.spans)
+        searches = sum(span.name == "tavily" and not span.attributes.get("cache_hit") for span in self.spans)
+        return {"tokens": tokens, "searches": searches}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "description": self.description,
+            "start": self.start_time,
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+# Most recent finished traces, served by GET /traces/<trace_id>
+MAX_RECENT_TRACES = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+TRACE_DUMP_DIR = os.getenv("TRACE_DUMP_DIR")
+recent_traces: "OrderedDict[str, Trace]" = OrderedDict()
+
+
+def _reset(var: ContextVar, token):
+    try:
+        var.reset(token)
+    except ValueError:
+        # Generator finalised from a different context (e.g. garbage collected)
+        var.set(None)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time a stage and record it on the current trace (if any)"""
+    trace = current_trace.get()
+    parent = _current_span.get()
+    current = Span(name, trace.trace_id if trace else None, parent.span_id if parent else None, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=repr(e))
+        raise
+    finally:
+        _reset(_current_span, token)
+        current.end()
+        STAGE_SECONDS.observe(current.duration, stage=name)
+        if trace is not None:
+            trace.add(current)
+
+
+def record(name: str, duration: float, **attributes) -> Span:
+    """Record an already-measured span (for work that cannot sit inside ``with``)"""
+    trace = current_trace.get()
+    parent = _current_span.get()
+    finished = Span(name, trace.trace_id if trace else None, parent.span_id if parent else None, attributes)
+    finished.duration = duration
+    finished.start_time -= duration
+    STAGE_SECONDS.observe(duration, stage=name)
+    if trace is not None:
+        trace.add(finished)
+    return finished
+
+
+@contextmanager
+def start_trace(description: str, trace_id: str = None):
+    """Make a new trace current, with a root span covering the whole block"""
+    trace = Trace(trace_id or gen_trace_id(), description)
+    token = current_trace.set(trace)
+    logger.info(f"[{trace.trace_id}] Starting: {description}")
+    try:
+        with span(description):
+            yield trace
+    finally:
+        _reset(current_trace, token)
+        logger.info(f"[{trace.trace_id}] Completed: {description}")
+        _finish(trace)
+
+
+def _finish(trace: Trace):
+    recent_traces[trace.trace_id] = trace
+    while len(recent_traces) > MAX_RECENT_TRACES:
+        recent_traces.popitem(last=False)
+    if TRACE_DUMP_DIR:
+        try:
+            os.makedirs(TRACE_DUMP_DIR, exist_ok=True)
+            with open(os.path.join(TRACE_DUMP_DIR, f"{trace.trace_id}.json"), "w") as f:
+                json.dump(trace.to_dict(), f, indent=2, default=str)
+        except OSError as e:
+            logger.error(f"Failed to dump trace {trace.trace_id}: {e}")
+
+
+def record_llm_usage(agent: str, model: str, usage, target: Span = None):
+    """Attach OpenAI ``usage`` to a span (default: the current one) and token metrics"""
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    LLM_TOKENS.inc(prompt_tokens, agent=agent, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, agent=agent, kind="completion")
+    LLM_PROMPT_TOKENS.observe(prompt_tokens, agent=agent)
+    current = target or _current_span.get()
+    if current is not None:
+        current.set(model=model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
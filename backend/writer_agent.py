@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
+import os
 from agent_base import Agent
+from cache import cache_from_env, DEFAULT_CACHE_DIR
 
 # Optimized prompt - much shorter while maintaining quality
 INSTRUCTIONS = """Write a research report from the provided findings.
@@ -24,9 +26,14 @@ class ReportData(BaseModel):
     markdown_report: str = Field(description="Complete markdown report")
     follow_up_questions: list[str] = Field(description="3 follow-up research topics")
 
+# Identical findings produce an identical report request; keep it short-lived
+writer_cache = cache_from_env("writer", memory_ttl=900, disk_ttl=86400,
+                              disk_path=os.path.join(DEFAULT_CACHE_DIR, "llm.sqlite3"))
+
 writer_agent = Agent(
     name="WriterAgent",
     instructions=INSTRUCTIONS,
     model="gpt-4o-mini",
     output_type=ReportData,
+    cache=writer_cache,
 )
\ No newline at end of file
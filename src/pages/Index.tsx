@@ -74,8 +74,12 @@ const Index = () => {
     }, 10000);
     
     try {
-      // Use streaming search for real-time updates
-      const streamingGenerator = searchService.searchStreaming(query);
+      // Use streaming search for real-time updates; render the report as it is written
+      let streamedReport = "";
+      const streamingGenerator = searchService.searchStreaming(query, (delta) => {
+        streamedReport += delta;
+        setResults(streamedReport);
+      });
       
       for await (const chunk of streamingGenerator) {
         console.log('Received chunk:', chunk);
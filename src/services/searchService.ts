@@ -7,8 +7,9 @@ export interface SearchResult {
 }
 
 export interface StreamingUpdate {
-  type: 'update' | 'complete' | 'error';
+  type: 'update' | 'report_delta' | 'complete' | 'error';
   message?: string;
+  delta?: string;
 }
 
 class SearchService {
@@ -41,7 +42,10 @@ class SearchService {
     }
   }
 
-  async *searchStreaming(query: string): AsyncGenerator<string, void, unknown> {
+  async *searchStreaming(
+    query: string,
+    onReportDelta?: (delta: string) => void,
+  ): AsyncGenerator<string, void, unknown> {
     try {
       const response = await fetch(`${this.baseUrl}/search`, {
         method: 'POST',
@@ -85,6 +89,8 @@ class SearchService {
                 
                 if (parsed.type === 'update' && parsed.message) {
                   yield parsed.message;
+                } else if (parsed.type === 'report_delta' && parsed.delta) {
+                  onReportDelta?.(parsed.delta);
                 } else if (parsed.type === 'complete') {
                   return; // End of stream
                 } else if (parsed.type === 'error') {